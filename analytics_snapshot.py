@@ -0,0 +1,262 @@
+import argparse
+import fcntl
+import os
+import shutil
+import time
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+import config
+import utils
+
+# Columnas de texto con pocos valores distintos: se guardan con codificación de diccionario
+DICTIONARY_STRING = pa.dictionary(pa.int32(), pa.string())
+
+# Tablas del snapshot: nombre -> (tabla origen, columnas a leer, clave de paginación, esquema)
+SNAPSHOT_TABLES = {
+    "agents": (
+        config.AGENTS_TABLE,
+        "nip, nombre, apellido1, apellido2, seccion, grupo, activo, monitor",
+        "nip",
+        pa.schema([
+            ("nip", pa.string()),
+            ("nombre", pa.string()),
+            ("apellido1", pa.string()),
+            ("apellido2", pa.string()),
+            ("seccion", DICTIONARY_STRING),
+            ("grupo", DICTIONARY_STRING),
+            ("activo", pa.bool_()),
+            ("monitor", pa.bool_())
+        ])
+    ),
+    "activities": (
+        config.ACTIVITIES_TABLE,
+        "id, fecha, turno, curso_id, monitor_nip",
+        "id",
+        pa.schema([
+            ("id", pa.int64()),
+            ("fecha", pa.date32()),
+            ("turno", DICTIONARY_STRING),
+            ("curso_id", pa.int64()),
+            ("curso_nombre", DICTIONARY_STRING),
+            ("monitor_nip", pa.string())
+        ])
+    ),
+    "participants": (
+        config.PARTICIPANTS_TABLE,
+        "id, activity_id, agent_nip",
+        "id",
+        pa.schema([
+            ("id", pa.int64()),
+            ("activity_id", pa.int64()),
+            ("agent_nip", pa.string())
+        ])
+    )
+}
+
+CURRENT_FILE = "CURRENT"
+STALE_FILE = "STALE"
+LOCK_FILE = ".lock"
+
+# Tablas ya abiertas en este proceso, por versión del snapshot
+_loaded = {"version": None, "tables": {}}
+
+def _path(*parts):
+    return os.path.join(config.ANALYTICS_SNAPSHOT_DIR, *parts)
+
+def current_version():
+    """Nombre de la versión vigente del snapshot, o None si aún no existe"""
+    try:
+        with open(_path(CURRENT_FILE), "r", encoding="utf-8") as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def snapshot_age():
+    """Segundos desde que se escribió la versión vigente, o None si no existe"""
+    version = current_version()
+    if not version:
+        return None
+    try:
+        return time.time() - os.path.getmtime(_path(version))
+    except FileNotFoundError:
+        return None
+
+def mark_stale():
+    """
+    Marca el snapshot como desactualizado para que la próxima lectura, en cualquier
+    proceso, lo regenere. Se llama después de escribir en las tablas de origen.
+    """
+    try:
+        os.makedirs(config.ANALYTICS_SNAPSHOT_DIR, exist_ok=True)
+        with open(_path(STALE_FILE), "w", encoding="utf-8") as file:
+            file.write(datetime.now().isoformat())
+    except OSError as e:
+        print(f"No se pudo marcar el snapshot analítico como desactualizado: {str(e)}")
+
+def _needs_refresh():
+    age = snapshot_age()
+    return age is None or age > config.ANALYTICS_SNAPSHOT_MAX_AGE or os.path.exists(_path(STALE_FILE))
+
+def _fetch_table(name):
+    """Descarga una tabla de origen por páginas y la convierte al esquema del snapshot"""
+    table, columns, key, schema = SNAPSHOT_TABLES[name]
+    rows = [row for page in utils.iter_table_pages(table, columns=columns, key=key) for row in page]
+
+    if name == "activities":
+        courses = utils.get_all_courses(include_hidden=True)
+        course_names = dict(zip(courses['id'], courses['nombre'])) if not courses.empty else {}
+        for row in rows:
+            row['fecha'] = datetime.strptime(row['fecha'], "%Y-%m-%d").date() if row.get('fecha') else None
+            row['curso_nombre'] = course_names.get(row.get('curso_id'))
+
+    return pa.Table.from_pylist(rows, schema=schema)
+
+def _write_table(table, path):
+    # Formato IPC de Arrow sin compresión: se puede mapear en memoria sin copiar
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def _remove_old_versions(keep):
+    for entry in os.listdir(config.ANALYTICS_SNAPSHOT_DIR):
+        if entry.startswith("v-") and entry not in keep:
+            shutil.rmtree(_path(entry), ignore_errors=True)
+
+def refresh_snapshot(blocking=True, force=False):
+    """
+    Regenera el snapshot. Solo un proceso escribe a la vez (bloqueo de archivo).
+
+    La nueva versión se escribe en su propio directorio y después se publica
+    reemplazando CURRENT de forma atómica; los lectores que aún tengan mapeada la
+    versión anterior siguen funcionando.
+
+    Args:
+        blocking: si es False y otro proceso ya está escribiendo, no espera y devuelve None
+        force: regenerar aunque el snapshot esté al día
+
+    Returns:
+        str: versión publicada, o None si no se ha regenerado
+    """
+    os.makedirs(config.ANALYTICS_SNAPSHOT_DIR, exist_ok=True)
+    with open(_path(LOCK_FILE), "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        try:
+            previous = current_version()
+            # Otro proceso puede haberlo regenerado mientras esperábamos el bloqueo
+            if not force and not _needs_refresh():
+                return previous
+
+            stale_mark = os.path.getmtime(_path(STALE_FILE)) if os.path.exists(_path(STALE_FILE)) else None
+
+            version = f"v-{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{os.getpid()}"
+            os.makedirs(_path(version))
+            for name in SNAPSHOT_TABLES:
+                _write_table(_fetch_table(name), _path(version, f"{name}.arrow"))
+
+            with open(_path(CURRENT_FILE + ".tmp"), "w", encoding="utf-8") as file:
+                file.write(version)
+            os.replace(_path(CURRENT_FILE + ".tmp"), _path(CURRENT_FILE))
+
+            # Solo se borra la marca si nadie ha escrito otra durante la regeneración
+            if stale_mark is not None and os.path.exists(_path(STALE_FILE)) \
+                    and os.path.getmtime(_path(STALE_FILE)) == stale_mark:
+                os.remove(_path(STALE_FILE))
+
+            _remove_old_versions(keep={version, previous})
+            return version
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def get_tables():
+    """
+    Devuelve las tablas del snapshot (dict nombre -> pyarrow.Table), mapeadas en memoria
+
+    Si el snapshot está desactualizado lo regenera un único proceso; el resto sigue
+    leyendo la versión anterior mientras tanto. Solo espera si todavía no hay ninguna.
+    """
+    if _needs_refresh():
+        try:
+            refresh_snapshot(blocking=current_version() is None)
+        except Exception as e:
+            if current_version() is None:
+                raise
+            print(f"Error al regenerar el snapshot analítico, se usa el anterior: {str(e)}")
+
+    version = current_version()
+    if version != _loaded["version"]:
+        tables = {}
+        for name in SNAPSHOT_TABLES:
+            source = pa.memory_map(_path(version, f"{name}.arrow"), "r")
+            tables[name] = pa.ipc.open_file(source).read_all()
+        _loaded["version"] = version
+        _loaded["tables"] = tables
+    return _loaded["tables"]
+
+def filter_activities(activities, start_date=None, end_date=None, curso_id=None):
+    """Filtra la tabla de actividades del snapshot por rango de fechas y curso"""
+    mask = pc.is_valid(activities["id"])
+    if start_date:
+        mask = pc.and_(mask, pc.greater_equal(activities["fecha"], pa.scalar(start_date, pa.date32())))
+    if end_date:
+        mask = pc.and_(mask, pc.less_equal(activities["fecha"], pa.scalar(end_date, pa.date32())))
+    if curso_id:
+        mask = pc.and_(mask, pc.equal(activities["curso_id"], int(curso_id)))
+    return activities.filter(mask)
+
+def participations(start_date=None, end_date=None, curso_id=None):
+    """
+    Participaciones del rango con los datos de la actividad y del agente
+
+    El filtrado y el cruce se hacen sobre las tablas mapeadas; solo el resultado
+    se copia a memoria del proceso.
+
+    Returns:
+        pyarrow.Table: activity_id, agent_nip, fecha, turno, curso_id, curso_nombre, seccion, grupo
+    """
+    tables = get_tables()
+    activities = filter_activities(tables["activities"], start_date, end_date, curso_id)
+    participants = tables["participants"].filter(
+        pc.is_in(tables["participants"]["activity_id"], value_set=activities["id"])
+    )
+    joined = participants.select(["activity_id", "agent_nip"]).join(
+        activities.select(["id", "fecha", "turno", "curso_id", "curso_nombre"]),
+        keys="activity_id", right_keys="id"
+    )
+    return joined.join(
+        tables["agents"].select(["nip", "seccion", "grupo"]),
+        keys="agent_nip", right_keys="nip"
+    )
+
+def activity_counts_by_agent(start_date=None, end_date=None, curso_id=None):
+    """
+    Número de actividades distintas de cada agente en el rango
+
+    Returns:
+        DataFrame: columnas nip y total_actividades (solo agentes con alguna actividad)
+    """
+    tables = get_tables()
+    activities = filter_activities(tables["activities"], start_date, end_date, curso_id)
+    participants = tables["participants"].filter(
+        pc.is_in(tables["participants"]["activity_id"], value_set=activities["id"])
+    )
+    counts = participants.group_by("agent_nip").aggregate([("activity_id", "count_distinct")])
+    return counts.to_pandas().rename(columns={
+        "agent_nip": "nip",
+        "activity_id_count_distinct": "total_actividades"
+    })[["nip", "total_actividades"]]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerar el snapshot analítico compartido")
+    parser.add_argument("--si-caducado", action="store_true",
+                        help="Regenerar solo si ha superado ANALYTICS_SNAPSHOT_MAX_AGE o está marcado como desactualizado")
+    args = parser.parse_args()
+
+    if args.si_caducado and not _needs_refresh():
+        print(f"El snapshot {current_version()} está al día.")
+    else:
+        version = refresh_snapshot(force=True)
+        print(f"Snapshot publicado: {version} en {config.ANALYTICS_SNAPSHOT_DIR}")
@@ -1,10 +1,7 @@
 import streamlit as st
-import pandas as pd
-import yaml
-from yaml.loader import SafeLoader
 import config
 import utils
-import time
+import warmup
 
 # Configure the page
 st.set_page_config(page_title=config.APP_NAME,
@@ -32,6 +29,9 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Precarga de cachés en segundo plano; con serve.py ya se lanzó al arrancar el proceso
+warmup.start(wait_for_runtime=False)
+
 # Initialize session state variables
 utils.init_session_state_supabase()
 
@@ -94,7 +94,7 @@ if not is_authenticated:
             st.session_state.form_password = password
 
             try:
-                response = config.supabase.auth.sign_in_with_password({
+                response = utils.get_auth_client().auth.sign_in_with_password({
                     "email": email,
                     "password": password
                 })
@@ -0,0 +1,288 @@
+"""
+Almacén de caché compartido entre procesos (réplicas) para las lecturas de utils.py.
+
+Las cachés en memoria son de cada proceso: con N réplicas se hacen N lecturas a
+Supabase y cada réplica puede servir datos de distinta antigüedad. caching.swr_cache
+usa además este almacén, de modo que un valor cargado por una réplica lo reutilizan
+las demás, y vaciar una caché (versión nueva de la clave) afecta a todas.
+
+Backends (config.CACHE_BACKEND):
+- "" (por defecto): sin almacén compartido, solo la caché de cada proceso
+- "memory": en memoria del proceso; sustituto local para pruebas
+- "sqlite": archivo SQLite en disco, para réplicas en la misma máquina
+- "redis": servidor compatible con Redis (requiere el paquete redis), para réplicas
+  en máquinas distintas
+
+Los valores se guardan serializados con pickle y comprimidos con zlib a partir de
+config.CACHE_COMPRESS_MIN_BYTES; cada backend descarta las entradas menos usadas
+cuando el total supera config.CACHE_MAX_BYTES.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import config
+
+# Primer byte de cada valor: sin comprimir o comprimido con zlib
+RAW = b"\x00"
+ZLIB = b"\x01"
+
+def dumps(value):
+    """Serializa un valor (p. ej. un DataFrame) y lo comprime si supera el umbral"""
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) >= config.CACHE_COMPRESS_MIN_BYTES:
+        return ZLIB + zlib.compress(data, config.CACHE_COMPRESS_LEVEL)
+    return RAW + data
+
+def loads(data):
+    if data[:1] == ZLIB:
+        return pickle.loads(zlib.decompress(data[1:]))
+    return pickle.loads(data[1:])
+
+class MemoryBackend:
+    """Almacén en memoria con el mismo comportamiento que los compartidos (para pruebas)"""
+
+    name = "memory"
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or config.CACHE_MAX_BYTES
+        self._data = OrderedDict()  # clave -> (bytes, caducidad)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, data, ttl=None):
+        with self._lock:
+            self._data[key] = (data, time.time() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            total = sum(len(value) for value, _ in self._data.values())
+            while total > self.max_bytes and len(self._data) > 1:
+                _, (value, _) = self._data.popitem(last=False)
+                total -= len(value)
+
+    def add(self, key, ttl):
+        """Crea la clave solo si no existe (o ha caducado); devuelve True si la ha creado"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[1] is None or entry[1] >= time.time()):
+                return False
+            self._data[key] = (b"", time.time() + ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_int(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def stats(self):
+        with self._lock:
+            return {"backend": self.name, "entradas": len(self._data),
+                    "bytes": sum(len(value) for value, _ in self._data.values()), "max_bytes": self.max_bytes}
+
+class SQLiteBackend:
+    """Almacén en un archivo SQLite (modo WAL) que comparten los procesos de la máquina"""
+
+    name = "sqlite"
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or config.CACHE_SQLITE_PATH
+        self.max_bytes = max_bytes or config.CACHE_MAX_BYTES
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+            " expires REAL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, data, ttl=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(data), len(data), now + ttl if ttl else None, now)
+            )
+            self._evict(now, key)
+
+    def _evict(self, now, keep):
+        self._conn.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires < ?", (now,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Las menos usadas primero, hasta volver al límite (sin tocar la recién escrita)
+        doomed = []
+        rows = self._conn.execute("SELECT key, size FROM cache WHERE key != ? ORDER BY accessed", (keep,))
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM cache WHERE key = ?", doomed)
+
+    def add(self, key, ttl):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO cache (key, value, size, expires, accessed) VALUES (?, x'', 0, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET expires = excluded.expires, accessed = excluded.accessed "
+                "WHERE cache.expires IS NOT NULL AND cache.expires < ?",
+                (key, now + ttl, now, now)
+            )
+            return cursor.rowcount == 1
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO counters (key, value) VALUES (?, 1) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + 1", (key,)
+            )
+            return self._conn.execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()[0]
+
+    def get_int(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else 0
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {"backend": self.name, "entradas": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+class RedisBackend:
+    """
+    Almacén en un servidor compatible con Redis
+
+    Además de la caducidad de cada clave, lleva un índice por último acceso y el tamaño
+    total para descartar las menos usadas al superar el límite.
+    """
+
+    name = "redis"
+
+    def __init__(self, url=None, max_bytes=None):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requiere el paquete redis (pip install redis)")
+        self.client = redis.Redis.from_url(url or config.CACHE_REDIS_URL)
+        self.max_bytes = max_bytes or config.CACHE_MAX_BYTES
+        prefix = config.CACHE_NAMESPACE
+        self._index = f"{prefix}:__index"
+        self._sizes = f"{prefix}:__sizes"
+        self._total = f"{prefix}:__total"
+
+    def get(self, key):
+        data = self.client.get(key)
+        if data is not None:
+            self.client.zadd(self._index, {key: time.time()})
+        return data
+
+    def set(self, key, data, ttl=None):
+        previous = self.client.hget(self._sizes, key)
+        pipe = self.client.pipeline()
+        pipe.set(key, data, ex=int(ttl) if ttl else None)
+        pipe.hset(self._sizes, key, len(data))
+        pipe.zadd(self._index, {key: time.time()})
+        pipe.incrby(self._total, len(data) - int(previous or 0))
+        total = pipe.execute()[-1]
+        while total > self.max_bytes:
+            oldest = self.client.zpopmin(self._index, 16)
+            if not oldest:
+                break
+            for old_key, _ in oldest:
+                size = int(self.client.hget(self._sizes, old_key) or 0)
+                pipe.delete(old_key)
+                pipe.hdel(self._sizes, old_key)
+                pipe.decrby(self._total, size)
+                total -= size
+            pipe.execute()
+
+    def add(self, key, ttl):
+        return bool(self.client.set(key, b"", nx=True, ex=max(1, int(ttl))))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def incr(self, key):
+        return int(self.client.incr(key))
+
+    def get_int(self, key):
+        return int(self.client.get(key) or 0)
+
+    def stats(self):
+        return {"backend": self.name, "entradas": int(self.client.zcard(self._index)),
+                "bytes": int(self.client.get(self._total) or 0), "max_bytes": self.max_bytes}
+
+BACKENDS = {"memory": MemoryBackend, "sqlite": SQLiteBackend, "redis": RedisBackend}
+
+_backend = {"instancia": None, "nombre": None, "fijo": False}
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """
+    Almacén compartido configurado en config.CACHE_BACKEND, o None si no hay
+
+    Se crea en el primer uso; si no se puede crear (p. ej. falta el paquete redis) se
+    avisa una vez y se sigue solo con la caché de cada proceso.
+    """
+    name = (config.CACHE_BACKEND or "").lower()
+    with _backend_lock:
+        if _backend["fijo"]:
+            return _backend["instancia"]
+        if not name:
+            return None
+        if _backend["nombre"] != name:
+            try:
+                _backend["instancia"] = BACKENDS[name]()
+            except Exception as e:
+                print(f"No se pudo abrir la caché compartida '{name}': {str(e)}")
+                _backend["instancia"] = None
+            _backend["nombre"] = name
+        return _backend["instancia"]
+
+def set_backend(backend):
+    """Fija el almacén compartido, sin mirar config.CACHE_BACKEND (pruebas); None lo desactiva"""
+    with _backend_lock:
+        _backend["instancia"] = backend
+        _backend["fijo"] = True
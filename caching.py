@@ -0,0 +1,442 @@
+"""
+Caché con refresco en segundo plano (stale-while-revalidate) para las lecturas de referencia.
+
+Con st.cache_data, cuando caduca una entrada el siguiente usuario espera la
+consulta completa. swr_cache sirve el valor caducado al momento y lanza un único
+refresco en segundo plano; solo si el valor supera la antigüedad máxima la lectura
+espera. Las cargas de una misma clave se agrupan: si caduca con varias sesiones
+activas, se hace una sola petición al servidor y el resto espera su resultado.
+
+La caché es del proceso (compartida entre sesiones), como st.cache_data, y las
+funciones decoradas conservan `.clear()` para las invalidaciones de utils. Si hay un
+almacén compartido (cache_backend, config.CACHE_BACKEND) se usa como segundo nivel
+entre réplicas: los valores cargados se guardan ahí, una sola réplica refresca cada
+clave y `.clear()` invalida la caché en todas. Los valores que llegan de otra réplica
+avisan con on_refresh igual que un refresco local, para que utils renueve los
+snapshots compartidos que se construyen a partir de ellos. Las cachés de utils con
+st.cache_data no pasan por aquí y siguen siendo de cada proceso.
+"""
+import contextlib
+import functools
+import hashlib
+import inspect
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import pandas as pd
+import config
+import cache_backend
+
+class RefreshFailed(Exception):
+    """La carga en segundo plano ha fallado; se sigue sirviendo el valor anterior"""
+
+_local = threading.local()
+
+def in_background_refresh():
+    """True si el código se ejecuta dentro de un refresco en segundo plano (sin sesión de Streamlit)"""
+    return getattr(_local, "background", False)
+
+@contextlib.contextmanager
+def background_refresh():
+    """Marca el hilo actual como refresco en segundo plano (también lo usa la precarga de warmup.py)"""
+    previous = in_background_refresh()
+    _local.background = True
+    try:
+        yield
+    finally:
+        _local.background = previous
+
+def _freeze(value):
+    # Las listas y diccionarios de los argumentos (p. ej. secciones) se convierten en tuplas
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = sorted(value, key=repr) if isinstance(value, (set, frozenset)) else value
+        return tuple(_freeze(item) for item in items)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+def _copy(value):
+    # Copia superficial: con copy-on-write es casi gratis y evita que una página que
+    # añade columnas al DataFrame devuelto modifique el de las demás sesiones
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=False)
+    return value
+
+_caches = []
+_backend_errors = set()
+
+def _backend_call(operation, *args):
+    """
+    Llama al almacén compartido; si falla se sigue solo con la caché local
+
+    Cada tipo de error se avisa una sola vez para no llenar los logs.
+    """
+    try:
+        return operation(*args)
+    except Exception as e:
+        if type(e).__name__ not in _backend_errors:
+            _backend_errors.add(type(e).__name__)
+            print(f"Error en la caché compartida, se usa solo la local: {str(e)}")
+        return None
+
+class SWRCache:
+    def __init__(self, func, ttl, max_staleness, max_entries, on_refresh):
+        self.func = func
+        self.name = f"{func.__module__}.{func.__qualname__}"
+        self.signature = inspect.signature(func)
+        self.ttl = ttl
+        self.max_staleness = max(max_staleness, ttl)
+        self.max_entries = max_entries
+        self.on_refresh = on_refresh
+        self._entries = OrderedDict()  # clave -> (valor, instante de carga)
+        self._inflight = {}  # clave -> Future de la carga en curso
+        self._next_refresh = {}  # clave -> instante a partir del cual se vuelve a intentar refrescar
+        self._generation = 0
+        self._lock = threading.Lock()
+        # Versión de la caché en el almacén compartido; cambia cuando cualquier réplica la vacía
+        self._version = None
+        self._version_checked = 0.0
+        self.stats = {"aciertos": 0, "caducados_servidos": 0, "esperas": 0, "cargas": 0,
+                      "refrescos": 0, "refrescos_fallidos": 0, "agrupadas": 0,
+                      "compartidas": 0, "refrescos_en_otra_replica": 0, "descartadas": 0}
+
+    def _key(self, args, kwargs):
+        # Con los valores por defecto aplicados, f() y f(x=valor_por_defecto) comparten entrada
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return _freeze(bound.arguments)
+
+    # --- Almacén compartido entre réplicas (cache_backend) ---
+
+    def _shared_key(self, key, version):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return f"{config.CACHE_NAMESPACE}:{self.name}:v{version}:{digest}"
+
+    def _sync_version(self, backend):
+        """
+        Versión compartida vigente; si otra réplica ha vaciado la caché se descarta la
+        local y se avisa con on_refresh, como tras un refresco
+        """
+        now = time.monotonic()
+        if self._version is not None and now - self._version_checked < config.CACHE_VERSION_CHECK_INTERVAL:
+            return self._version
+        version = _backend_call(backend.get_int, f"{config.CACHE_NAMESPACE}:{self.name}:version")
+        if version is None:
+            return self._version
+        with self._lock:
+            changed = self._version is not None and version != self._version
+            if changed:
+                self._generation += 1
+                self._entries.clear()
+                self._inflight.clear()
+            self._version = version
+            self._version_checked = now
+        if changed and self.on_refresh:
+            self.on_refresh()
+        return version
+
+    def _shared_get(self, backend, key, version):
+        """Valor y antigüedad (segundos) guardados por cualquier réplica, o None"""
+        data = _backend_call(backend.get, self._shared_key(key, version))
+        if not data:
+            return None
+        try:
+            value, loaded_at = cache_backend.loads(data)
+        except Exception:
+            return None
+        return value, max(0.0, time.time() - loaded_at)
+
+    def _shared_set(self, backend, key, version, value, loaded_at):
+        try:
+            data = cache_backend.dumps((value, loaded_at))
+        except Exception as e:
+            print(f"No se puede guardar {self.name} en la caché compartida: {str(e)}")
+            return
+        _backend_call(backend.set, self._shared_key(key, version), data, self.max_staleness)
+
+    # --- Lectura ---
+
+    def __call__(self, *args, **kwargs):
+        key = self._key(args, kwargs)
+        backend = cache_backend.get_backend()
+        version = self._sync_version(backend) if backend else None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[1] <= self.ttl:
+                self.stats["aciertos"] += 1
+                self._entries.move_to_end(key)
+                return _copy(entry[0])
+            generation = self._generation
+
+        # Caducado o sin valor en este proceso: otra réplica puede tener uno más reciente
+        if backend and version is not None:
+            shared = self._shared_get(backend, key, version)
+            if shared is not None:
+                value, age = shared
+                replaced = False
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if generation == self._generation and (entry is None or time.monotonic() - entry[1] > age):
+                        replaced = entry is not None
+                        self._entries[key] = (value, time.monotonic() - age)
+                        self._entries.move_to_end(key)
+                        if age <= self.ttl:
+                            self.stats["compartidas"] += 1
+                # Valor más reciente refrescado por otra réplica: equivale a un refresco local
+                if replaced and self.on_refresh:
+                    self.on_refresh()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.monotonic() - entry[1] if entry else None
+            if entry and age <= self.ttl:
+                self.stats["aciertos"] += 1
+                return _copy(entry[0])
+            if entry and age <= self.max_staleness:
+                self.stats["caducados_servidos"] += 1
+                if key not in self._inflight and time.monotonic() >= self._next_refresh.get(key, 0):
+                    self._start_refresh(key, args, kwargs, backend, version)
+                return _copy(entry[0])
+
+            # Sin valor o demasiado antiguo: se espera, uniéndose a la carga en curso si la hay
+            self.stats["esperas"] += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                generation = self._generation
+            else:
+                self.stats["agrupadas"] += 1
+
+        if not leader:
+            try:
+                return _copy(future.result())
+            except RefreshFailed:
+                return self(*args, **kwargs)
+
+        try:
+            value = self.func(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, future, generation, error=e)
+            raise
+        self._finish(key, future, generation, value=value, backend=backend, version=version)
+        return _copy(value)
+
+    def _start_refresh(self, key, args, kwargs, backend, version):
+        future = Future()
+        self._inflight[key] = future
+        self.stats["refrescos"] += 1
+        generation = self._generation
+        thread = threading.Thread(
+            target=self._refresh, args=(key, args, kwargs, future, generation, backend, version),
+            name=f"swr-{self.func.__name__}", daemon=True
+        )
+        thread.start()
+
+    def _refresh(self, key, args, kwargs, future, generation, backend, version):
+        # Con almacén compartido, solo una réplica refresca cada clave; las demás siguen
+        # sirviendo el valor caducado y recogen el nuevo del almacén cuando esté
+        lock_key = None
+        if backend and version is not None:
+            lock_key = self._shared_key(key, version) + ":refresco"
+            if not _backend_call(backend.add, lock_key, config.CACHE_REFRESH_LOCK_TTL):
+                with self._lock:
+                    self.stats["refrescos_en_otra_replica"] += 1
+                    self._next_refresh[key] = time.monotonic() + 1
+                self._finish(key, future, generation, error=RefreshFailed("refresco en curso en otra réplica"))
+                return
+        try:
+            with background_refresh():
+                value = self.func(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self.stats["refrescos_fallidos"] += 1
+            print(f"No se pudo refrescar {self.func.__name__} en segundo plano: {str(e)}")
+            self._finish(key, future, generation, error=e if isinstance(e, RefreshFailed) else RefreshFailed(str(e)))
+            return
+        finally:
+            if lock_key:
+                _backend_call(backend.delete, lock_key)
+        if self._finish(key, future, generation, value=value, backend=backend, version=version) and self.on_refresh:
+            self.on_refresh()
+
+    def _finish(self, key, future, generation, value=None, error=None, backend=None, version=None):
+        """Publica el resultado de una carga; devuelve True si se ha guardado en la caché"""
+        stored = False
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            # Si se vació la caché durante la carga, el resultado puede ser anterior a la escritura
+            if error is None and generation == self._generation:
+                self.stats["cargas"] += 1
+                self._entries[key] = (value, time.monotonic())
+                self._entries.move_to_end(key)
+                self._next_refresh.pop(key, None)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats["descartadas"] += 1
+                stored = True
+        if stored and backend and version is not None:
+            self._shared_set(backend, key, version, value, time.time())
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+        return stored
+
+    def clear(self):
+        """Vacía la caché, también en las demás réplicas; las cargas en curso no guardarán su resultado"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._inflight.clear()
+        backend = cache_backend.get_backend()
+        if backend:
+            version = _backend_call(backend.incr, f"{config.CACHE_NAMESPACE}:{self.name}:version")
+            if version is not None:
+                with self._lock:
+                    self._version = version
+                    self._version_checked = time.monotonic()
+
+    def report(self):
+        with self._lock:
+            oldest = min((loaded for _, loaded in self._entries.values()), default=None)
+            return {
+                "funcion": self.func.__name__,
+                "entradas": len(self._entries),
+                "antiguedad": time.monotonic() - oldest if oldest is not None else None,
+                **self.stats
+            }
+
+def swr_cache(ttl, max_staleness=None, max_entries=32, on_refresh=None):
+    """
+    Decorador de caché stale-while-revalidate
+
+    Args:
+        ttl: segundos durante los que el valor se considera fresco
+        max_staleness: antigüedad máxima (segundos) con la que se sirve un valor
+            caducado mientras se refresca; por encima la lectura espera a la carga.
+            Por defecto config.SWR_MAX_STALENESS
+        max_entries: claves distintas que se guardan (las menos usadas se descartan)
+        on_refresh: función sin argumentos que se llama cuando un refresco en
+            segundo plano guarda un valor nuevo, o cuando llega uno de otra réplica
+            (un refresco suyo o una invalidación con .clear())
+
+    La función decorada debe lanzar una excepción si la carga falla durante un
+    refresco en segundo plano (ver in_background_refresh), para no sustituir el
+    valor bueno por uno vacío.
+    """
+    def decorator(func):
+        cache = SWRCache(func, ttl, max_staleness or config.SWR_MAX_STALENESS, max_entries, on_refresh)
+        _caches.append(cache)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return cache(*args, **kwargs)
+
+        wrapper.clear = cache.clear
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+def get_cache_stats():
+    """Estado y contadores de todas las cachés swr_cache del proceso (lista de dicts)"""
+    return [cache.report() for cache in _caches]
+
+def get_cache_report():
+    """Lo mismo que get_cache_stats, como DataFrame"""
+    return pd.DataFrame(get_cache_stats())
+
+# --- Cachés de Streamlit (st.cache_data y st.cache_resource) ---
+
+_streamlit_caches = {}  # "módulo.función" -> contadores
+_streamlit_lock = threading.Lock()
+
+def counted(streamlit_cache, **options):
+    """
+    Cuenta las lecturas, cargas y entradas de una función con caché de Streamlit, para /metrics
+
+        @caching.counted(st.cache_data, ttl=60)
+        def get_daily_rollups(start_date, end_date):
+
+    streamlit_cache es st.cache_data o st.cache_resource y options sus argumentos. Cada
+    llamada es una lectura y cada ejecución de la función, una carga; la diferencia son
+    los aciertos. Cada carga guarda una entrada, que caduca a los `ttl` segundos y se
+    descarta por encima de `max_entries`, así que las entradas vivas se calculan con las
+    cargas recientes sin leer el interior de Streamlit. La función que recibe Streamlit
+    conserva el nombre, la firma y el código de la original, así que la clave de la
+    caché y los argumentos que empiezan por _ no cambian.
+    """
+    ttl = options.get("ttl")
+    if hasattr(ttl, "total_seconds"):
+        ttl = ttl.total_seconds()
+    max_entries = options.get("max_entries")
+
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        counters = {"funcion": func.__name__, "lecturas": 0, "cargas": 0}
+        loaded = deque(maxlen=max_entries)  # instante de cada carga reciente
+        _streamlit_caches[name] = (counters, loaded, ttl)
+
+        @functools.wraps(func)
+        def load(*args, **kwargs):
+            value = func(*args, **kwargs)
+            with _streamlit_lock:
+                counters["cargas"] += 1
+                loaded.append(time.monotonic())
+            return value
+
+        cached = streamlit_cache(**options)(load)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _streamlit_lock:
+                counters["lecturas"] += 1
+            return cached(*args, **kwargs)
+
+        def clear(*args, **kwargs):
+            cached.clear(*args, **kwargs)
+            with _streamlit_lock:
+                if args or kwargs:
+                    if loaded:
+                        loaded.popleft()
+                else:
+                    loaded.clear()
+
+        wrapper.clear = clear
+        return wrapper
+    return decorator
+
+def _streamlit_cache_bytes():
+    """Bytes de cada función con st.cache_data, de las estadísticas públicas de Streamlit"""
+    try:
+        from streamlit.runtime.caching import get_data_cache_stats_provider
+        return {stat.cache_name: stat.byte_length for stat in get_data_cache_stats_provider().get_stats()}
+    except Exception as e:
+        print(f"No se puede leer la memoria de las cachés de Streamlit: {str(e)}")
+        return {}
+
+def get_streamlit_cache_stats():
+    """
+    Lecturas, cargas, entradas y memoria de las funciones decoradas con counted()
+
+    Los bytes son los de los valores serializados de st.cache_data. De st.cache_resource
+    no se miden: Streamlit recorrería todo el objeto compartido en cada consulta de
+    /metrics (su memoria está en la página Sistema).
+
+    Returns:
+        list: dicts con funcion, lecturas, cargas, entradas y bytes (None si no se mide)
+    """
+    sizes = _streamlit_cache_bytes()
+    now = time.monotonic()
+    rows = []
+    with _streamlit_lock:
+        for name, (counters, loaded, ttl) in _streamlit_caches.items():
+            if ttl is not None:
+                while loaded and now - loaded[0] > ttl:
+                    loaded.popleft()
+            rows.append({**counters, "entradas": len(loaded), "bytes": sizes.get(name)})
+    return rows
@@ -1,16 +1,105 @@
 import os
-from supabase import create_client
+import tempfile
 
 # Supabase configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 
-# Initialize Supabase client
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Pool HTTP compartido por todos los clientes de Supabase del proceso (supabase_pool.py)
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "20"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "10"))
+HTTP_POOL_KEEPALIVE_EXPIRY = 60  # segundos
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))  # segundos
+HTTP_CONNECT_TIMEOUT = 5  # segundos
+
+# Resiliencia de las llamadas a Supabase (resilience.py)
+RESILIENCE_DEADLINES = {  # plazo total de cada tipo de operación, con reintentos, en segundos
+    "read": float(os.getenv("RESILIENCE_READ_DEADLINE", "10")),
+    "write": float(os.getenv("RESILIENCE_WRITE_DEADLINE", "15")),
+    "auth": 10.0
+}
+RESILIENCE_MAX_RETRIES = 3
+RESILIENCE_BACKOFF_BASE = 0.2  # segundos
+RESILIENCE_BACKOFF_MAX = 2.0  # segundos
+RESILIENCE_STALE_MAX_ENTRIES = 256  # lecturas cuya última respuesta correcta se guarda
+RESILIENCE_STALE_MAX_BYTES = int(os.getenv("RESILIENCE_STALE_MAX_BYTES", str(32 * 1024 * 1024)))  # entre todas
+RESILIENCE_STALE_MAX_ENTRY_BYTES = 1024 * 1024  # las respuestas mayores (exportaciones, tablas completas) no se guardan
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = int(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))  # segundos
+# Funciones RPC de solo lectura, que se pueden reintentar
+IDEMPOTENT_RPCS = {"search_agents", "participation_by_agent"}
+
+def __getattr__(name):
+    # El cliente de Supabase (y el paquete supabase) se crea en el primer uso de
+    # config.supabase y no al importar config, para acortar el arranque en frío.
+    # Es el cliente de datos compartido; la autenticación de cada usuario va por
+    # el cliente de su sesión (utils.get_auth_client)
+    if name == "supabase":
+        import supabase_pool
+        client = supabase_pool.create_shared_client()
+        globals()["supabase"] = client
+        return client
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # App configuration
 APP_NAME = "Gestión de Cursos y Actividades"
 
+# Búsqueda de agentes en el servidor (RPC search_agents) en lugar de descargar toda la tabla
+SERVER_SIDE_AGENT_SEARCH = os.getenv("SERVER_SIDE_AGENT_SEARCH", "false").lower() in ("1", "true", "yes")
+AGENTS_PAGE_SIZE = 25
+
+# Tablas paginadas (widgets.paginated_grid): filas por página y máximo de filas por envío al navegador
+GRID_PAGE_SIZE = 50
+GRID_MAX_ROWS = int(os.getenv("GRID_MAX_ROWS", "200"))
+
+# Gráficos de plotly (widgets.plotly_chart y widgets.time_series_chart)
+CHART_CACHE_MAX_ENTRIES = 128  # figuras memorizadas por proceso
+CHART_DAILY_MAX_DAYS = 92  # rangos más largos se agrupan por semanas
+CHART_WEEKLY_MAX_DAYS = 731  # y los de más de dos años, por meses
+CHART_WEBGL_THRESHOLD = 1000  # puntos a partir de los que una serie se dibuja con WebGL
+
+# Selector de agentes con búsqueda: coincidencias que se envían al navegador
+PICKER_MAX_MATCHES = 20
+
+# Cachés stale-while-revalidate (caching.py): antigüedad máxima con la que se sirve un
+# valor caducado mientras se refresca; por encima la lectura espera a la consulta
+SWR_MAX_STALENESS = int(os.getenv("SWR_MAX_STALENESS", "900"))  # segundos
+
+# Caché compartida entre réplicas (cache_backend.py): "", "memory", "sqlite" o "redis"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "")
+CACHE_NAMESPACE = os.getenv("CACHE_NAMESPACE", "gestor_cursos")
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "gestor_cursos_cache.sqlite"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_COMPRESS_MIN_BYTES = 1024  # los valores menores se guardan sin comprimir
+CACHE_COMPRESS_LEVEL = 3
+CACHE_VERSION_CHECK_INTERVAL = 5  # segundos entre comprobaciones de la versión de cada caché
+CACHE_REFRESH_LOCK_TTL = 60  # segundos máximos que una réplica retiene el refresco de una clave
+
+# Endpoint /readyz (serve.py): cada cuánto se comprueba de nuevo que Supabase responde
+HEALTH_BACKEND_CHECK_INTERVAL = 10  # segundos
+
+# Snapshot analítico en disco (Arrow) compartido por todos los procesos del servidor
+ANALYTICS_SNAPSHOT_DIR = os.getenv(
+    "ANALYTICS_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "gestor_cursos_analytics")
+)
+ANALYTICS_SNAPSHOT_MAX_AGE = int(os.getenv("ANALYTICS_SNAPSHOT_MAX_AGE", "300"))  # segundos
+
+# Presupuesto de tiempo de importación de cada punto de entrada, sin contar Streamlit
+# (lo comprueba `python startup_profile.py --check`)
+STARTUP_IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "1.0"))  # segundos
+
+# Perfil de ejecución de las páginas (profiler.py), activable por sesión con ?perfil=1
+# o desde la página Sistema; sin activar no tiene coste
+PROFILER_QUERY_PARAM = "perfil"
+PROFILER_SAMPLE_INTERVAL = 0.005  # segundos entre muestras de la pila
+PROFILER_SLOW_RERUN = float(os.getenv("PROFILER_SLOW_RERUN", "2.0"))  # segundos a partir de los que se guarda el flamegraph
+PROFILER_OUTPUT_DIR = os.getenv(
+    "PROFILER_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "gestor_cursos_perfiles")
+)
+PROFILER_MAX_FILES = 50  # flamegraphs guardados; se borran los más antiguos
+PROFILER_HISTORY = 20  # ejecuciones perfiladas que se recuerdan por sesión
+
 # Theme configurations
 LIGHT_THEME = {
     "primaryColor": "#0066cc",
@@ -32,6 +121,9 @@ COURSES_TABLE = "courses"
 ACTIVITIES_TABLE = "activities"
 PARTICIPANTS_TABLE = "activity_participants"
 USERS_TABLE = "users"
+ACTIVITIES_ENRICHED_VIEW = "activities_enriched"
+ACTIVITY_ROLLUP_TABLE = "activity_daily_rollup"
+PARTICIPATION_ROLLUP_TABLE = "participation_daily_rollup"
 
 # Sections in the police department
 SECTIONS = [
@@ -0,0 +1,320 @@
+import argparse
+import io
+import tempfile
+from datetime import datetime
+import pandas as pd
+import config
+import utils
+
+# Límite de filas por hoja en Excel (incluida la cabecera)
+EXCEL_MAX_ROWS = 1048576
+
+# Valores por filtro in_: van en la URL de la petición GET, y PostgREST y los proxies
+# rechazan las URL demasiado largas
+IN_FILTER_MAX_VALUES = 200
+
+EXPORT_DATASETS = {
+    "agentes": "Agentes",
+    "cursos": "Cursos",
+    "actividades": "Actividades",
+    "participantes": "Participantes"
+}
+
+EXPORT_FORMATS = {
+    "csv": ("CSV", "text/csv", ".csv"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet", ".parquet"),
+    "xlsx": ("Excel (XLSX)", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ".xlsx")
+}
+
+# Esquema de cada exportación: lista de (columna, tipo). Tipos: texto, entero, booleano, fecha
+EXPORT_SCHEMAS = {
+    ("agentes", False): [
+        ("nip", "texto"), ("nombre", "texto"), ("apellido1", "texto"), ("apellido2", "texto"),
+        ("seccion", "texto"), ("grupo", "texto"), ("email", "texto"), ("telefono", "texto"),
+        ("activo", "booleano"), ("monitor", "booleano"), ("created_at", "texto")
+    ],
+    ("cursos", False): [
+        ("id", "entero"), ("nombre", "texto"), ("descripcion", "texto"),
+        ("ocultar", "booleano"), ("created_at", "texto")
+    ],
+    ("actividades", False): [
+        ("id", "entero"), ("fecha", "fecha"), ("turno", "texto"), ("curso_id", "entero"),
+        ("monitor_nip", "texto"), ("comentarios", "texto"), ("created_at", "texto")
+    ],
+    ("actividades", True): [
+        ("id", "entero"), ("fecha", "fecha"), ("turno", "texto"), ("curso_id", "entero"),
+        ("curso_nombre", "texto"), ("monitor_nip", "texto"), ("monitor_nombre", "texto"),
+        ("comentarios", "texto")
+    ],
+    ("participantes", False): [
+        ("id", "entero"), ("activity_id", "entero"), ("agent_nip", "texto"), ("created_at", "texto")
+    ],
+    ("participantes", True): [
+        ("id", "entero"), ("activity_id", "entero"), ("fecha", "fecha"), ("turno", "texto"),
+        ("curso_nombre", "texto"), ("agent_nip", "texto"), ("agente_nombre", "texto"),
+        ("seccion", "texto"), ("grupo", "texto")
+    ]
+}
+
+def get_export_schema(dataset, joined=False):
+    """
+    Devuelve el esquema (lista de columnas y tipos) de una exportación
+
+    Las tablas de agentes y cursos no tienen versión enriquecida.
+    """
+    return EXPORT_SCHEMAS.get((dataset, joined)) or EXPORT_SCHEMAS[(dataset, False)]
+
+def _conform(rows_df, schema):
+    """Ajusta un bloque de filas al esquema: columnas en orden y tipos homogéneos"""
+    df = rows_df.reindex(columns=[name for name, _ in schema])
+    for name, kind in schema:
+        if kind == "entero":
+            df[name] = pd.to_numeric(df[name], errors="coerce").astype("Int64")
+        elif kind == "booleano":
+            df[name] = df[name].astype("boolean")
+        elif kind == "fecha":
+            df[name] = pd.to_datetime(df[name], errors="coerce").dt.date
+        else:
+            df[name] = df[name].astype("string")
+    return df
+
+def _full_names(agent_rows):
+    """Diccionario NIP -> nombre completo a partir de filas de agentes"""
+    return {
+        agent['nip']: f"{agent.get('nombre') or ''} {agent.get('apellido1') or ''} {agent.get('apellido2') or ''}".strip()
+        for agent in agent_rows
+    }
+
+def _in_batches(values):
+    """Divide una lista de valores en bloques de como máximo IN_FILTER_MAX_VALUES"""
+    for start in range(0, len(values), IN_FILTER_MAX_VALUES):
+        yield values[start:start + IN_FILTER_MAX_VALUES]
+
+def _fetch_agents(nips, columns="nip, nombre, apellido1, apellido2"):
+    """Obtiene solo los agentes indicados, en bloques de IN_FILTER_MAX_VALUES NIP"""
+    nips = sorted({nip for nip in nips if nip})
+    rows = []
+    for batch in _in_batches(nips):
+        rows.extend(config.supabase.table(config.AGENTS_TABLE).select(columns).in_("nip", batch).execute().data or [])
+    return rows
+
+def _date_filters(start_date=None, end_date=None):
+    filters = []
+    if start_date:
+        filters.append(("gte", "fecha", start_date.strftime("%Y-%m-%d")))
+    if end_date:
+        filters.append(("lte", "fecha", end_date.strftime("%Y-%m-%d")))
+    return filters
+
+def iter_export_chunks(dataset, joined=False, start_date=None, end_date=None, page_size=1000):
+    """
+    Genera la exportación por bloques a partir del lector paginado por clave
+
+    Cada bloque es un DataFrame con a lo sumo page_size filas ajustado al esquema de la
+    exportación, por lo que la memoria usada no depende del tamaño de la tabla. El rango
+    de fechas se aplica a actividades y participantes.
+
+    Args:
+        dataset: clave de EXPORT_DATASETS
+        joined: si es True, añade nombres de curso, monitor y agente
+        start_date: fecha inicial (datetime.date) o None
+        end_date: fecha final (datetime.date) o None
+        page_size: filas por petición a Supabase
+
+    Yields:
+        DataFrame: bloque de filas
+    """
+    schema = get_export_schema(dataset, joined)
+
+    if dataset == "agentes":
+        for rows in utils.iter_table_pages(config.AGENTS_TABLE, key="nip", page_size=page_size):
+            yield _conform(pd.DataFrame(rows), schema)
+        return
+
+    if dataset == "cursos":
+        for rows in utils.iter_table_pages(config.COURSES_TABLE, page_size=page_size):
+            yield _conform(pd.DataFrame(rows), schema)
+        return
+
+    date_filters = _date_filters(start_date, end_date)
+
+    if dataset == "participantes" and not joined and not date_filters:
+        # Sin rango de fechas se recorre la tabla de participantes directamente
+        for rows in utils.iter_table_pages(config.PARTICIPANTS_TABLE, page_size=page_size):
+            yield _conform(pd.DataFrame(rows), schema)
+        return
+
+    # Los nombres de curso se cargan una vez: la tabla de cursos es pequeña
+    course_names = {}
+    if joined:
+        for rows in utils.iter_table_pages(config.COURSES_TABLE, columns="id, nombre", page_size=page_size):
+            course_names.update({course['id']: course['nombre'] for course in rows})
+
+    for activity_rows in utils.iter_table_pages(config.ACTIVITIES_TABLE, page_size=page_size, filters=date_filters):
+        activities_df = pd.DataFrame(activity_rows)
+
+        if joined:
+            activities_df['curso_nombre'] = activities_df['curso_id'].map(course_names)
+
+        if dataset == "actividades":
+            if joined:
+                monitor_names = _full_names(_fetch_agents(activities_df['monitor_nip'].dropna()))
+                activities_df['monitor_nombre'] = activities_df['monitor_nip'].map(monitor_names)
+            yield _conform(activities_df, schema)
+            continue
+
+        # Participantes de las actividades de esta página, por bloques de identificadores
+        participant_pages = (
+            participant_rows
+            for activity_ids in _in_batches(activities_df['id'].tolist())
+            for participant_rows in utils.iter_table_pages(config.PARTICIPANTS_TABLE, page_size=page_size,
+                                                           filters=[("in_", "activity_id", activity_ids)])
+        )
+        for participant_rows in participant_pages:
+            participants_df = pd.DataFrame(participant_rows)
+
+            if joined:
+                participants_df = participants_df.merge(
+                    activities_df[['id', 'fecha', 'turno', 'curso_nombre']].rename(columns={'id': 'activity_id'}),
+                    on='activity_id',
+                    how='left'
+                )
+                agent_rows = _fetch_agents(participants_df['agent_nip'], "nip, nombre, apellido1, apellido2, seccion, grupo")
+                agents_by_nip = {agent['nip']: agent for agent in agent_rows}
+                names = _full_names(agent_rows)
+                participants_df['agente_nombre'] = participants_df['agent_nip'].map(names)
+                participants_df['seccion'] = participants_df['agent_nip'].map(lambda nip: agents_by_nip.get(nip, {}).get('seccion'))
+                participants_df['grupo'] = participants_df['agent_nip'].map(lambda nip: agents_by_nip.get(nip, {}).get('grupo'))
+
+            yield _conform(participants_df, schema)
+
+def write_csv(chunks, schema, output):
+    """Escribe los bloques como CSV (UTF-8 con BOM para que Excel reconozca los acentos)"""
+    text_output = io.TextIOWrapper(output, encoding="utf-8-sig", newline="")
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(text_output, header=header, index=False)
+        header = False
+    if header:
+        # Exportación vacía: solo la cabecera
+        text_output.write(",".join(name for name, _ in schema) + "\n")
+    text_output.flush()
+    text_output.detach()
+
+def write_parquet(chunks, schema, output):
+    """Escribe los bloques como Parquet, un grupo de filas por bloque"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {"texto": pa.string(), "entero": pa.int64(), "booleano": pa.bool_(), "fecha": pa.date32()}
+    arrow_schema = pa.schema([(name, arrow_types[kind]) for name, kind in schema])
+
+    writer = pq.ParquetWriter(pa.PythonFile(output, mode="w"), arrow_schema, compression="zstd")
+    try:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=arrow_schema, preserve_index=False))
+    finally:
+        writer.close()
+
+def write_xlsx(chunks, schema, output):
+    """
+    Escribe los bloques como XLSX en modo de memoria constante
+
+    Las filas se vuelcan a disco a medida que se escriben; al superar el límite de
+    filas de Excel se continúa en una hoja nueva.
+    """
+    import xlsxwriter
+
+    columns = [name for name, _ in schema]
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    date_format = workbook.add_format({"num_format": "dd/mm/yyyy"})
+    bold = workbook.add_format({"bold": True})
+
+    def new_sheet(number):
+        sheet = workbook.add_worksheet(f"Datos {number}" if number > 1 else "Datos")
+        sheet.write_row(0, 0, columns, bold)
+        return sheet
+
+    sheet_number = 1
+    sheet = new_sheet(sheet_number)
+    row = 1
+    for chunk in chunks:
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for record in values.itertuples(index=False, name=None):
+            if row >= EXCEL_MAX_ROWS:
+                sheet_number += 1
+                sheet = new_sheet(sheet_number)
+                row = 1
+            for col, value in enumerate(record):
+                if value is None:
+                    continue
+                if schema[col][1] == "fecha":
+                    sheet.write_datetime(row, col, datetime.combine(value, datetime.min.time()), date_format)
+                else:
+                    sheet.write(row, col, value)
+            row += 1
+    workbook.close()
+
+WRITERS = {
+    "csv": write_csv,
+    "parquet": write_parquet,
+    "xlsx": write_xlsx
+}
+
+def export_dataset(dataset, file_format, output, joined=False, start_date=None, end_date=None, page_size=1000):
+    """
+    Exporta una tabla completa a un archivo binario abierto
+
+    Args:
+        dataset: clave de EXPORT_DATASETS
+        file_format: clave de EXPORT_FORMATS
+        output: archivo binario de escritura
+        joined: si es True, exporta la versión con nombres resueltos
+        start_date: fecha inicial (datetime.date) o None
+        end_date: fecha final (datetime.date) o None
+        page_size: filas por petición a Supabase
+    """
+    schema = get_export_schema(dataset, joined)
+    chunks = iter_export_chunks(dataset, joined=joined, start_date=start_date,
+                                end_date=end_date, page_size=page_size)
+    WRITERS[file_format](chunks, schema, output)
+
+def export_to_tempfile(dataset, file_format, joined=False, start_date=None, end_date=None):
+    """
+    Exporta a un archivo temporal en disco y lo devuelve abierto y posicionado al inicio
+
+    Returns:
+        file: archivo temporal (se borra al cerrarlo)
+    """
+    output = tempfile.TemporaryFile()
+    export_dataset(dataset, file_format, output, joined=joined, start_date=start_date, end_date=end_date)
+    output.seek(0)
+    return output
+
+def get_export_filename(dataset, file_format, joined=False, start_date=None, end_date=None):
+    """Nombre de archivo descriptivo para una exportación"""
+    parts = [dataset]
+    if joined and dataset in ("actividades", "participantes"):
+        parts.append("detalle")
+    if start_date:
+        parts.append(start_date.strftime("%Y%m%d"))
+    if end_date:
+        parts.append(end_date.strftime("%Y%m%d"))
+    return "_".join(parts) + EXPORT_FORMATS[file_format][2]
+
+if __name__ == "__main__":
+    # Uso: python exporter.py participantes --formato parquet --detalle --desde 2025-01-01 --hasta 2025-12-31
+    parser = argparse.ArgumentParser(description="Exporta tablas de la aplicación a CSV, Parquet o XLSX")
+    parser.add_argument("tabla", choices=list(EXPORT_DATASETS.keys()))
+    parser.add_argument("--formato", choices=list(EXPORT_FORMATS.keys()), default="csv")
+    parser.add_argument("--detalle", action="store_true", help="Incluir nombres de curso, monitor y agente")
+    parser.add_argument("--desde", type=lambda s: datetime.strptime(s, "%Y-%m-%d").date())
+    parser.add_argument("--hasta", type=lambda s: datetime.strptime(s, "%Y-%m-%d").date())
+    parser.add_argument("--salida", help="Ruta del archivo de salida")
+    args = parser.parse_args()
+
+    path = args.salida or get_export_filename(args.tabla, args.formato, args.detalle, args.desde, args.hasta)
+    with open(path, "wb") as output:
+        export_dataset(args.tabla, args.formato, output, joined=args.detalle,
+                       start_date=args.desde, end_date=args.hasta)
+    print(f"Exportación guardada en {path}")
@@ -0,0 +1,519 @@
+"""
+Sustituto local de Supabase para pruebas de carga y desarrollo sin conexión.
+
+Implementa en memoria la parte del cliente de Supabase que usa la aplicación:
+- tablas y vistas: table(...).select/insert/upsert/update/delete con los filtros
+  eq, neq, gt, gte, lte, in_, order, limit y range;
+- las columnas de contadores de 0004 y 0006 (participant_count, total_participations,
+  last_activity_date), la vista activities_enriched de 0003 y los resúmenes
+  diarios de 0005;
+- las funciones rpc search_agents y participation_by_agent;
+- autenticación con email y contraseña, con un estado independiente por cliente
+  de sesión (como supabase_pool.create_session_client).
+
+Cuenta las consultas por tabla y operación, y opcionalmente por etiqueta (p. ej. el
+paso de la prueba de carga que la ha provocado), y puede simular la latencia de red
+de cada llamada. Lo usa loadtest.py:
+
+    db = fake_supabase.FakeSupabase(fake_supabase.generate_data())
+    fake_supabase.install(db)
+"""
+import copy
+import itertools
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+import config
+
+DEFAULT_PASSWORD = "prueba"
+MONITOR_EMAIL = "monitor@example.com"  # primer agente de generate_data, monitor
+
+class Response:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+class Query:
+    """Consulta encadenable sobre una tabla o vista, como la de postgrest"""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.operation = "select"
+        self.columns = "*"
+        self.count = None
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []
+        self.ordering = []
+        self.offset = 0
+        self.max_rows = None
+        self.lower_bounds = set()  # columnas filtradas con gt
+
+    def select(self, *columns, count=None):
+        self.columns = ",".join(columns) if columns else "*"
+        self.count = count
+        return self
+
+    def insert(self, payload):
+        self.operation, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict=None, **kwargs):
+        self.operation, self.payload, self.on_conflict = "upsert", payload, on_conflict
+        return self
+
+    def update(self, payload):
+        self.operation, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def _filter(self, column, test):
+        self.filters.append(lambda row: test(row.get(column)))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, lambda v: v == value or str(v) == str(value))
+
+    def neq(self, column, value):
+        return self._filter(column, lambda v: str(v) != str(value))
+
+    @property
+    def continuation(self):
+        """
+        True si es la página siguiente de una lectura paginada por clave (keyset), como las
+        de utils.iter_table_pages: "clave > último valor" ordenado por esa clave y con límite.
+        stats() las cuenta en paginas_siguientes
+        """
+        return self.max_rows is not None and any(
+            (column, False) in self.ordering for column in self.lower_bounds
+        )
+
+    def gt(self, column, value):
+        self.lower_bounds.add(column)
+        return self._filter(column, lambda v: v is not None and _comparable(v) > _comparable(value))
+
+    def gte(self, column, value):
+        return self._filter(column, lambda v: v is not None and _comparable(v) >= _comparable(value))
+
+    def lte(self, column, value):
+        return self._filter(column, lambda v: v is not None and _comparable(v) <= _comparable(value))
+
+    def in_(self, column, values):
+        values = {str(v) for v in values}
+        return self._filter(column, lambda v: str(v) in values)
+
+    def order(self, column, desc=False):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, max_rows):
+        self.max_rows = max_rows
+        return self
+
+    def range(self, start, end):
+        self.offset, self.max_rows = start, end - start + 1
+        return self
+
+    def execute(self):
+        return self.db._execute(self)
+
+def _comparable(value):
+    # Fechas e identificadores llegan como texto o como números según la consulta
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, "")
+    return (1, 0, str(value))
+
+def _full_name(agent):
+    return " ".join(part for part in (agent.get("nombre"), agent.get("apellido1"), agent.get("apellido2")) if part)
+
+class FakeAuth:
+    """Autenticación de un cliente: cada cliente de sesión guarda su propio usuario"""
+
+    def __init__(self, db):
+        self.db = db
+        self.user = None
+
+    def _response(self):
+        class AuthResponse:
+            pass
+        response = AuthResponse()
+        response.user = self.user
+        response.session = {"access_token": f"token-{self.user.email}", "refresh_token": f"refresh-{self.user.email}"}
+        return response
+
+    def sign_in_with_password(self, credentials):
+        self.db._record("auth", "sign_in")
+        email = credentials.get("email")
+        if credentials.get("password") != self.db.password or not any(
+            agent.get("email") == email for agent in self.db.tables[config.AGENTS_TABLE]
+        ):
+            raise Exception("Invalid login credentials")
+        self.user = type("User", (), {"email": email, "id": email})()
+        return self._response()
+
+    def set_session(self, access_token, refresh_token):
+        self.db._record("auth", "set_session")
+        email = access_token.removeprefix("token-")
+        self.user = type("User", (), {"email": email, "id": email})()
+        return self._response()
+
+    def get_user(self, jwt=None):
+        self.db._record("auth", "get_user")
+        return self._response() if self.user else None
+
+    def get_session(self):
+        return self._response().session if self.user else None
+
+    def sign_out(self):
+        self.db._record("auth", "sign_out")
+        self.user = None
+
+class SessionClient:
+    """Cliente de una sesión: comparte los datos de FakeSupabase con su propia autenticación"""
+
+    def __init__(self, db):
+        self._db = db
+        self.auth = FakeAuth(db)
+
+    def table(self, name):
+        return self._db.table(name)
+
+    def rpc(self, name, params=None):
+        return self._db.rpc(name, params)
+
+class FakeSupabase:
+    """
+    Base de datos en memoria con la interfaz del cliente de Supabase
+
+    Args:
+        tables: diccionario tabla -> lista de filas (ver generate_data)
+        latency: segundos de espera en cada llamada, para simular la red
+        tagger: función sin argumentos que devuelve la etiqueta de la llamada en curso
+        password: contraseña válida para todos los agentes con email
+    """
+
+    primary_keys = {config.AGENTS_TABLE: "nip"}
+    # Valores DEFAULT de las columnas que una inserción puede omitir
+    column_defaults = {config.AGENTS_TABLE: {"activo": True, "monitor": False}}
+
+    def __init__(self, tables, latency=0.0, tagger=None, password=DEFAULT_PASSWORD):
+        self.tables = tables
+        self.latency = latency
+        self.tagger = tagger
+        self.password = password
+        self.auth = FakeAuth(self)
+        self._lock = threading.RLock()
+        self._ids = defaultdict(lambda: itertools.count(1))
+        for name, rows in tables.items():
+            last = max((row["id"] for row in rows if isinstance(row.get("id"), int)), default=0)
+            self._ids[name] = itertools.count(last + 1)
+        self._calls = Counter()
+        self._tags = defaultdict(Counter)
+        self._rows = Counter()
+        self._pages = 0
+        self._refresh_counters()
+
+        self.views = {
+            config.ACTIVITIES_ENRICHED_VIEW: self._activities_enriched,
+            config.ACTIVITY_ROLLUP_TABLE: lambda: self._daily_rollups()[0],
+            config.PARTICIPATION_ROLLUP_TABLE: lambda: self._daily_rollups()[1]
+        }
+        self.rpcs = {
+            "search_agents": self._search_agents,
+            "participation_by_agent": self._participation_by_agent
+        }
+
+    # --- Interfaz del cliente ---
+
+    def table(self, name):
+        return Query(self, name)
+
+    def rpc(self, name, params=None):
+        db = self
+
+        class RpcCall:
+            def execute(self):
+                db._record(name, "rpc")
+                with db._lock:
+                    data = copy.deepcopy(db.rpcs[name](**(params or {})))
+                db._rows[name] += len(data) if isinstance(data, list) else 1
+                return Response(data)
+        return RpcCall()
+
+    def session_client(self):
+        return SessionClient(self)
+
+    # --- Estadísticas ---
+
+    def _record(self, name, operation):
+        tag = self.tagger() if self.tagger else None
+        with self._lock:
+            self._calls[(name, operation)] += 1
+            self._tags[tag or ""][name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def stats(self):
+        """Consultas por tabla y operación, filas devueltas y consultas por etiqueta"""
+        with self._lock:
+            return {
+                "consultas": sum(self._calls.values()),
+                "paginas_siguientes": self._pages,
+                "por_tabla": {f"{name}.{operation}": count for (name, operation), count in sorted(self._calls.items())},
+                "filas": dict(self._rows),
+                "por_etiqueta": {tag: dict(counts) for tag, counts in self._tags.items()}
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._calls.clear()
+            self._tags.clear()
+            self._rows.clear()
+            self._pages = 0
+
+    # --- Ejecución de consultas ---
+
+    def _source(self, name):
+        if name in self.views:
+            return self.views[name]()
+        return self.tables.setdefault(name, [])
+
+    def _execute(self, query):
+        self._record(query.table, query.operation)
+        with self._lock:
+            rows = self._source(query.table)
+            matched = [row for row in rows if all(test(row) for test in query.filters)]
+            if query.operation == "select":
+                data, total = self._select(query, matched)
+                self._rows[query.table] += len(data)
+                self._pages += query.continuation
+                return Response(data, total if query.count else None)
+            if query.operation in ("insert", "upsert"):
+                data = self._insert(query, rows)
+            elif query.operation == "update":
+                for row in matched:
+                    row.update(query.payload)
+                data = copy.deepcopy(matched)
+            else:
+                ids = {id(row) for row in matched}
+                self.tables[query.table] = [row for row in rows if id(row) not in ids]
+                data = copy.deepcopy(matched)
+            self._refresh_counters()
+            return Response(data)
+
+    def _select(self, query, rows):
+        for column, desc in reversed(query.ordering):
+            rows = sorted(rows, key=lambda row: (row.get(column) is None, _comparable(row.get(column))), reverse=desc)
+        total = len(rows)
+        rows = rows[query.offset:]
+        if query.max_rows is not None:
+            rows = rows[:query.max_rows]
+        if query.columns != "*":
+            columns = [column.strip() for column in query.columns.split(",")]
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        return copy.deepcopy(rows), total
+
+    def _insert(self, query, rows):
+        payload = query.payload if isinstance(query.payload, list) else [query.payload]
+        key = query.on_conflict or self.primary_keys.get(query.table, "id")
+        inserted = []
+        for values in payload:
+            values = dict(values)
+            existing = next((row for row in rows if key in values and row.get(key) == values[key]), None)
+            if existing is not None:
+                if query.operation != "upsert":
+                    raise Exception(f"duplicate key value violates unique constraint ({query.table}.{key})")
+                existing.update(values)
+                inserted.append(copy.deepcopy(existing))
+                continue
+            values = {**self.column_defaults.get(query.table, {}), **values}
+            if key == "id" and "id" not in values:
+                values["id"] = next(self._ids[query.table])
+            rows.append(values)
+            inserted.append(copy.deepcopy(values))
+        return inserted
+
+    # --- Lo que en Supabase hacen los triggers, vistas y funciones ---
+
+    def _refresh_counters(self):
+        """
+        Contadores de participación, como los triggers de 0004_contadores_participacion.sql;
+        los de los agentes solo cuentan actividades ya realizadas (0006_contadores_hasta_hoy.sql)
+        """
+        activities = {row["id"]: row for row in self.tables.get(config.ACTIVITIES_TABLE, [])}
+        today = date.today().isoformat()
+        per_activity = Counter()
+        per_agent = Counter()
+        last_date = {}
+        for participant in self.tables.get(config.PARTICIPANTS_TABLE, []):
+            activity = activities.get(participant.get("activity_id"))
+            if activity is None:
+                continue
+            per_activity[activity["id"]] += 1
+            fecha = str(activity["fecha"])
+            if fecha > today:
+                continue
+            nip = participant.get("agent_nip")
+            per_agent[nip] += 1
+            last_date[nip] = max(last_date.get(nip, ""), fecha)
+        for activity in activities.values():
+            activity["participant_count"] = per_activity[activity["id"]]
+        for agent in self.tables.get(config.AGENTS_TABLE, []):
+            agent["total_participations"] = per_agent[agent["nip"]]
+            agent["last_activity_date"] = last_date.get(agent["nip"])
+
+    def _activities_enriched(self):
+        agents = {agent["nip"]: agent for agent in self.tables[config.AGENTS_TABLE]}
+        courses = {course["id"]: course for course in self.tables[config.COURSES_TABLE]}
+        participants = defaultdict(list)
+        for participant in self.tables[config.PARTICIPANTS_TABLE]:
+            agent = agents.get(participant["agent_nip"])
+            if agent is not None:
+                participants[participant["activity_id"]].append(agent)
+
+        rows = []
+        for activity in self.tables[config.ACTIVITIES_TABLE]:
+            members = sorted(participants[activity["id"]],
+                             key=lambda agent: (agent["apellido1"], agent.get("apellido2") or "", agent["nombre"]))
+            course = courses.get(activity.get("curso_id"))
+            monitor = agents.get(activity.get("monitor_nip"))
+            rows.append({
+                **activity,
+                "curso_nombre": course["nombre"] if course else None,
+                "monitor_nombre": _full_name(monitor) or None if monitor else None,
+                "participant_count": len(members),
+                "participant_nips": [agent["nip"] for agent in members],
+                "participant_names": [_full_name(agent) for agent in members],
+                "participants": [{"nip": agent["nip"], "nombre": _full_name(agent),
+                                  "seccion": agent.get("seccion"), "grupo": agent.get("grupo")} for agent in members]
+            })
+        return rows
+
+    def _daily_rollups(self):
+        """Tablas de 0005_resumen_diario.sql, siempre al día"""
+        agents = {agent["nip"]: agent for agent in self.tables[config.AGENTS_TABLE]}
+        activities = {activity["id"]: activity for activity in self.tables[config.ACTIVITIES_TABLE]}
+        by_activity = defaultdict(lambda: [set(), 0])
+        by_participation = defaultdict(lambda: [0, set()])
+        for activity in activities.values():
+            by_activity[(activity["fecha"], activity.get("curso_id"), activity["turno"])][0].add(activity["id"])
+        for participant in self.tables[config.PARTICIPANTS_TABLE]:
+            activity = activities.get(participant["activity_id"])
+            agent = agents.get(participant["agent_nip"])
+            if activity is None or agent is None:
+                continue
+            by_activity[(activity["fecha"], activity.get("curso_id"), activity["turno"])][1] += 1
+            key = (activity["fecha"], activity.get("curso_id"), agent.get("seccion"), agent.get("grupo"), activity["turno"])
+            by_participation[key][0] += 1
+            by_participation[key][1].add(activity["id"])
+
+        activity_rows = [
+            {"id": i, "fecha": key[0], "curso_id": key[1], "turno": key[2],
+             "activities": len(ids), "participations": participations}
+            for i, (key, (ids, participations)) in enumerate(sorted(by_activity.items(), key=str), 1)
+        ]
+        participation_rows = [
+            {"id": i, "fecha": key[0], "curso_id": key[1], "seccion": key[2], "grupo": key[3], "turno": key[4],
+             "participations": participations, "activities": len(ids)}
+            for i, (key, (participations, ids)) in enumerate(sorted(by_participation.items(), key=str), 1)
+        ]
+        return activity_rows, participation_rows
+
+    def _search_agents(self, p_query=None, p_sections=None, p_groups=None, p_active_only=False,
+                       p_monitors_only=False, p_sort="nip", p_desc=False, p_limit=25, p_offset=0):
+        columns = ["nip", "nombre", "apellido1", "apellido2", "seccion", "grupo", "email", "telefono", "activo", "monitor"]
+        text = (p_query or "").lower()
+        rows = [
+            agent for agent in self.tables[config.AGENTS_TABLE]
+            if (not text or text in " ".join(str(agent.get(column) or "") for column in columns[:8]).lower())
+            and (not p_sections or agent.get("seccion") in p_sections)
+            and (not p_groups or agent.get("grupo") in p_groups)
+            and (not p_active_only or agent.get("activo"))
+            and (not p_monitors_only or agent.get("monitor"))
+        ]
+        rows.sort(key=lambda agent: (str(agent.get(p_sort) or ""), agent["nip"]), reverse=p_desc)
+        return [{**{column: agent.get(column) for column in columns}, "total_count": len(rows)}
+                for agent in rows[p_offset:p_offset + p_limit]]
+
+    def _participation_by_agent(self, p_start, p_end, p_curso_id=None, p_sections=None):
+        agents = {agent["nip"]: agent for agent in self.tables[config.AGENTS_TABLE]}
+        activity_ids = {
+            activity["id"] for activity in self.tables[config.ACTIVITIES_TABLE]
+            if str(p_start) <= str(activity["fecha"]) <= str(p_end)
+            and (p_curso_id is None or activity.get("curso_id") == p_curso_id)
+        }
+        counts = Counter(
+            participant["agent_nip"] for participant in self.tables[config.PARTICIPANTS_TABLE]
+            if participant["activity_id"] in activity_ids and participant["agent_nip"] in agents
+            and (not p_sections or agents[participant["agent_nip"]].get("seccion") in p_sections)
+        )
+        return [{"agent_nip": nip, "participations": count}
+                for nip, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))]
+
+def generate_data(agents=400, courses=12, activities=600, participants_per_activity=8, days=540, seed=1):
+    """
+    Datos sintéticos con el esquema de sql/migrations
+
+    Las actividades se reparten en los `days` días anteriores y posteriores a hoy (una por
+    fecha y turno). El primer agente es monitor y su email es MONITOR_EMAIL.
+    """
+    rng = random.Random(seed)
+    first_names = ["Ana", "Luis", "Marta", "Carlos", "Lucía", "Javier", "Elena", "Pablo", "Sara", "Diego"]
+    surnames = ["García", "Fernández", "López", "Martínez", "Pérez", "Gómez", "Rodríguez", "Díaz", "Vázquez", "Iglesias"]
+
+    agent_rows = []
+    for i in range(agents):
+        agent_rows.append({
+            "nip": str(10000 + i),
+            "nombre": rng.choice(first_names),
+            "apellido1": rng.choice(surnames),
+            "apellido2": rng.choice(surnames) if i % 4 else None,
+            "seccion": rng.choice(config.SECTIONS),
+            "grupo": rng.choice(config.GROUPS),
+            "email": MONITOR_EMAIL if i == 0 else f"agente{i}@example.com",
+            "telefono": f"6{rng.randrange(10 ** 7, 10 ** 8)}",
+            "activo": rng.random() > 0.1,
+            "monitor": i == 0 or rng.random() < 0.05,
+            "created_at": "2024-01-01T00:00:00+00:00"
+        })
+    monitors = [agent["nip"] for agent in agent_rows if agent["monitor"]]
+
+    course_rows = [
+        {"id": i, "nombre": f"Curso {i:02d}", "descripcion": f"Formación {i:02d}", "ocultar": i % 6 == 0,
+         "created_at": "2024-01-01T00:00:00+00:00"}
+        for i in range(1, courses + 1)
+    ]
+
+    start = date.today() - timedelta(days=days)
+    slots = [(start + timedelta(days=day), shift) for day in range(days * 2) for shift in config.SHIFTS]
+    activity_rows = [
+        {"id": i, "fecha": slot_date.isoformat(), "turno": shift, "curso_id": rng.randint(1, courses),
+         "monitor_nip": rng.choice(monitors), "comentarios": None, "created_at": f"{slot_date.isoformat()}T08:00:00+00:00"}
+        for i, (slot_date, shift) in enumerate(sorted(rng.sample(slots, min(activities, len(slots)))), 1)
+    ]
+
+    participant_rows = []
+    for activity in activity_rows:
+        for agent in rng.sample(agent_rows, min(participants_per_activity, len(agent_rows))):
+            participant_rows.append({"id": len(participant_rows) + 1, "activity_id": activity["id"],
+                                     "agent_nip": agent["nip"], "created_at": activity["created_at"]})
+
+    return {
+        config.AGENTS_TABLE: agent_rows,
+        config.COURSES_TABLE: course_rows,
+        config.ACTIVITIES_TABLE: activity_rows,
+        config.PARTICIPANTS_TABLE: participant_rows,
+        config.USERS_TABLE: []
+    }
+
+def install(db):
+    """Sustituye los clientes de Supabase del proceso por `db` (antes de arrancar la app)"""
+    import supabase_pool
+    config.supabase = db
+    supabase_pool.create_session_client = db.session_client
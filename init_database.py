@@ -1,4 +1,5 @@
 import config
+import migrate
 import streamlit as st
 import pandas as pd
 
@@ -7,17 +8,16 @@ def initialize_database():
     Inicializa la base de datos con datos de prueba.
     Crea las tablas necesarias y un usuario asociado para probar el inicio de sesión.
     """
-    # Crear tablas
+    # Crear tablas aplicando las migraciones pendientes
     try:
-        print("Creando tablas...")
-        
-        # Leer el archivo SQL
-        with open('sql/functions.sql', 'r') as file:
-            sql_commands = file.read()
-        
-        # Ejecutar los comandos SQL
-        config.supabase.query(sql_commands).execute()
-        print("Tablas creadas correctamente.")
+        print("Aplicando migraciones...")
+        applied = migrate.run_migrations()
+        print(f"Migraciones aplicadas: {len(applied)}")
+    except Exception as e:
+        error_msg = f"Error al aplicar las migraciones: {str(e)}"
+        print(error_msg)
+        return False, error_msg
+
     try:
         print("Inicializando base de datos con datos de prueba...")
         
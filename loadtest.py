@@ -0,0 +1,501 @@
+"""
+Prueba de carga: muchas sesiones simultáneas recorriendo la aplicación.
+
+Arranca la aplicación (serve.py) sobre el sustituto local de Supabase
+(fake_supabase.py) y la recorre con clientes websocket sin navegador que hablan el
+protocolo de Streamlit, igual que el frontend: cada sesión inicia sesión y repite
+los flujos elegidos (abrir Actividades, cambiar filtros, generar el PDF de una
+actividad, el informe de la Vista Dinámica y editar un agente).
+
+Al terminar muestra, por paso, la latencia de cada ejecución del script (p50, p95,
+p99), los errores y las consultas a la base de datos, además del rendimiento total
+y la memoria por sesión (session_state y RSS del proceso).
+
+    python loadtest.py --sessions 20 --iterations 3
+    python loadtest.py --sessions 50 --ramp-up 10 --latency-ms 30 --json resultado.json
+
+Con --url se ataca un servidor ya arrancado con `python loadtest.py --serve-only`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import date, timedelta
+
+STATS_ENDPOINT = "_loadtest/stats"
+
+# --- Servidor (proceso de la aplicación) ---
+
+_db = None
+
+def _current_step():
+    """Paso de la prueba que ha provocado la consulta en curso (va en la query string)"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return "segundo plano"
+    return urllib.parse.parse_qs(ctx.query_string).get("paso", ["sin paso"])[0]
+
+def _server_stats(reset=False):
+    import metrics
+    import utils
+    sessions = utils.get_all_sessions_memory_report()
+    stats = {"backend": _db.stats(), "sesiones": sessions.to_dict("records"), "rss_bytes": metrics.rss_bytes()}
+    if reset:
+        _db.reset_stats()
+    return stats
+
+def serve(options):
+    """Arranca la aplicación sobre fake_supabase, con el endpoint de estadísticas de la prueba"""
+    global _db
+    import tornado.ioloop
+    import tornado.web
+    import fake_supabase
+    import serve as app_server
+
+    class StatsHandler(tornado.web.RequestHandler):
+        async def get(self):
+            reset = self.get_argument("reset", "") == "1"
+            stats = await tornado.ioloop.IOLoop.current().run_in_executor(None, _server_stats, reset)
+            self.set_header("Content-Type", "application/json; charset=utf-8")
+            self.finish(json.dumps(stats, default=app_server._json_default))
+
+    data = fake_supabase.generate_data(agents=options.agents, activities=options.activities)
+    _db = fake_supabase.FakeSupabase(data, latency=options.latency_ms / 1000, tagger=_current_step)
+    fake_supabase.install(_db)
+    app_server.add_endpoint(STATS_ENDPOINT, StatsHandler)
+    return app_server.main([
+        "--server.port", str(options.port), "--server.headless", "true",
+        "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"
+    ])
+
+def _get_json(url, timeout=10):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def start_server(options):
+    """Lanza el servidor en otro proceso y espera a que /readyz indique que está listo"""
+    log = open(os.path.join(tempfile.gettempdir(), f"loadtest_servidor_{options.port}.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve-only", "--port", str(options.port),
+         "--latency-ms", str(options.latency_ms), "--agents", str(options.agents),
+         "--activities", str(options.activities)],
+        stdout=log, stderr=subprocess.STDOUT, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    url = f"http://localhost:{options.port}"
+    deadline = time.monotonic() + 180
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"El servidor ha terminado al arrancar; ver {log.name}")
+        try:
+            _get_json(f"{url}/readyz", timeout=2)
+            return process, url
+        except Exception:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"El servidor no ha quedado listo en 180 s; ver {log.name}")
+
+# --- Cliente (una sesión de navegador simulada) ---
+
+class StepFailed(Exception):
+    pass
+
+class Session:
+    """
+    Sesión de Streamlit por websocket, sin navegador
+
+    Guarda los elementos de la última ejecución (para encontrar los widgets por clave
+    o etiqueta) y el estado de los widgets que ha cambiado, que envía en cada
+    ejecución como hace el frontend.
+    """
+
+    def __init__(self, url, timeout):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.ws = None
+        self.pages = {}  # nombre de la página -> page_script_hash
+        self.page_hash = ""
+        self.elements = {}  # delta_path -> (Element, fragment_id)
+        self.widget_states = {}  # id del widget -> WidgetState
+        self.messages = {}  # hash -> ForwardMsg, para resolver las referencias a mensajes ya enviados
+        self.results = []  # (paso, segundos, errores)
+        self._finished = None
+        self._reader = None
+
+    async def connect(self):
+        from tornado.websocket import websocket_connect
+        ws_url = self.url.replace("http", "ws", 1) + "/_stcore/stream"
+        self.ws = await websocket_connect(ws_url, subprotocols=["streamlit"], max_message_size=256 * 1024 ** 2)
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def close(self):
+        if self.ws is not None:
+            self.ws.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+    async def _read(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        while True:
+            data = await self.ws.read_message()
+            if data is None:
+                if self._finished is not None and not self._finished.done():
+                    self._finished.set_exception(StepFailed("conexión cerrada por el servidor"))
+                return
+            msg = ForwardMsg()
+            msg.ParseFromString(data)
+            if msg.ref_hash:
+                msg = await self._resolve(msg)
+            elif msg.metadata.cacheable:
+                self.messages[msg.hash] = msg
+            self._handle(msg)
+
+    async def _resolve(self, ref):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        cached = self.messages.get(ref.ref_hash)
+        if cached is None:
+            from tornado.httpclient import AsyncHTTPClient
+            response = await AsyncHTTPClient().fetch(f"{self.url}/_stcore/message?hash={ref.ref_hash}")
+            cached = ForwardMsg()
+            cached.ParseFromString(response.body)
+            self.messages[ref.ref_hash] = cached
+        msg = ForwardMsg()
+        msg.CopyFrom(cached)
+        msg.metadata.CopyFrom(ref.metadata)
+        return msg
+
+    def _handle(self, msg):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        kind = msg.WhichOneof("type")
+        if kind == "new_session":
+            if not msg.new_session.fragment_ids_this_run:
+                self.elements.clear()
+            self._set_pages(msg.new_session.app_pages)
+            self.page_hash = msg.new_session.page_script_hash or self.page_hash
+        elif kind == "navigation":
+            self._set_pages(msg.navigation.app_pages)
+            self.page_hash = msg.navigation.page_script_hash or self.page_hash
+        elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+            self.elements[tuple(msg.metadata.delta_path)] = (msg.delta.new_element, msg.delta.fragment_id)
+        elif kind == "page_not_found" and self._finished is not None and not self._finished.done():
+            self._finished.set_exception(StepFailed("página no encontrada"))
+        elif kind == "script_finished":
+            # Tras st.rerun() llega FINISHED_EARLY_FOR_RERUN y la ejecución continúa
+            if msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                if self._finished is not None and not self._finished.done():
+                    self._finished.set_result(msg.script_finished)
+
+    def _set_pages(self, app_pages):
+        for page in app_pages:
+            self.pages[page.page_name] = page.page_script_hash
+
+    # Widgets
+
+    def find(self, kind, key=None, label=None):
+        """Widget de tipo `kind` (radio, selectbox, button...) por su clave o su etiqueta"""
+        for path in sorted(self.elements):
+            element, fragment_id = self.elements[path]
+            if element.WhichOneof("type") != kind:
+                continue
+            proto = getattr(element, kind)
+            if (key and proto.id.endswith(f"-{key}")) or (label and proto.label == label):
+                return proto, fragment_id
+        raise StepFailed(f"no se encuentra {kind} {key or label!r}")
+
+    def set_value(self, kind, value, key=None, label=None):
+        """Cambia el valor de un widget, como lo haría el usuario; devuelve su fragmento"""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        proto, fragment_id = self.find(kind, key, label)
+        state = WidgetState(id=proto.id)
+        if kind in ("radio", "selectbox"):
+            state.int_value = list(proto.options).index(value)
+        elif kind == "multiselect":
+            state.int_array_value.data[:] = [list(proto.options).index(option) for option in value]
+        elif kind == "date_input":
+            state.string_array_value.data[:] = [value.strftime("%Y/%m/%d")]
+        elif kind == "text_input":
+            state.string_value = value
+        elif kind == "checkbox":
+            state.bool_value = value
+        else:
+            raise ValueError(f"Widget no soportado: {kind}")
+        self.widget_states[proto.id] = state
+        return fragment_id
+
+    def options(self, kind, key=None, label=None):
+        return list(self.find(kind, key, label)[0].options)
+
+    def errors(self):
+        from streamlit.proto.Alert_pb2 import Alert
+        found = []
+        for element, _ in self.elements.values():
+            kind = element.WhichOneof("type")
+            if kind == "alert" and element.alert.format == Alert.ERROR:
+                found.append(element.alert.body)
+            elif kind == "exception":
+                found.append(f"{element.exception.type}: {element.exception.message}")
+        return found
+
+    # Ejecuciones
+
+    async def rerun(self, step, button=None, fragment_id=""):
+        """
+        Pide una ejecución del script y espera a que termine, registrando su duración
+
+        Args:
+            step: nombre del paso (se envía en la query string para atribuirle las consultas)
+            button: (etiqueta o clave) de un botón a pulsar en esta ejecución
+            fragment_id: ejecutar solo ese fragmento (st.fragment), como hace el frontend
+        """
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        msg = BackMsg()
+        client_state = msg.rerun_script
+        client_state.query_string = urllib.parse.urlencode({"paso": step})
+        client_state.page_script_hash = self.page_hash
+        client_state.widget_states.widgets.extend(self.widget_states.values())
+        if button is not None:
+            try:
+                proto, button_fragment = self.find("button", key=button)
+            except StepFailed:
+                proto, button_fragment = self.find("button", label=button)
+            client_state.widget_states.widgets.append(WidgetState(id=proto.id, trigger_value=True))
+            fragment_id = fragment_id or button_fragment
+        if fragment_id:
+            client_state.fragment_id = fragment_id
+
+        self._finished = asyncio.get_running_loop().create_future()
+        started = time.perf_counter()
+        error = None
+        try:
+            await self.ws.write_message(msg.SerializeToString(), binary=True)
+            await asyncio.wait_for(self._finished, self.timeout)
+        except asyncio.TimeoutError:
+            error = f"sin respuesta en {self.timeout} s"
+        except Exception as e:
+            error = str(e)
+        elapsed = time.perf_counter() - started
+        errors = [error] if error else self.errors()
+        self.results.append((step, elapsed, errors))
+        if error:
+            raise StepFailed(error)
+
+    async def open_page(self, name, step):
+        if name not in self.pages:
+            raise StepFailed(f"no existe la página {name}")
+        self.page_hash = self.pages[name]
+        self.widget_states.clear()
+        await self.rerun(step)
+
+# --- Flujos ---
+
+async def flow_login(session, rng):
+    await session.rerun("inicio")
+    import fake_supabase
+    session.set_value("text_input", fake_supabase.MONITOR_EMAIL, key="email_input")
+    session.set_value("text_input", os.getenv("LOADTEST_PASSWORD", fake_supabase.DEFAULT_PASSWORD), key="password_input")
+    await session.rerun("login", button="Acceder")
+    if session.page_hash != session.pages.get("Actividades"):
+        raise StepFailed("el inicio de sesión no lleva a Actividades")
+
+async def flow_activities(session, rng):
+    await session.open_page("Actividades", "abrir_actividades")
+
+async def flow_filters(session, rng):
+    if session.page_hash != session.pages.get("Actividades"):
+        await flow_activities(session, rng)
+    session.set_value("date_input", date.today() - timedelta(days=rng.randint(30, 365)), label="Fecha inicio")
+    courses = session.options("multiselect", label="Filtrar por curso")[1:]
+    session.set_value("multiselect", rng.sample(courses, min(2, len(courses))), label="Filtrar por curso")
+    await session.rerun("filtros")
+
+async def flow_pdf(session, rng):
+    if session.page_hash != session.pages.get("Actividades"):
+        await flow_activities(session, rng)
+    label = "Seleccionar actividad para ver detalles de participantes"
+    fragment_id = session.set_value("selectbox", rng.choice(session.options("selectbox", label=label)), label=label)
+    await session.rerun("pdf", fragment_id=fragment_id)
+
+async def flow_dynamic_report(session, rng):
+    await session.open_page("Estadisticas", "abrir_estadisticas")
+    session.set_value("radio", "Vista Dinámica", key="stats_tab")
+    await session.rerun("vista_dinamica")
+    await session.rerun("informe_dinamico", button="Generar Informe")
+
+async def flow_edit_agent(session, rng):
+    await session.open_page("Agentes", "abrir_agentes")
+    session.set_value("radio", "Editar Agente", key="agents_tab")
+    await session.rerun("pestana_editar_agente")
+    label = "Seleccionar agente a editar"
+    fragment_id = session.set_value("selectbox", rng.choice(session.options("selectbox", label=label)), label=label)
+    await session.rerun("seleccionar_agente", fragment_id=fragment_id)
+    fragment_id = session.set_value("text_input", f"6{rng.randrange(10 ** 7, 10 ** 8)}", label="Teléfono")
+    await session.rerun("editar_agente", button="Actualizar Agente", fragment_id=fragment_id)
+
+# Flujos que repite cada sesión tras iniciar sesión, en orden
+FLOWS = {
+    "actividades": flow_activities,
+    "filtros": flow_filters,
+    "pdf": flow_pdf,
+    "estadistica_dinamica": flow_dynamic_report,
+    "editar_agente": flow_edit_agent
+}
+
+async def run_user(session, flows, iterations, think_time, start_delay, rng):
+    """Recorrido de una sesión; un paso fallido se registra y se pasa al siguiente flujo"""
+    await asyncio.sleep(start_delay)
+    try:
+        await session.connect()
+        await flow_login(session, rng)
+    except StepFailed:
+        return
+    except Exception as e:
+        session.results.append(("conexion", 0.0, [str(e)]))
+        return
+    for _ in range(iterations):
+        for name in flows:
+            try:
+                await FLOWS[name](session, rng)
+            except StepFailed:
+                pass
+            if think_time:
+                await asyncio.sleep(rng.expovariate(1 / think_time))
+
+async def run_load(url, options):
+    sessions = [Session(url, options.timeout) for _ in range(options.sessions)]
+    rng = random.Random(options.seed)
+    delay = options.ramp_up / options.sessions if options.sessions else 0
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            run_user(session, options.flows, options.iterations, options.think_time, i * delay,
+                     random.Random(rng.random()))
+            for i, session in enumerate(sessions)
+        ))
+        elapsed = time.perf_counter() - started
+        # Con las sesiones aún abiertas, para medir su memoria
+        stats = await asyncio.get_running_loop().run_in_executor(None, _get_json, f"{url}/{STATS_ENDPOINT}")
+    finally:
+        await asyncio.gather(*(session.close() for session in sessions), return_exceptions=True)
+    return sessions, elapsed, stats
+
+# --- Informe ---
+
+def percentile(values, pct):
+    """Percentil por el método del rango más cercano"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))]
+
+def build_report(sessions, elapsed, baseline, stats):
+    per_step = defaultdict(list)
+    errors = defaultdict(list)
+    for session in sessions:
+        for step, seconds, step_errors in session.results:
+            per_step[step].append(seconds)
+            errors[step].extend(step_errors)
+
+    queries = stats["backend"]["por_etiqueta"]
+    steps = []
+    for step, values in per_step.items():
+        step_queries = sum(queries.get(step, {}).values())
+        steps.append({
+            "paso": step,
+            "ejecuciones": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 1),
+            "p95_ms": round(percentile(values, 95) * 1000, 1),
+            "p99_ms": round(percentile(values, 99) * 1000, 1),
+            "errores": len(errors[step]),
+            "consultas": step_queries,
+            "consultas_por_ejecucion": round(step_queries / len(values), 2)
+        })
+
+    all_values = [value for values in per_step.values() for value in values]
+    memory = [row["bytes"] for row in stats["sesiones"]]
+    return {
+        "sesiones": len(sessions),
+        "duracion_s": round(elapsed, 2),
+        "ejecuciones": len(all_values),
+        "ejecuciones_por_s": round(len(all_values) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(all_values, 50) * 1000, 1) if all_values else None,
+        "p95_ms": round(percentile(all_values, 95) * 1000, 1) if all_values else None,
+        "p99_ms": round(percentile(all_values, 99) * 1000, 1) if all_values else None,
+        "pasos": steps,
+        "consultas": stats["backend"]["consultas"],
+        "consultas_en_segundo_plano": sum(queries.get("segundo plano", {}).values()),
+        "consultas_por_tabla": stats["backend"]["por_tabla"],
+        "memoria_sesion_media_bytes": round(sum(memory) / len(memory)) if memory else None,
+        "memoria_sesion_max_bytes": max(memory) if memory else None,
+        "rss_inicial_bytes": baseline["rss_bytes"],
+        "rss_final_bytes": stats["rss_bytes"],
+        "rss_por_sesion_bytes": round((stats["rss_bytes"] - baseline["rss_bytes"]) / len(sessions)) if sessions else None,
+        "errores": sorted({error for session in sessions for _, _, step_errors in session.results for error in step_errors})
+    }
+
+def print_report(report):
+    mb = 1024 ** 2
+    print(f"{report['sesiones']} sesiones, {report['ejecuciones']} ejecuciones en {report['duracion_s']:.1f} s "
+          f"({report['ejecuciones_por_s']} ejecuciones/s)")
+    print(f"Latencia total: p50 {report['p50_ms']} ms · p95 {report['p95_ms']} ms · p99 {report['p99_ms']} ms\n")
+    print(f"{'Paso':<24} {'Ejec.':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'Errores':>8} {'Consultas/ejec.':>16}")
+    for step in report["pasos"]:
+        print(f"{step['paso']:<24} {step['ejecuciones']:>6} {step['p50_ms']:>8} {step['p95_ms']:>8} "
+              f"{step['p99_ms']:>8} {step['errores']:>8} {step['consultas_por_ejecucion']:>16}")
+    print(f"\nConsultas a la base de datos: {report['consultas']} "
+          f"({report['consultas_en_segundo_plano']} en segundo plano)")
+    if report["memoria_sesion_media_bytes"] is not None:
+        print(f"session_state por sesión: media {report['memoria_sesion_media_bytes'] / 1024:.1f} KB, "
+              f"máximo {report['memoria_sesion_max_bytes'] / 1024:.1f} KB")
+    print(f"RSS del servidor: {report['rss_inicial_bytes'] / mb:.0f} MB → {report['rss_final_bytes'] / mb:.0f} MB "
+          f"({report['rss_por_sesion_bytes'] / mb:.2f} MB por sesión)")
+    for error in report["errores"][:10]:
+        print(f"  error: {error}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga con sesiones simultáneas sobre fake_supabase")
+    parser.add_argument("--sessions", type=int, default=10, help="Sesiones simultáneas")
+    parser.add_argument("--iterations", type=int, default=2, help="Veces que cada sesión repite los flujos")
+    parser.add_argument("--flows", nargs="+", choices=list(FLOWS), default=list(FLOWS),
+                        help="Flujos que recorre cada sesión tras iniciar sesión")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Segundos en los que se van abriendo las sesiones")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Pausa media entre flujos, en segundos")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Espera máxima por ejecución, en segundos")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia simulada de cada consulta a Supabase")
+    parser.add_argument("--agents", type=int, default=400, help="Agentes en los datos sintéticos")
+    parser.add_argument("--activities", type=int, default=600, help="Actividades en los datos sintéticos")
+    parser.add_argument("--port", type=int, default=8599, help="Puerto del servidor que se arranca")
+    parser.add_argument("--url", help="Usar un servidor ya arrancado (con --serve-only) en lugar de lanzar uno")
+    parser.add_argument("--serve-only", action="store_true", help="Solo arrancar el servidor sobre fake_supabase")
+    parser.add_argument("--seed", type=int, default=1, help="Semilla de las elecciones aleatorias")
+    parser.add_argument("--json", help="Guardar el informe en este archivo JSON")
+    options = parser.parse_args()
+
+    if options.serve_only:
+        sys.exit(serve(options))
+
+    process = None
+    url = options.url
+    if url is None:
+        process, url = start_server(options)
+    try:
+        baseline = _get_json(f"{url}/{STATS_ENDPOINT}?reset=1")
+        sessions, elapsed, stats = asyncio.run(run_load(url, options))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = build_report(sessions, elapsed, baseline, stats)
+    print_report(report)
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
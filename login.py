@@ -94,7 +94,7 @@ if not is_authenticated:
             st.session_state.form_password = password
 
             try:
-                response = config.supabase.auth.sign_in_with_password({
+                response = utils.get_auth_client().auth.sign_in_with_password({
                     "email": email,
                     "password": password
                 })
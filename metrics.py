@@ -0,0 +1,257 @@
+"""
+Métricas de la aplicación en formato de texto de Prometheus.
+
+serve.py las publica en /metrics, en el mismo puerto que la aplicación:
+
+    curl http://localhost:8501/metrics
+
+- Sesiones abiertas y memoria del proceso.
+- Ejecuciones (reruns) por página y su duración, completas o de un fragmento
+  (install() engancha el ejecutor de scripts de Streamlit).
+- Peticiones a Supabase por tabla, método y resultado, y su latencia (resilience.py).
+- Aciertos, fallos, cargas, refrescos y descartes de cada caché de utils (caching.py),
+  también de las funciones con st.cache_data y st.cache_resource, con sus entradas y memoria.
+- Tiempo de generación de los informes PDF (pdf_generator.py).
+
+Los contadores son del proceso desde que arrancó; con varias réplicas se agregan en
+Prometheus. El módulo solo usa la biblioteca estándar para que importarlo no cueste.
+"""
+import bisect
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+PREFIX = "gestor_cursos"
+
+# Límites (segundos) de los histogramas
+RERUN_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PDF_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def samples(self):
+        """Lista de (sufijo, etiquetas, valor) para la exposición"""
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [("", dict(zip(self.labels, key)), value) for key, value in self._values.items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=RERUN_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # Una cuenta por límite más la de +Inf, y la suma de los valores
+                counts = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][bisect.bisect_left(self.buckets, value)] += 1
+            counts[1] += value
+
+    def samples(self):
+        rows = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                labels = dict(zip(self.labels, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    rows.append(("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                rows.append(("_sum", labels, total))
+                rows.append(("_count", labels, cumulative))
+        return rows
+
+RERUNS = Counter("reruns_total", "Ejecuciones de las páginas", ("pagina", "tipo", "resultado"))
+RERUN_SECONDS = Histogram("rerun_duration_seconds", "Duración de las ejecuciones de las páginas",
+                          ("pagina", "tipo"), RERUN_BUCKETS)
+SUPABASE_REQUESTS = Counter("supabase_requests_total", "Peticiones a Supabase", ("tabla", "metodo", "resultado"))
+SUPABASE_SECONDS = Histogram("supabase_request_duration_seconds",
+                             "Duración de las peticiones a Supabase, con reintentos", ("tabla",), REQUEST_BUCKETS)
+PDF_SECONDS = Histogram("pdf_generation_duration_seconds", "Tiempo de generación de los informes PDF",
+                        ("resultado",), PDF_BUCKETS)
+
+_METRICS = [RERUNS, RERUN_SECONDS, SUPABASE_REQUESTS, SUPABASE_SECONDS, PDF_SECONDS]
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _render_metric(lines, name, kind, help, samples):
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} {kind}")
+    for suffix, labels, value in samples:
+        label_text = ",".join(f'{label}="{_escape(text)}"' for label, text in labels.items())
+        lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                     else f"{name}{suffix} {_format_value(value)}")
+
+# --- Supabase ---
+
+def supabase_table(url):
+    """Tabla, función rpc o servicio de autenticación al que va una petición a Supabase"""
+    path = urlsplit(str(url)).path
+    for prefix, label in (("/rest/v1/rpc/", "rpc/"), ("/rest/v1/", ""), ("/auth/v1/", "auth/")):
+        if prefix in path:
+            return label + path.split(prefix, 1)[1].strip("/").split("/", 1)[0]
+    return "otros"
+
+def observe_supabase_request(request, result, seconds):
+    table = supabase_table(request.url)
+    SUPABASE_REQUESTS.inc(tabla=table, metodo=request.method, resultado=result)
+    SUPABASE_SECONDS.observe(seconds, tabla=table)
+
+# --- Ejecuciones de las páginas ---
+
+def _page_label(ctx):
+    import profiler
+    try:
+        page = ctx.pages_manager.get_pages().get(ctx.page_script_hash)
+    except Exception:
+        page = None
+    return profiler.page_name(page["script_path"]) if page and page.get("script_path") else "desconocida"
+
+def install():
+    """Mide cada ejecución de las páginas; se llama una vez al arrancar el servidor (serve.py)"""
+    from streamlit.runtime.scriptrunner import script_runner
+    exec_with_handling = script_runner.exec_func_with_error_handling
+    if getattr(exec_with_handling, "_metrics", False):
+        return
+
+    def timed(func, ctx):
+        started = time.perf_counter()
+        outcome = exec_with_handling(func, ctx)
+        _, ran_without_errors, rerun_data, stopped, _ = outcome
+        try:
+            page = _page_label(ctx)
+            kind = "fragmento" if ctx.fragment_ids_this_run else "completa"
+            if rerun_data is not None:
+                result = "interrumpida"
+            elif stopped:
+                result = "detenida"
+            else:
+                result = "ok" if ran_without_errors else "error"
+            RERUNS.inc(pagina=page, tipo=kind, resultado=result)
+            RERUN_SECONDS.observe(time.perf_counter() - started, pagina=page, tipo=kind)
+        except Exception as e:
+            print(f"No se pudo registrar la ejecución en las métricas: {str(e)}")
+        return outcome
+
+    timed._metrics = True
+    script_runner.exec_func_with_error_handling = timed
+
+# --- Valores que se leen al consultar /metrics ---
+
+def rss_bytes():
+    """Memoria residente del proceso en bytes (máximo histórico si no hay /proc)"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+def _session_counts():
+    try:
+        from streamlit import runtime
+        if not runtime.exists():
+            return None
+        manager = runtime.get_instance()._session_mgr
+        return manager.num_sessions(), manager.num_active_sessions()
+    except Exception:
+        return None
+
+def _collect(lines):
+    """Métricas calculadas en el momento de la consulta: sesiones, memoria y cachés"""
+    sessions = _session_counts()
+    if sessions is not None:
+        _render_metric(lines, f"{PREFIX}_sessions", "gauge", "Sesiones abiertas en el proceso",
+                       [("", {}, sessions[0])])
+        _render_metric(lines, f"{PREFIX}_active_sessions", "gauge", "Sesiones con el navegador conectado",
+                       [("", {}, sessions[1])])
+    _render_metric(lines, f"{PREFIX}_process_resident_memory_bytes", "gauge", "Memoria residente del proceso",
+                   [("", {}, rss_bytes())])
+
+    # Cachés de utils (caching.swr_cache y caching.counted); solo si la aplicación ya las ha cargado
+    caching = sys.modules.get("caching")
+    if caching is None:
+        return
+    stats = caching.get_cache_stats()
+    requests, loads, refreshes, evictions, entries = [], [], [], [], []
+    for cache in stats:
+        function = {"funcion": cache["funcion"]}
+        for result, count in (("acierto", cache["aciertos"]), ("caducado", cache["caducados_servidos"]),
+                              ("fallo", cache["esperas"])):
+            requests.append(("", {**function, "resultado": result}, count))
+        loads.append(("", function, cache["cargas"]))
+        for result, count in (("ok", cache["refrescos"] - cache["refrescos_fallidos"] - cache["refrescos_en_otra_replica"]),
+                              ("fallido", cache["refrescos_fallidos"]),
+                              ("otra_replica", cache["refrescos_en_otra_replica"])):
+            refreshes.append(("", {**function, "resultado": result}, count))
+        evictions.append(("", function, cache["descartadas"]))
+        entries.append(("", function, cache["entradas"]))
+    # Funciones con st.cache_data o st.cache_resource (caching.counted)
+    sizes = []
+    for cache in caching.get_streamlit_cache_stats():
+        function = {"funcion": cache["funcion"]}
+        requests.append(("", {**function, "resultado": "acierto"}, max(cache["lecturas"] - cache["cargas"], 0)))
+        requests.append(("", {**function, "resultado": "fallo"}, cache["cargas"]))
+        loads.append(("", function, cache["cargas"]))
+        entries.append(("", function, cache["entradas"]))
+        if cache["bytes"] is not None:
+            sizes.append(("", function, cache["bytes"]))
+    _render_metric(lines, f"{PREFIX}_cache_requests_total", "counter",
+                   "Lecturas de las cachés de utils: acierto, valor caducado servido o fallo (espera a la carga)",
+                   requests)
+    _render_metric(lines, f"{PREFIX}_cache_loads_total", "counter", "Cargas guardadas en las cachés de utils", loads)
+    _render_metric(lines, f"{PREFIX}_cache_refreshes_total", "counter",
+                   "Refrescos en segundo plano de las cachés de utils", refreshes)
+    _render_metric(lines, f"{PREFIX}_cache_evictions_total", "counter",
+                   "Entradas descartadas por superar el máximo de cada caché de utils", evictions)
+    _render_metric(lines, f"{PREFIX}_cache_entries", "gauge", "Entradas en cada caché de utils", entries)
+    _render_metric(lines, f"{PREFIX}_cache_bytes", "gauge",
+                   "Memoria de los valores guardados por st.cache_data, serializados", sizes)
+
+def render():
+    """Todas las métricas en formato de texto de Prometheus (versión 0.0.4)"""
+    lines = []
+    for metric in _METRICS:
+        _render_metric(lines, metric.name, metric.kind, metric.help, metric.samples())
+    _collect(lines)
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
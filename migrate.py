@@ -0,0 +1,309 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from datetime import date
+
+# Cadena de conexión directa a Postgres (Supabase: Settings > Database > Connection string)
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "migrations")
+PLANS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "plans")
+
+# Bloqueo consultivo para que dos procesos no apliquen migraciones a la vez
+MIGRATIONS_LOCK_ID = 7318004
+
+# Índices que deben existir después de aplicar todas las migraciones: (tabla, índice)
+EXPECTED_INDEXES = [
+    ("activity_participants", "activity_participants_agent_nip_idx"),
+    ("activity_participants", "activity_participants_activity_id_idx"),
+    ("activities", "activities_fecha_idx"),
+    ("activities", "activities_curso_id_idx"),
+    ("activities", "activities_monitor_nip_idx"),
+    ("agents", "agents_email_idx"),
+    ("agents", "agents_search_trgm_idx"),
+    ("agents", "agents_seccion_grupo_idx"),
+    ("activity_daily_rollup", "activity_daily_rollup_fecha_idx"),
+    ("participation_daily_rollup", "participation_daily_rollup_fecha_idx"),
+]
+
+# Consultas más frecuentes de la aplicación cuyo plan se guarda para detectar regresiones
+HOT_QUERIES = {
+    "actividades_por_rango": (
+        "SELECT * FROM activities WHERE fecha >= %(start)s AND fecha <= %(end)s"
+    ),
+    "actividades_por_curso": (
+        "SELECT id FROM activities WHERE curso_id = (SELECT min(id) FROM courses)"
+    ),
+    "participantes_de_actividad": (
+        "SELECT agent_nip FROM activity_participants WHERE activity_id = (SELECT max(id) FROM activities)"
+    ),
+    "participaciones_de_agente": (
+        "SELECT activity_id FROM activity_participants WHERE agent_nip = (SELECT min(nip) FROM agents)"
+    ),
+    "agente_por_email": (
+        "SELECT * FROM agents WHERE email = (SELECT min(email) FROM agents)"
+    ),
+    "resumen_diario_por_rango": (
+        "SELECT * FROM participation_daily_rollup WHERE fecha >= %(start)s AND fecha <= %(end)s"
+    ),
+    "busqueda_agentes": (
+        "SELECT * FROM search_agents('gar', NULL, NULL, FALSE, FALSE, 'nip', FALSE, 25, 0)"
+    ),
+}
+
+def connect():
+    """Abre una conexión a Postgres usando DATABASE_URL"""
+    import psycopg
+
+    if not DATABASE_URL:
+        raise RuntimeError("La variable de entorno DATABASE_URL no está configurada")
+    return psycopg.connect(DATABASE_URL)
+
+def list_migrations():
+    """
+    Devuelve las migraciones disponibles ordenadas por versión
+
+    Returns:
+        list: tuplas (versión, nombre de archivo, contenido SQL, checksum)
+    """
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not filename.endswith(".sql"):
+            continue
+        version = filename.split("_", 1)[0]
+        with open(os.path.join(MIGRATIONS_DIR, filename), "r", encoding="utf-8") as file:
+            sql = file.read()
+        checksum = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+        migrations.append((version, filename, sql, checksum))
+    return migrations
+
+def _ensure_migrations_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(20) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum VARCHAR(64) NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def get_applied_migrations(conn):
+    """Diccionario versión -> checksum de las migraciones ya aplicadas"""
+    _ensure_migrations_table(conn)
+    rows = conn.execute("SELECT version, checksum FROM schema_migrations").fetchall()
+    return {version: checksum for version, checksum in rows}
+
+def run_migrations(conn=None):
+    """
+    Aplica en orden las migraciones pendientes, cada una en su propia transacción
+
+    Las migraciones ya aplicadas se saltan. Si el contenido de una migración aplicada
+    ha cambiado se avisa, pero no se vuelve a ejecutar: los cambios de esquema se
+    hacen siempre en un archivo nuevo.
+
+    Returns:
+        list: nombres de las migraciones aplicadas en esta ejecución
+    """
+    own_connection = conn is None
+    conn = conn or connect()
+    applied_now = []
+    try:
+        conn.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_ID,))
+        conn.commit()
+        try:
+            applied = get_applied_migrations(conn)
+            conn.commit()
+
+            for version, filename, sql, checksum in list_migrations():
+                if version in applied:
+                    if applied[version] != checksum:
+                        print(f"AVISO: la migración {filename} ha cambiado desde que se aplicó")
+                    continue
+
+                print(f"Aplicando {filename}...")
+                with conn.transaction():
+                    conn.execute(sql)
+                    conn.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                        (version, filename, checksum)
+                    )
+                applied_now.append(filename)
+        finally:
+            conn.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_ID,))
+            conn.commit()
+    finally:
+        if own_connection:
+            conn.close()
+    return applied_now
+
+def check_indexes(conn):
+    """
+    Comprueba que existen todos los índices de EXPECTED_INDEXES
+
+    Returns:
+        list: tuplas (tabla, índice) que faltan
+    """
+    rows = conn.execute(
+        "SELECT tablename, indexname FROM pg_indexes WHERE schemaname = 'public'"
+    ).fetchall()
+    existing = {(table, index) for table, index in rows}
+    return [expected for expected in EXPECTED_INDEXES if expected not in existing]
+
+def _summarize_plan(plan):
+    """Resume un plan JSON de EXPLAIN: tipos de nodo, índices usados y tablas leídas secuencialmente"""
+    summary = {"nodes": [], "indexes": [], "seq_scans": []}
+
+    def walk(node):
+        summary["nodes"].append(node["Node Type"])
+        if "Index Name" in node:
+            summary["indexes"].append(node["Index Name"])
+        if node["Node Type"] == "Seq Scan":
+            summary["seq_scans"].append(node.get("Relation Name"))
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan["Plan"])
+    summary["indexes"] = sorted(set(summary["indexes"]))
+    summary["seq_scans"] = sorted(set(summary["seq_scans"]))
+    summary["execution_time_ms"] = plan.get("Execution Time")
+    return summary
+
+def reconcile_counters(conn, fix=True):
+    """
+    Recalcula los contadores de participación (migración 0004) y devuelve las diferencias
+
+    Returns:
+        list: tuplas (entidad, clave, contador, valor guardado, valor real)
+    """
+    rows = conn.execute("SELECT * FROM reconcile_participation_counters(%s)", (fix,)).fetchall()
+    conn.commit()
+    return rows
+
+def explain_hot_queries(conn):
+    """
+    Ejecuta EXPLAIN ANALYZE sobre las consultas de HOT_QUERIES
+
+    Cada consulta se ejecuta dentro de una transacción que se deshace al terminar.
+
+    Returns:
+        dict: nombre -> plan JSON completo
+    """
+    today = date.today()
+    params = {"start": date(today.year, 1, 1), "end": today}
+    plans = {}
+    for name, query in HOT_QUERIES.items():
+        try:
+            row = conn.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params).fetchone()
+            plan = row[0]
+            plans[name] = plan[0] if isinstance(plan, list) else json.loads(plan)[0]
+        finally:
+            conn.rollback()
+    return plans
+
+def compare_plans(plans, plans_dir=PLANS_DIR):
+    """
+    Compara los planes con la referencia guardada en plans_dir
+
+    Se considera regresión que una consulta deje de usar un índice que usaba o que
+    pase a leer secuencialmente una tabla que antes no leía así. Una consulta sin
+    plan de referencia también se informa, para que no pase la comprobación sin
+    haberse comparado.
+
+    Returns:
+        list: mensajes de regresión
+    """
+    regressions = []
+    for name, plan in plans.items():
+        path = os.path.join(plans_dir, f"{name}.json")
+        if not os.path.exists(path):
+            regressions.append(
+                f"{name}: sin plan de referencia en {os.path.relpath(plans_dir)} (python migrate.py --update-plans)"
+            )
+            continue
+        with open(path, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["summary"]
+        current = _summarize_plan(plan)
+
+        lost_indexes = set(baseline["indexes"]) - set(current["indexes"])
+        new_seq_scans = set(current["seq_scans"]) - set(baseline["seq_scans"])
+        if lost_indexes:
+            regressions.append(f"{name}: deja de usar {', '.join(sorted(lost_indexes))}")
+        if new_seq_scans:
+            regressions.append(f"{name}: lectura secuencial nueva de {', '.join(sorted(new_seq_scans))}")
+    return regressions
+
+def save_plans(plans, plans_dir=PLANS_DIR):
+    """Guarda los planes (completo y resumen) como nueva referencia"""
+    os.makedirs(plans_dir, exist_ok=True)
+    for name, plan in plans.items():
+        with open(os.path.join(plans_dir, f"{name}.json"), "w", encoding="utf-8") as file:
+            json.dump({"summary": _summarize_plan(plan), "plan": plan}, file, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migraciones de la base de datos")
+    parser.add_argument("--status", action="store_true", help="Mostrar migraciones aplicadas y pendientes")
+    parser.add_argument("--check", action="store_true", help="Verificar que existen los índices esperados")
+    parser.add_argument("--plans", action="store_true",
+                        help="Ejecutar EXPLAIN ANALYZE de las consultas frecuentes y compararlo con la referencia")
+    parser.add_argument("--update-plans", action="store_true",
+                        help="Guardar los planes actuales como nueva referencia")
+    parser.add_argument("--reconcile", choices=["informar", "corregir"],
+                        help="Comparar los contadores de participación con los datos reales")
+    args = parser.parse_args()
+
+    with connect() as conn:
+        if args.status:
+            applied = get_applied_migrations(conn)
+            conn.commit()
+            for version, filename, _, checksum in list_migrations():
+                if version not in applied:
+                    state = "pendiente"
+                elif applied[version] != checksum:
+                    state = "aplicada (modificada después)"
+                else:
+                    state = "aplicada"
+                print(f"{filename}: {state}")
+            sys.exit(0)
+
+        if args.check:
+            missing = check_indexes(conn)
+            for table, index in missing:
+                print(f"Falta el índice {index} en {table}")
+            if missing:
+                sys.exit(1)
+            print("Todos los índices esperados existen.")
+            sys.exit(0)
+
+        if args.reconcile:
+            drift = reconcile_counters(conn, fix=args.reconcile == "corregir")
+            for entity, key, counter, stored, actual in drift:
+                print(f"{entity} {key}: {counter} = {stored}, real {actual}")
+            if not drift:
+                print("Los contadores de participación están al día.")
+            elif args.reconcile == "corregir":
+                print(f"Corregidas {len(drift)} diferencias.")
+            else:
+                sys.exit(1)
+            sys.exit(0)
+
+        if args.plans or args.update_plans:
+            plans = explain_hot_queries(conn)
+            if args.update_plans:
+                save_plans(plans)
+                print(f"Planes guardados en {PLANS_DIR}")
+                sys.exit(0)
+            regressions = compare_plans(plans)
+            for regression in regressions:
+                print(f"REGRESIÓN: {regression}")
+            if regressions:
+                sys.exit(1)
+            print("Sin regresiones en los planes de consulta.")
+            sys.exit(0)
+
+        applied_now = run_migrations(conn)
+        if applied_now:
+            print(f"Migraciones aplicadas: {', '.join(applied_now)}")
+        else:
+            print("La base de datos ya está al día.")
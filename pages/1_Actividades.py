@@ -3,7 +3,11 @@ import pandas as pd
 from datetime import datetime
 import config
 import utils
-import pdf_generator
+import profiler
+import widgets
+
+# Perfil de la ejecución, si está activado en la sesión (?perfil=1)
+profiler.start()
 
 # Check authentication
 utils.check_authentication()
@@ -18,59 +22,75 @@ if "activity_confirm_delete" not in st.session_state:
 if "activity_to_delete_id" not in st.session_state:
     st.session_state.activity_to_delete_id = None
 
-# Inicializar datos en el estado de la sesión
-if "activities_df" not in st.session_state:
-    st.session_state.activities_df = utils.get_all_activities()
+def refresh_activities():
+    """Publica una nueva versión de las actividades tras un cambio, descartando las cachés"""
+    utils.invalidate_activity_caches()
 
 # Page title
 st.title("🗓️ Gestión de Actividades")
 
-# Create tabs
-tab_lista, tab_anadir, tab_editar = st.tabs(["Próximas Actividades", "Añadir Actividad", "Editar Actividad"])
+# Detalle de participantes e informe PDF de la actividad seleccionada en la lista
+@st.fragment
+@profiler.fragment
+def render_activity_detail(display_df):
+    st.write("### Detalles de participantes")
+    if len(display_df) > 0:
+        # Usar el índice porque ya no tenemos IDs visibles
+        selected_idx = st.selectbox("Seleccionar actividad para ver detalles de participantes", 
+                                 range(len(display_df)),
+                                 format_func=lambda i: f"{display_df.iloc[i]['Fecha']} - {display_df.iloc[i]['Turno']} - {display_df.iloc[i]['Curso']}")
+        
+        if selected_idx is not None:
+            st.write(f"**Participantes de la actividad:**")
+            participants_str = display_df.iloc[selected_idx]['Participantes']
+            
+            if participants_str != "Sin participantes" and participants_str != "Error":
+                participant_list = participants_str.split(", ")
+                cols = st.columns(min(3, len(participant_list)))
+                
+                for i, participant in enumerate(participant_list):
+                    with cols[i % 3]:
+                        st.markdown(f"**{i+1}.** {participant}")
+                
+                # Obtener el ID de la actividad seleccionada para generar PDF
+                activity_id = display_df.iloc[selected_idx]['id']
+                
+                # Generar PDF (fpdf se carga solo cuando se abre el detalle de una actividad)
+                import pdf_generator
+                pdf_bytes = pdf_generator.generate_activity_report(activity_id)
+                
+                if pdf_bytes:
+                    # Crear un enlace de descarga para el PDF
+                    fecha = display_df.iloc[selected_idx]['Fecha']
+                    curso = display_df.iloc[selected_idx]['Curso']
+                    filename = f"actividad_{fecha}_{curso}.pdf".replace(" ", "_").replace("/", "-")
+                    
+                    pdf_link = pdf_generator.get_pdf_download_link(
+                        pdf_bytes, 
+                        filename=filename,
+                        text="📄 Descargar Informe PDF"
+                    )
+                    
+                    st.markdown(pdf_link, unsafe_allow_html=True)
+                else:
+                    st.error("No se pudo generar el PDF. Contacta al administrador.")
+            else:
+                st.info("Esta actividad no tiene participantes asignados.")
 
 # Tab: Próximas Actividades
-with tab_lista:
+@st.fragment
+@profiler.fragment
+def render_activities_list():
     st.subheader("Próximas Actividades")
     
-    # Usar el DataFrame almacenado en session_state
-    activities_df = st.session_state.activities_df
+    # Snapshot compartido entre sesiones
+    activities_df = utils.get_shared_frame("activities")
     
     if not activities_df.empty:
-        # Obtener listas de filtros posibles
-        cursos = []
-        monitores = []
-        all_participants = []
-        
-        # Recopilar datos para filtros
-        for _, activity in activities_df.iterrows():
-            # Obtener nombre del curso usando la función de utilidad
-            try:
-                if activity['curso_id']:
-                    curso_nombre = utils.get_course_name(activity['curso_id'])
-                    if curso_nombre and curso_nombre not in cursos and curso_nombre not in ["Sin curso asignado", "Curso no encontrado", "Error al obtener datos"]:
-                        cursos.append(curso_nombre)
-            except Exception as e:
-                print(f"Error al obtener curso para filtros: {str(e)}")
-                
-            # Obtener monitor
-            try:
-                if activity['monitor_nip']:
-                    monitor_name = utils.get_agent_name(activity['monitor_nip'])
-                    if monitor_name and monitor_name not in monitores:
-                        monitores.append(monitor_name)
-            except:
-                pass
-                
-            # Obtener participantes
-            try:
-                participants_response = config.supabase.table(config.PARTICIPANTS_TABLE).select("agent_nip").eq("activity_id", activity['id']).execute()
-                if participants_response.data:
-                    for p in participants_response.data:
-                        participant_name = utils.get_agent_name(p['agent_nip'])
-                        if participant_name and participant_name not in all_participants:
-                            all_participants.append(participant_name)
-            except:
-                pass
+        # Listas de filtros posibles; la vista ya trae resueltos curso, monitor y participantes
+        cursos = activities_df['curso_nombre'].dropna().unique().tolist()
+        monitores = activities_df['monitor_nombre'].dropna().unique().tolist()
+        all_participants = list({name for names in activities_df['participant_names'] for name in names})
         
         # Ordenar las listas para los filtros
         cursos.sort()
@@ -102,142 +122,61 @@ with tab_lista:
                 # Filtro de participante
                 filtro_participante = st.multiselect("Filtrar por participante", ["Todos"] + all_participants, default="Todos")
         
-        # Create a display dataframe with additional information
-        display_df = pd.DataFrame()
-        filtered_count = 0
+        # Aplicar filtros
+        fechas = pd.to_datetime(activities_df['fecha']).dt.date
+        mask = (fechas >= fecha_inicio) & (fechas <= fecha_fin)
         
-        # Process each activity to get full information
-        for idx, activity in activities_df.iterrows():
-            # Get course name using the utility function
-            try:
-                curso_nombre = utils.get_course_name(activity['curso_id'])
-            except Exception as e:
-                curso_nombre = "Sin curso"
+        if "Todos" not in filtro_curso:
+            mask &= activities_df['curso_nombre'].isin(filtro_curso)
             
-            # Get monitor name
-            try:
-                monitor_name = utils.get_agent_name(activity['monitor_nip']) if activity['monitor_nip'] else "Sin monitor"
-            except:
-                monitor_name = "Error"
-            
-            # Get participants
-            try:
-                participants_response = config.supabase.table(config.PARTICIPANTS_TABLE).select("agent_nip").eq("activity_id", activity['id']).execute()
-                participant_nips = [p['agent_nip'] for p in participants_response.data] if participants_response.data else []
-                
-                participant_names = []
-                if participant_nips:
-                    for nip in participant_nips:
-                        participant_names.append(utils.get_agent_name(nip))
-                    participants_str = ", ".join(participant_names)
-                else:
-                    participants_str = "Sin participantes"
-            except:
-                participants_str = "Error"
-                participant_names = []
-            
-            # Format date
-            fecha_formatted = utils.format_date(activity['fecha'])
-            fecha_obj = datetime.strptime(activity['fecha'], "%Y-%m-%d").date()
-            
-            # Aplicar filtros
-            pasa_filtro = True
-            
-            # Filtro de fechas
-            if fecha_obj < fecha_inicio or fecha_obj > fecha_fin:
-                pasa_filtro = False
-            
-            # Filtro de curso
-            if "Todos" not in filtro_curso and curso_nombre not in filtro_curso:
-                pasa_filtro = False
-                
-            # Filtro de monitor
-            if "Todos" not in filtro_monitor and monitor_name not in filtro_monitor:
-                pasa_filtro = False
-                
-            # Filtro de participante
-            if "Todos" not in filtro_participante:
-                participante_encontrado = False
-                for participante in participant_names:
-                    if participante in filtro_participante:
-                        participante_encontrado = True
-                        break
-                if not participante_encontrado:
-                    pasa_filtro = False
+        if "Todos" not in filtro_monitor:
+            mask &= activities_df['monitor_nombre'].isin(filtro_monitor)
             
-            if pasa_filtro:
-                filtered_count += 1
-                # Add to display dataframe
-                display_df = pd.concat([display_df, pd.DataFrame({
-                    'Fecha': [fecha_formatted],
-                    'Turno': [activity['turno']],
-                    'Curso': [curso_nombre],
-                    'Monitor': [monitor_name],
-                    'Participantes': [participants_str],
-                    'id': [activity['id']]  # Guardar ID para generar PDF
-                })], ignore_index=True)
+        if "Todos" not in filtro_participante:
+            selected_participants = set(filtro_participante)
+            mask &= activities_df['participant_names'].apply(lambda names: not selected_participants.isdisjoint(names))
+        
+        filtered_df = activities_df[mask]
+        filtered_count = len(filtered_df)
+        
+        # Create a display dataframe with additional information
+        display_df = pd.DataFrame({
+            'Fecha': filtered_df['fecha'],
+            'Turno': filtered_df['turno'],
+            'Curso': filtered_df['curso_nombre'].astype(object).fillna("Sin curso asignado"),
+            'Monitor': filtered_df['monitor_nombre'].astype(object).fillna("Sin monitor"),
+            'Participantes': filtered_df['participant_names'].apply(
+                lambda names: ", ".join(names) if names else "Sin participantes"
+            ),
+            'id': filtered_df['id']  # Guardar ID para generar PDF
+        }).reset_index(drop=True)
         
         # Visualización de participantes más clara
         if not display_df.empty:
-            # Display the dataframe
-            st.dataframe(
+            # Solo se envía al navegador la página visible
+            page_df = widgets.paginated_grid(
                 display_df,
-                use_container_width=True,
-                hide_index=True
+                key="activities_grid",
+                formatters={'Fecha': utils.format_date},
+                column_config={'id': None},
+                sort_by='Fecha',
+                search_columns=['Curso', 'Monitor', 'Participantes']
             )
             
-            # Mostrar actividades seleccionadas para ver detalles
-            st.write("### Detalles de participantes")
-            if len(display_df) > 0:
-                # Usar el índice porque ya no tenemos IDs visibles
-                selected_idx = st.selectbox("Seleccionar actividad para ver detalles de participantes", 
-                                         range(len(display_df)),
-                                         format_func=lambda i: f"{display_df.iloc[i]['Fecha']} - {display_df.iloc[i]['Turno']} - {display_df.iloc[i]['Curso']}")
-                
-                if selected_idx is not None:
-                    st.write(f"**Participantes de la actividad:**")
-                    participants_str = display_df.iloc[selected_idx]['Participantes']
-                    
-                    if participants_str != "Sin participantes" and participants_str != "Error":
-                        participant_list = participants_str.split(", ")
-                        cols = st.columns(min(3, len(participant_list)))
-                        
-                        for i, participant in enumerate(participant_list):
-                            with cols[i % 3]:
-                                st.markdown(f"**{i+1}.** {participant}")
-                        
-                        # Obtener el ID de la actividad seleccionada para generar PDF
-                        activity_id = display_df.iloc[selected_idx]['id']
-                        
-                        # Generar PDF
-                        pdf_bytes = pdf_generator.generate_activity_report(activity_id)
-                        
-                        if pdf_bytes:
-                            # Crear un enlace de descarga para el PDF
-                            fecha = display_df.iloc[selected_idx]['Fecha']
-                            curso = display_df.iloc[selected_idx]['Curso']
-                            filename = f"actividad_{fecha}_{curso}.pdf".replace(" ", "_").replace("/", "-")
-                            
-                            pdf_link = pdf_generator.get_pdf_download_link(
-                                pdf_bytes, 
-                                filename=filename,
-                                text="📄 Descargar Informe PDF"
-                            )
-                            
-                            st.markdown(pdf_link, unsafe_allow_html=True)
-                        else:
-                            st.error("No se pudo generar el PDF. Contacta al administrador.")
-                    else:
-                        st.info("Esta actividad no tiene participantes asignados.")
+            # Detalle de la actividad seleccionada en la página visible
+            # (fragmento propio: cambiar la selección no recalcula la lista)
+            render_activity_detail(page_df)
             
-            st.info(f"Mostrando {len(display_df)} de {len(activities_df)} actividades (filtradas: {filtered_count})")
+            st.info(f"Mostrando {len(page_df)} de {len(activities_df)} actividades (filtradas: {filtered_count})")
         else:
             st.warning("No hay actividades que coincidan con los filtros seleccionados.")
     else:
         st.warning("No hay actividades disponibles en la base de datos.")
 
 # Tab: Añadir Actividad
-with tab_anadir:
+@st.fragment
+@profiler.fragment
+def render_add_activity():
     st.subheader("Añadir Nueva Actividad")
     
     # Obtener información del usuario para asignar como monitor predeterminado
@@ -253,6 +192,11 @@ with tab_anadir:
     except Exception as e:
         st.error(f"Error al obtener información del usuario: {str(e)}")
     
+    # Selector de participantes fuera del formulario, para poder buscar mientras se escribe
+    with st.container(border=True):
+        st.markdown("**Asignar agentes (opcional)**")
+        selected_nips = widgets.agent_picker("add_activity_agents")
+    
     # Todos los usuarios autenticados pueden programar actividades
     # Create form
     with st.form("add_activity_form"):
@@ -261,26 +205,6 @@ with tab_anadir:
         with col1:
             fecha = st.date_input("Fecha *", datetime.now())
             turno = st.selectbox("Turno *", [""] + config.SHIFTS)
-            
-            # Expandir para mostrar campos adicionales
-            with st.expander("Asignar agentes (opcional)", expanded=False):
-                # Get all active agents
-                agents_df = utils.get_all_agents(active_only=True)
-                
-                if not agents_df.empty:
-                    # Create multiselect with all agents
-                    agent_options = {f"{agent['nip']} - {agent['nombre']} {agent['apellido1']} {agent['apellido2']}".strip(): agent['nip'] for _, agent in agents_df.iterrows()}
-                    
-                    selected_agents = st.multiselect(
-                        "Seleccionar agentes participantes",
-                        options=list(agent_options.keys())
-                    )
-                    
-                    # Convert selections to NIPs
-                    selected_nips = [agent_options[agent] for agent in selected_agents]
-                else:
-                    st.warning("No hay agentes activos disponibles.")
-                    selected_nips = []
         
         with col2:
             # Get available courses
@@ -365,23 +289,23 @@ with tab_anadir:
                             activity_id = result.data[0]['id']
                             
                             # Si hay participantes seleccionados, guardarlos
-                            if 'selected_nips' in locals() and selected_nips:
+                            if selected_nips:
                                 try:
-                                    for nip in selected_nips:
-                                        participant_data = {
-                                            'activity_id': activity_id,
-                                            'agent_nip': nip
-                                        }
-                                        config.supabase.table(config.PARTICIPANTS_TABLE).insert(participant_data).execute()
-                                        
+                                    # Todos los participantes en una sola petición
+                                    participant_data = [
+                                        {'activity_id': activity_id, 'agent_nip': nip} for nip in selected_nips
+                                    ]
+                                    config.supabase.table(config.PARTICIPANTS_TABLE).insert(participant_data).execute()
+                                    
                                     st.success(f"Actividad añadida correctamente para el {fecha.strftime('%d/%m/%Y')} en turno {turno} con {len(selected_nips)} participantes")
                                 except Exception as e:
                                     st.warning(f"Actividad creada pero hubo un error al asignar participantes: {str(e)}")
                             else:
                                 st.success(f"Actividad añadida correctamente para el {fecha.strftime('%d/%m/%Y')} en turno {turno}")
                                 
-                            # Actualizar DataFrame en session_state
-                            st.session_state.activities_df = utils.get_all_activities()
+                            # Publicar la nueva versión de las actividades y vaciar el selector
+                            refresh_activities()
+                            widgets.reset_agent_picker("add_activity_agents")
                             st.rerun()
                         else:
                             st.error("Error al añadir la actividad")
@@ -391,22 +315,19 @@ with tab_anadir:
 
 
 # Tab: Edit Activity
-with tab_editar:
+@st.fragment
+@profiler.fragment
+def render_edit_activity():
     st.subheader("Editar Actividad Existente")
     
-    # Usar el DataFrame almacenado en session_state
-    activities_df = st.session_state.activities_df
+    # Snapshot compartido entre sesiones
+    activities_df = utils.get_shared_frame("activities")
     
     if not activities_df.empty:
         # Create activity options for selection (same as in Tab 3)
         activity_options = []
         for _, activity in activities_df.iterrows():
-            # Get course name using the utility function
-            try:
-                curso_nombre = utils.get_course_name(activity['curso_id'])
-            except Exception as e:
-                st.error(f"Error al obtener el curso: {str(e)}")
-                curso_nombre = "Sin curso"
+            curso_nombre = activity['curso_nombre'] if pd.notna(activity['curso_nombre']) else "Sin curso"
             
             # Format date
             fecha_formatted = utils.format_date(activity['fecha'])
@@ -454,7 +375,7 @@ with tab_editar:
                                 st.session_state.activity_confirm_delete = False
                                 st.session_state.activity_to_delete_id = None
                                 # Actualizar DataFrame de actividades
-                                st.session_state.activities_df = utils.get_all_activities()
+                                refresh_activities()
                                 st.rerun()
                             else:
                                 st.error("Error al eliminar la actividad")
@@ -468,6 +389,15 @@ with tab_editar:
                         st.session_state.activity_to_delete_id = None
                         st.rerun()
             
+            # Sección de participantes: el selector va fuera del formulario para poder buscar
+            # mientras se escribe; la selección se guarda con «Guardar Cambios»
+            st.subheader("Gestión de Participantes")
+            participants_key = f"edit_activity_agents_{selected_activity_id}"
+            selected_nips = widgets.agent_picker(
+                participants_key,
+                default_nips=list(activity_data['participant_nips'])
+            )
+            
             # Si no estamos en modo de confirmación, mostrar el formulario de edición unificado
             # En lugar de usar tabs, mostramos todo en una sola vista
             with st.form("edit_activity_form"):
@@ -477,11 +407,8 @@ with tab_editar:
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    # Convert string date to datetime
-                    try:
-                        current_date = datetime.strptime(activity_data['fecha'], "%Y-%m-%d")
-                    except:
-                        current_date = datetime.now()
+                    # La fecha ya viene tipada desde utils.build_typed_frame
+                    current_date = activity_data['fecha'].date() if pd.notna(activity_data['fecha']) else datetime.now()
                     
                     fecha = st.date_input("Fecha *", current_date)
                     turno = st.selectbox(
@@ -503,7 +430,7 @@ with tab_editar:
                     
                     if current_course_id:
                         # Encontrar el nombre del curso actual
-                        current_course_name = utils.get_course_name(current_course_id)
+                        current_course_name = activity_data['curso_nombre']
                         # Buscar el índice por nombre
                         for i, option in enumerate(course_options):
                             if option == current_course_name:
@@ -533,7 +460,7 @@ with tab_editar:
                     
                     if current_monitor_nip:
                         # Encontrar el nombre del monitor actual
-                        current_monitor_name = utils.get_agent_name(current_monitor_nip)
+                        current_monitor_name = activity_data['monitor_nombre']
                         # Buscar el índice por nombre (aproximado, solo nombre y primer apellido)
                         for i, option in enumerate(monitor_options):
                             if i > 0 and option in current_monitor_name:  # Saltamos la opción vacía
@@ -551,42 +478,6 @@ with tab_editar:
                                 monitor_nip = monitor['nip']
                                 break
                 
-                # Sección de participantes
-                st.subheader("Gestión de Participantes")
-                
-                # Get current participants
-                current_participants = []
-                try:
-                    participants_response = config.supabase.table(config.PARTICIPANTS_TABLE).select("agent_nip").eq("activity_id", selected_activity_id).execute()
-                    current_participants = [p['agent_nip'] for p in participants_response.data] if participants_response.data else []
-                except Exception as e:
-                    st.error(f"Error al cargar participantes: {str(e)}")
-                
-                # Get all active agents
-                agents_df = utils.get_all_agents(active_only=True)
-                
-                if not agents_df.empty:
-                    # Create multiselect with all agents
-                    agent_options = {f"{agent['nombre']} {agent['apellido1']} {agent['apellido2']}".strip(): agent['nip'] for _, agent in agents_df.iterrows()}
-                    
-                    # Determine default selections by NIP
-                    default_values = []
-                    for agent_name, nip in agent_options.items():
-                        if nip in current_participants:
-                            default_values.append(agent_name)
-                    
-                    selected_agents = st.multiselect(
-                        "Seleccionar agentes participantes",
-                        options=list(agent_options.keys()),
-                        default=default_values
-                    )
-                    
-                    # Convert selections to NIPs
-                    selected_nips = [agent_options[agent] for agent in selected_agents]
-                else:
-                    st.warning("No hay agentes activos disponibles.")
-                    selected_nips = []
-                
                 # Botones en una fila
                 col1, col2 = st.columns(2)
                 with col1:
@@ -626,20 +517,22 @@ with tab_editar:
                                         # First delete all current participants
                                         config.supabase.table(config.PARTICIPANTS_TABLE).delete().eq("activity_id", selected_activity_id).execute()
                                         
-                                        # Then add new participants
-                                        for nip in selected_nips:
-                                            participant_data = {
-                                                'activity_id': selected_activity_id,
-                                                'agent_nip': nip
-                                            }
+                                        # Then add new participants, en una sola petición
+                                        if selected_nips:
+                                            participant_data = [
+                                                {'activity_id': selected_activity_id, 'agent_nip': nip}
+                                                for nip in selected_nips
+                                            ]
                                             config.supabase.table(config.PARTICIPANTS_TABLE).insert(participant_data).execute()
                                         
                                         st.success(f"Actividad actualizada correctamente con {len(selected_nips)} participantes")
                                     except Exception as e:
                                         st.warning(f"Actividad actualizada pero hubo un error al gestionar participantes: {str(e)}")
                                     
-                                    # Actualizar DataFrame en session_state
-                                    st.session_state.activities_df = utils.get_all_activities()
+                                    # Publicar la nueva versión de las actividades; el selector se
+                                    # vuelve a cargar con los participantes guardados
+                                    refresh_activities()
+                                    widgets.reset_agent_picker(participants_key)
                                     st.rerun()
                                 else:
                                     st.error("Error al actualizar la actividad")
@@ -653,3 +546,13 @@ with tab_editar:
                     st.rerun()
     else:
         st.warning("No hay actividades disponibles para editar.")
+
+# Solo se ejecuta la pestaña seleccionada. Cada pestaña es un fragmento: sus filtros y
+# formularios vuelven a ejecutar esa pestaña, no la página completa
+active_tab = utils.select_tab(["Próximas Actividades", "Añadir Actividad", "Editar Actividad"], key="activities_tab")
+if active_tab == "Próximas Actividades":
+    render_activities_list()
+elif active_tab == "Añadir Actividad":
+    render_add_activity()
+else:
+    render_edit_activity()
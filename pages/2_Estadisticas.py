@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import config
 import utils
+import profiler
+import widgets
+
+# Perfil de la ejecución, si está activado en la sesión (?perfil=1)
+profiler.start()
 
 # Check authentication
 utils.check_authentication()
@@ -15,11 +18,8 @@ utils.setup_sidebar()
 # Page title
 st.title("📊 Estadísticas")
 
-# Tabs para diferentes vistas
-tab1, tab2 = st.tabs(["Dashboard General", "Vista Dinámica"])
-
 # Main function
-def show_statistics():
+def show_statistics(active_tab):
     # Valores predeterminados para fechas
     today = datetime.now()
     start_of_year = datetime(today.year, 1, 1)
@@ -28,8 +28,10 @@ def show_statistics():
     default_start_date = start_of_year
     default_end_date = today
     
-    # Parte 1: Dashboard General
-    with tab1:
+    # Parte 1: Dashboard General (fragmento: los filtros solo recalculan el dashboard)
+    @st.fragment
+    @profiler.fragment
+    def show_dashboard():
         st.header("Dashboard General")
         
         # Crear contenedor para filtros
@@ -70,7 +72,7 @@ def show_statistics():
                     agents_df = utils.get_all_agents()
                     if not agents_df.empty:
                         # Get unique sections
-                        sections = sorted(agents_df['seccion'].unique().tolist())
+                        sections = sorted(agents_df['seccion'].dropna().unique().tolist())
                         sections = [s for s in sections if s]  # Remove empty values
                         
                         dash_selected_sections = st.multiselect(
@@ -116,35 +118,22 @@ def show_statistics():
 
         # Apply filters and load data
         try:
-            # Get all activities within date range
-            activities_response = config.supabase.table(config.ACTIVITIES_TABLE).select("*").gte("fecha", dash_start_date.strftime("%Y-%m-%d")).lte("fecha", dash_end_date.strftime("%Y-%m-%d")).execute()
-            
-            if not activities_response.data:
-                st.warning("No hay actividades en el rango de fechas seleccionado")
-                return
+            # Resúmenes diarios del rango: unos cientos de filas en lugar de todas las participaciones
+            activity_rollup, participations_df, by_agent_df = utils.get_dashboard_data(
+                dash_start_date,
+                dash_end_date,
+                curso_id=dash_selected_course if dash_selected_course else None,
+                secciones=dash_selected_sections if dash_selected_sections else None,
+                agentes=dash_selected_agents if dash_selected_agents else None
+            )
             
-            activities_df = pd.DataFrame(activities_response.data)
-            
-            # Apply course filter if specified
-            if dash_selected_course:
-                activities_df = activities_df[activities_df['curso_id'] == dash_selected_course]
-                if activities_df.empty:
+            if activity_rollup.empty:
+                if dash_selected_course:
                     st.warning("No hay actividades para el curso seleccionado en el rango de fechas")
-                    return
-            
-            # Get all participants
-            participants_response = config.supabase.table(config.PARTICIPANTS_TABLE).select("*").execute()
-            
-            if not participants_response.data:
-                st.warning("No hay participantes registrados en actividades")
+                else:
+                    st.warning("No hay actividades en el rango de fechas seleccionado")
                 return
             
-            participants_df = pd.DataFrame(participants_response.data)
-            
-            # Filter activities to only those in our dataset
-            activity_ids = activities_df['id'].tolist()
-            participants_df = participants_df[participants_df['activity_id'].isin(activity_ids)]
-            
             # Get agent details
             agents_df = utils.get_all_agents()
             
@@ -157,31 +146,26 @@ def show_statistics():
                 # Si se seleccionaron agentes específicos, filtramos solo por ellos
                 agents_df = agents_df[agents_df['nip'].isin(dash_selected_agents)]
             
-            # Filter participants to only include agents that match our filters
-            agent_nips = agents_df['nip'].tolist()
-            filtered_participants_df = participants_df[participants_df['agent_nip'].isin(agent_nips)]
-            
             # Get courses data
-            courses_response = config.supabase.table(config.COURSES_TABLE).select("*").execute()
-            courses_df = pd.DataFrame(courses_response.data) if courses_response.data else pd.DataFrame()
+            courses_df = utils.get_all_courses(include_hidden=True)
             
             # Proceed with data analysis
-            if not filtered_participants_df.empty:
+            if not participations_df.empty and participations_df['participations'].sum() > 0:
                 # Display statistics
                 st.header("Análisis de Participación")
                 
                 # 1. Overview metrics
                 col1, col2, col3, col4 = st.columns(4)
                 
-                total_activities = len(activities_df)
+                total_activities = int(activity_rollup['activities'].sum())
                 with col1:
                     st.metric("Total Actividades", total_activities)
                 
-                total_participations = len(filtered_participants_df)
+                total_participations = int(participations_df['participations'].sum())
                 with col2:
                     st.metric("Total Participaciones", total_participations)
                 
-                unique_participants = filtered_participants_df['agent_nip'].nunique()
+                unique_participants = len(by_agent_df)
                 with col3:
                     st.metric("Agentes Únicos", unique_participants)
                 
@@ -192,224 +176,215 @@ def show_statistics():
                 # 2. Participation by section
                 st.subheader("Participación por Sección")
                 
-                # Create participation by section data
-                section_participation = []
-                for _, participant in filtered_participants_df.iterrows():
-                    agent_data = agents_df[agents_df['nip'] == participant['agent_nip']]
-                    if not agent_data.empty:
-                        section = agent_data.iloc[0]['seccion']
-                        if section:  # Only include if section is not empty
-                            section_participation.append(section)
-                
-                section_counts = pd.Series(section_participation).value_counts().reset_index()
+                section_counts = participations_df[participations_df['seccion'].fillna("") != ""].groupby(
+                    'seccion'
+                )['participations'].sum().sort_values(ascending=False).reset_index()
                 section_counts.columns = ['Sección', 'Participaciones']
                 
                 if not section_counts.empty:
-                    fig = px.bar(
-                        section_counts, 
-                        x='Sección', 
+                    widgets.plotly_chart(
+                        "bar",
+                        section_counts,
+                        x='Sección',
                         y='Participaciones',
                         color='Participaciones',
                         color_continuous_scale='Blues',
-                        title='Participaciones por Sección'
+                        title='Participaciones por Sección',
+                        layout={'xaxis_title': 'Sección', 'yaxis_title': 'Número de Participaciones'}
                     )
-                    fig.update_layout(xaxis_title='Sección', yaxis_title='Número de Participaciones')
-                    st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.info("No hay datos de participación por sección")
                 
                 # 3. Participation by group
                 st.subheader("Participación por Grupo")
                 
-                # Create participation by group data
-                group_participation = []
-                for _, participant in filtered_participants_df.iterrows():
-                    agent_data = agents_df[agents_df['nip'] == participant['agent_nip']]
-                    if not agent_data.empty:
-                        group = agent_data.iloc[0]['grupo']
-                        if group:  # Only include if group is not empty
-                            group_participation.append(group)
-                
-                group_counts = pd.Series(group_participation).value_counts().reset_index()
+                group_counts = participations_df[participations_df['grupo'].fillna("") != ""].groupby(
+                    'grupo'
+                )['participations'].sum().sort_values(ascending=False).reset_index()
                 group_counts.columns = ['Grupo', 'Participaciones']
                 
                 if not group_counts.empty:
-                    fig = px.bar(
-                        group_counts, 
-                        x='Grupo', 
+                    widgets.plotly_chart(
+                        "bar",
+                        group_counts,
+                        x='Grupo',
                         y='Participaciones',
                         color='Participaciones',
                         color_continuous_scale='Greens',
-                        title='Participaciones por Grupo'
+                        title='Participaciones por Grupo',
+                        layout={'xaxis_title': 'Grupo', 'yaxis_title': 'Número de Participaciones'}
                     )
-                    fig.update_layout(xaxis_title='Grupo', yaxis_title='Número de Participaciones')
-                    st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.info("No hay datos de participación por grupo")
                 
                 # 4. Activity participation over time
                 st.subheader("Participación a lo largo del tiempo")
                 
-                # Create time series data
-                time_data = []
-                for _, activity in activities_df.iterrows():
-                    activity_id = activity['id']
-                    activity_date = activity['fecha']
-                    
-                    # Count participants for this activity (filtered by our criteria)
-                    participants_count = len(filtered_participants_df[filtered_participants_df['activity_id'] == activity_id])
-                    
-                    time_data.append({
-                        'Fecha': activity_date,
-                        'Participantes': participants_count
-                    })
-                
-                time_df = pd.DataFrame(time_data)
+                # Participantes por día; los días con actividades sin participantes cuentan 0
+                activity_days = pd.Index(activity_rollup['fecha'].unique(), name='Fecha')
+                time_df = participations_df.groupby('fecha')['participations'].sum().reindex(
+                    activity_days, fill_value=0
+                ).reset_index()
+                time_df.columns = ['Fecha', 'Participantes']
                 if not time_df.empty:
                     time_df['Fecha'] = pd.to_datetime(time_df['Fecha'])
                     time_df = time_df.sort_values('Fecha')
                     
-                    fig = px.line(
-                        time_df, 
-                        x='Fecha', 
+                    # Por días, semanas o meses según el rango, para no enviar un punto por día en varios años
+                    widgets.time_series_chart(
+                        time_df,
+                        x='Fecha',
                         y='Participantes',
-                        markers=True,
-                        title='Número de Participantes por Fecha'
+                        start_date=dash_start_date,
+                        end_date=dash_end_date,
+                        title='Número de Participantes',
+                        yaxis_title='Número de Participantes'
                     )
-                    fig.update_layout(xaxis_title='Fecha', yaxis_title='Número de Participantes')
-                    st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.info("No hay datos de participación a lo largo del tiempo")
                 
                 # 5. Top participating agents
                 st.subheader("Agentes con Mayor Participación")
                 
-                agent_participation = filtered_participants_df['agent_nip'].value_counts().reset_index()
+                ranking_scope = st.radio(
+                    "Participaciones",
+                    ["Periodo seleccionado", "Histórico"],
+                    horizontal=True,
+                    key="dash_ranking_scope"
+                )
+                
+                if ranking_scope == "Histórico":
+                    # Total acumulado que mantienen los triggers en agents
+                    agent_participation = agents_df[agents_df['total_participations'] > 0].sort_values(
+                        'total_participations', ascending=False
+                    )[['nip', 'total_participations']]
+                else:
+                    agent_participation = by_agent_df[['agent_nip', 'participations']]
                 agent_participation.columns = ['NIP', 'Participaciones']
                 
                 if not agent_participation.empty:
                     # Get agent names
-                    agent_participation['Nombre'] = agent_participation['NIP'].apply(utils.get_agent_name)
+                    agent_names = agents_df.set_index('nip')['nombre_completo']
+                    agent_participation['Nombre'] = agent_participation['NIP'].map(agent_names)
                     
                     # Display top 10
                     top_agents = agent_participation.head(10)
                     
-                    fig = px.bar(
-                        top_agents, 
-                        x='Nombre', 
+                    widgets.plotly_chart(
+                        "bar",
+                        top_agents,
+                        x='Nombre',
                         y='Participaciones',
                         color='Participaciones',
                         color_continuous_scale='Reds',
-                        title='Top 10 Agentes con Mayor Participación'
+                        title='Top 10 Agentes con Mayor Participación',
+                        layout={'xaxis_title': 'Agente', 'yaxis_title': 'Número de Participaciones'}
                     )
-                    fig.update_layout(xaxis_title='Agente', yaxis_title='Número de Participaciones')
-                    st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.info("No hay datos de participación por agente")
                 
-                # 6. Course popularity
+                # 6. Days since last activity
+                st.subheader("Días desde la Última Actividad")
+                
+                active_agents = agents_df[agents_df['activo'] == True]
+                if not active_agents.empty:
+                    last_dates = active_agents['last_activity_date'].dt.date
+                    days_since = last_dates.apply(
+                        lambda last: (today.date() - last).days if pd.notna(last) else None
+                    )
+                    inactivity_df = pd.DataFrame({
+                        'NIP': active_agents['nip'],
+                        'Agente': active_agents['nombre_completo'],
+                        'Sección': active_agents['seccion'],
+                        'Última Actividad': last_dates.apply(lambda last: last.strftime("%d/%m/%Y") if pd.notna(last) else "Nunca"),
+                        'Días': days_since.astype("Int64")
+                    })
+                    
+                    widgets.paginated_grid(
+                        inactivity_df,
+                        key="inactivity_grid",
+                        sort_by='Días',
+                        descending=True,
+                        na_position='first',
+                        search_columns=['NIP', 'Agente', 'Sección'],
+                        page_size=25
+                    )
+                else:
+                    st.info("No hay agentes activos que cumplan los filtros")
+                
+                # 7. Course popularity
                 if not courses_df.empty:
                     st.subheader("Popularidad de Cursos")
                     
-                    # Join activity data with course data
-                    activities_with_courses = activities_df.copy()
-                    
                     # Create a dictionary for course lookup
                     course_dict = {course['id']: course['nombre'] for _, course in courses_df.iterrows()}
                     
-                    # Add course name to activities
-                    activities_with_courses['curso_nombre'] = activities_with_courses['curso_id'].apply(
-                        lambda x: course_dict.get(x, "Sin curso") if x else "Sin curso"
-                    )
-                    
                     # Count participants by course
-                    course_participation = []
-                    for _, activity in activities_with_courses.iterrows():
-                        activity_id = activity['id']
-                        course_name = activity['curso_nombre']
-                        
-                        # Count participants for this activity (filtered by our criteria)
-                        participants_count = len(filtered_participants_df[filtered_participants_df['activity_id'] == activity_id])
-                        
-                        course_participation.append({
-                            'Curso': course_name,
-                            'Participantes': participants_count
-                        })
-                    
-                    course_df = pd.DataFrame(course_participation)
+                    course_df = pd.DataFrame({
+                        'Curso': participations_df['curso_id'].apply(
+                            lambda x: course_dict.get(x, "Sin curso") if pd.notna(x) else "Sin curso"
+                        ),
+                        'Participantes': participations_df['participations']
+                    })
                     course_summary = course_df.groupby('Curso')['Participantes'].sum().reset_index()
                     
                     if not course_summary.empty:
                         # Sort by participation count
                         course_summary = course_summary.sort_values('Participantes', ascending=False)
                         
-                        fig = px.bar(
-                            course_summary, 
-                            x='Curso', 
+                        widgets.plotly_chart(
+                            "bar",
+                            course_summary,
+                            x='Curso',
                             y='Participantes',
                             color='Participantes',
                             color_continuous_scale='Purples',
-                            title='Participación por Curso'
+                            title='Participación por Curso',
+                            layout={'xaxis_title': 'Curso', 'yaxis_title': 'Número de Participantes'}
                         )
-                        fig.update_layout(xaxis_title='Curso', yaxis_title='Número de Participantes')
-                        st.plotly_chart(fig, use_container_width=True)
                     else:
                         st.info("No hay datos de participación por curso")
                 
-                # 7. Data table for detailed view
+                # 8. Data table for detailed view
                 st.subheader("Datos Detallados")
                 
                 show_data = st.checkbox("Mostrar datos completos", False)
                 
                 if show_data:
+                    # Las filas de detalle sí necesitan cada participación: se leen de activities_enriched
+                    detail_activities = utils.get_activities_enriched(dash_start_date, dash_end_date)
+                    if dash_selected_course and not detail_activities.empty:
+                        detail_activities = detail_activities[detail_activities['curso_id'] == dash_selected_course]
+                    
                     # Create a detailed dataframe
                     detailed_data = []
+                    agent_nips = set(agents_df['nip'])
                     
-                    for _, activity in activities_df.iterrows():
-                        activity_id = activity['id']
-                        activity_date = utils.format_date(activity['fecha'])
-                        activity_shift = activity['turno']
-                        
-                        # Get course name
-                        course_name = "Sin curso"
-                        if activity['curso_id'] and not courses_df.empty:
-                            course_data = courses_df[courses_df['id'] == activity['curso_id']]
-                            if not course_data.empty:
-                                course_name = course_data.iloc[0]['nombre']
-                        
-                        # Get monitor name
-                        monitor_name = "Sin monitor"
-                        if activity['monitor_nip']:
-                            monitor_name = utils.get_agent_name(activity['monitor_nip'])
-                        
-                        # Get participants for this activity
-                        activity_participants = filtered_participants_df[filtered_participants_df['activity_id'] == activity_id]
-                        
-                        if not activity_participants.empty:
-                            for _, participant in activity_participants.iterrows():
-                                agent_nip = participant['agent_nip']
-                                agent_name = utils.get_agent_name(agent_nip)
-                                
-                                # Get agent section and group
-                                agent_data = agents_df[agents_df['nip'] == agent_nip]
-                                section = agent_data.iloc[0]['seccion'] if not agent_data.empty else ""
-                                group = agent_data.iloc[0]['grupo'] if not agent_data.empty else ""
-                                
-                                detailed_data.append({
-                                    'Fecha': activity_date,
-                                    'Turno': activity_shift,
-                                    'Curso': course_name,
-                                    'Monitor': monitor_name,
-                                    'NIP': agent_nip,
-                                    'Agente': agent_name,
-                                    'Sección': section,
-                                    'Grupo': group
-                                })
+                    for _, activity in detail_activities.iterrows():
+                        for participant in activity['participants']:
+                            if participant['nip'] not in agent_nips:
+                                continue
+                            detailed_data.append({
+                                'Fecha': activity['fecha'],
+                                'Turno': activity['turno'],
+                                'Curso': activity['curso_nombre'] if pd.notna(activity['curso_nombre']) else "Sin curso",
+                                'Monitor': activity['monitor_nombre'] if pd.notna(activity['monitor_nombre']) else "Sin monitor",
+                                'NIP': participant['nip'],
+                                'Agente': participant['nombre'],
+                                'Sección': participant['seccion'] or "",
+                                'Grupo': participant['grupo'] or ""
+                            })
                     
                     detailed_df = pd.DataFrame(detailed_data)
                     
                     if not detailed_df.empty:
-                        st.dataframe(detailed_df, use_container_width=True)
+                        widgets.paginated_grid(
+                            detailed_df,
+                            key="dash_detail_grid",
+                            formatters={'Fecha': utils.format_date},
+                            sort_by='Fecha',
+                            search_columns=['Curso', 'Monitor', 'NIP', 'Agente', 'Sección', 'Grupo']
+                        )
                     else:
                         st.info("No hay datos detallados disponibles")
             
@@ -420,7 +395,9 @@ def show_statistics():
             st.error(f"Error al cargar los datos del dashboard: {str(e)}")
     
     # Parte 2: Vista Dinámica con DataFrames
-    with tab2:
+    @st.fragment
+    @profiler.fragment
+    def show_dynamic_view():
         st.header("Vista Dinámica")
         
         # Crear contenedor para filtros
@@ -461,7 +438,7 @@ def show_statistics():
                     dyn_agents_df = utils.get_all_agents()
                     if not dyn_agents_df.empty:
                         # Get unique sections
-                        dyn_sections = sorted(dyn_agents_df['seccion'].unique().tolist())
+                        dyn_sections = sorted(dyn_agents_df['seccion'].dropna().unique().tolist())
                         dyn_sections = [s for s in dyn_sections if s]  # Remove empty values
                         
                         dyn_selected_sections = st.multiselect(
@@ -506,19 +483,25 @@ def show_statistics():
                     dyn_selected_agents = []
                     st.warning(f"No se pudieron cargar los agentes: {str(e)}")
         
-        # Botón para generar el informe
-        generate_report = st.button("Generar Informe", type="primary")
+        # Botón para generar el informe. Los filtros del informe se guardan en la sesión
+        # para que siga visible al buscar, ordenar o cambiar de página en la tabla, que
+        # vuelven a ejecutar el fragmento con el botón sin pulsar
+        if st.button("Generar Informe", type="primary"):
+            st.session_state.dyn_report_filters = {
+                'start_date': dyn_start_date,
+                'end_date': dyn_end_date,
+                'curso_id': dyn_selected_course if dyn_selected_course else None,
+                'secciones': dyn_selected_sections if dyn_selected_sections else None,
+                'agentes': dyn_selected_agents if dyn_selected_agents else None
+            }
+            # Un informe nuevo empieza en la primera página
+            st.session_state.pop("dyn_stats_grid_page", None)
         
-        if generate_report:
+        report_filters = st.session_state.get("dyn_report_filters")
+        if report_filters:
             with st.spinner("Generando informe..."):
-                # Obtener los datos usando la función y los filtros
-                stats_df = utils.get_agents_activity_stats(
-                    start_date=dyn_start_date,
-                    end_date=dyn_end_date,
-                    curso_id=dyn_selected_course if dyn_selected_course else None,
-                    secciones=dyn_selected_sections if dyn_selected_sections else None,
-                    agentes=dyn_selected_agents if dyn_selected_agents else None
-                )
+                # Obtener los datos usando la función y los filtros (cacheada)
+                stats_df = utils.get_agents_activity_stats(**report_filters)
                 
                 if not stats_df.empty:
                     # Mostrar el número total de resultados
@@ -543,7 +526,13 @@ def show_statistics():
                     )
                     
                     # Mostrar el dataframe con los datos
-                    st.dataframe(stats_df, use_container_width=True)
+                    widgets.paginated_grid(
+                        stats_df,
+                        key="dyn_stats_grid",
+                        sort_by='Total Actividades',
+                        descending=True,
+                        search_columns=['NIP', 'Nombre', 'Apellidos', 'Sección']
+                    )
                     
                     # Mostrar gráfico de barras con los agentes más activos (top 10)
                     if len(stats_df) > 1:  # Solo si hay más de un agente
@@ -558,16 +547,16 @@ def show_statistics():
                         )
                         
                         # Crear gráfico
-                        fig = px.bar(
+                        widgets.plotly_chart(
+                            "bar",
                             top_agents_df,
                             x='Etiqueta',
                             y='Total Actividades',
                             color='Total Actividades',
                             color_continuous_scale='viridis',
-                            title='Top 10 Agentes por Número de Actividades'
+                            title='Top 10 Agentes por Número de Actividades',
+                            layout={'xaxis_title': 'Agente', 'yaxis_title': 'Número de Actividades'}
                         )
-                        fig.update_layout(xaxis_title='Agente', yaxis_title='Número de Actividades')
-                        st.plotly_chart(fig, use_container_width=True)
                         
                         # Mostrar distribución por sección si hay datos
                         if 'Sección' in stats_df.columns and stats_df['Sección'].notna().any():
@@ -580,15 +569,88 @@ def show_statistics():
                                 section_data = section_data.sort_values('Total Actividades', ascending=False)
                                 
                                 # Crear gráfico
-                                fig = px.pie(
+                                widgets.plotly_chart(
+                                    "pie",
                                     section_data,
                                     values='Total Actividades',
                                     names='Sección',
                                     title='Distribución de Actividades por Sección'
                                 )
-                                st.plotly_chart(fig, use_container_width=True)
                 else:
                     st.warning("No se encontraron datos que cumplan con los criterios seleccionados")
 
-# Run the main function
-show_statistics()
\ No newline at end of file
+    if active_tab == "Dashboard General":
+        show_dashboard()
+    else:
+        show_dynamic_view()
+
+# Exportación completa de tablas
+@st.fragment
+@profiler.fragment
+def show_export():
+    import exporter
+    
+    st.header("Exportar Datos")
+    st.caption("Las tablas se leen por páginas y se escriben a disco a medida que llegan. "
+               "Para extractos muy grandes usa `python exporter.py` desde el servidor, "
+               "que escribe directamente al archivo de destino.")
+    
+    exp_col1, exp_col2 = st.columns(2)
+    
+    with exp_col1:
+        export_dataset = st.selectbox(
+            "Tabla",
+            options=list(exporter.EXPORT_DATASETS.keys()),
+            format_func=lambda x: exporter.EXPORT_DATASETS[x],
+            key="export_dataset"
+        )
+        export_format = st.radio(
+            "Formato",
+            options=list(exporter.EXPORT_FORMATS.keys()),
+            format_func=lambda x: exporter.EXPORT_FORMATS[x][0],
+            horizontal=True,
+            key="export_format"
+        )
+    
+    # El rango de fechas y el detalle solo aplican a actividades y participantes
+    export_joined = False
+    export_start_date = None
+    export_end_date = None
+    
+    with exp_col2:
+        if export_dataset in ("actividades", "participantes"):
+            export_joined = st.checkbox("Incluir nombres de curso, monitor y agente", True, key="export_joined")
+            filter_dates = st.checkbox("Filtrar por rango de fechas", True, key="export_filter_dates")
+            if filter_dates:
+                today = datetime.now()
+                export_start_date = st.date_input("Fecha inicio", datetime(today.year, 1, 1), key="export_start_date")
+                export_end_date = st.date_input("Fecha fin", today, key="export_end_date")
+    
+    if st.button("Preparar exportación", type="primary", key="export_button"):
+        try:
+            with st.spinner("Exportando datos..."):
+                with exporter.export_to_tempfile(
+                    export_dataset,
+                    export_format,
+                    joined=export_joined,
+                    start_date=export_start_date,
+                    end_date=export_end_date
+                ) as export_file:
+                    export_data = export_file.read()
+            
+            st.download_button(
+                label=f"Descargar {exporter.EXPORT_FORMATS[export_format][0]}",
+                data=export_data,
+                file_name=exporter.get_export_filename(export_dataset, export_format, export_joined,
+                                                       export_start_date, export_end_date),
+                mime=exporter.EXPORT_FORMATS[export_format][1]
+            )
+        except Exception as e:
+            st.error(f"Error al exportar los datos: {str(e)}")
+
+# Run the main function: solo se ejecuta la pestaña seleccionada
+active_tab = utils.select_tab(["Dashboard General", "Vista Dinámica", "Exportar Datos"], key="stats_tab")
+if active_tab == "Exportar Datos":
+    show_export()
+else:
+    show_statistics(active_tab)
\ No newline at end of file
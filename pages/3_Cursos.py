@@ -2,6 +2,10 @@ import streamlit as st
 import pandas as pd
 import config
 import utils
+import profiler
+
+# Perfil de la ejecución, si está activado en la sesión (?perfil=1)
+profiler.start()
 
 # Check authentication
 utils.check_authentication()
@@ -22,11 +26,10 @@ if "course_to_delete_id" not in st.session_state:
 if "course_to_delete_name" not in st.session_state:
     st.session_state.course_to_delete_name = None
 
-# Diseño de dos columnas
-col_izquierda, col_derecha = st.columns([2, 3])
-
-# Columna izquierda - Formularios de Gestión
-with col_izquierda:
+# Columna izquierda - Formularios de Gestión (fragmento: no recalcula la lista de cursos)
+@st.fragment
+@profiler.fragment
+def render_course_forms():
     # Sección para añadir nuevo curso
     st.subheader("Añadir Nuevo Curso")
     with st.form("add_course_form"):
@@ -181,8 +184,10 @@ with col_izquierda:
     else:
         st.warning("No hay cursos disponibles para editar.")
 
-# Columna derecha - Vista de cursos
-with col_derecha:
+# Columna derecha - Vista de cursos (fragmento: el filtro solo recalcula la lista)
+@st.fragment
+@profiler.fragment
+def render_course_list():
     st.subheader("Lista de Cursos")
     
     # Filter option
@@ -223,3 +228,12 @@ with col_derecha:
             st.warning("No hay cursos visibles. Marca la casilla 'Mostrar cursos ocultos' para ver todos los cursos.")
     else:
         st.warning("No hay cursos disponibles en la base de datos.")
+
+# Diseño de dos columnas
+col_izquierda, col_derecha = st.columns([2, 3])
+
+with col_izquierda:
+    render_course_forms()
+
+with col_derecha:
+    render_course_list()
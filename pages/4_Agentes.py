@@ -2,6 +2,10 @@ import streamlit as st
 import pandas as pd
 import config
 import utils
+import profiler
+
+# Perfil de la ejecución, si está activado en la sesión (?perfil=1)
+profiler.start()
 
 # Check authentication
 utils.check_authentication()
@@ -9,14 +13,6 @@ utils.check_authentication()
 # Configura el sidebar y el botón de cerrar sesión
 utils.setup_sidebar()
 
-# Inicialización del estado de la sesión para la gestión de pestañas activas
-if "active_tab" not in st.session_state:
-    st.session_state.active_tab = "Ver Agentes"
-
-# Inicializar el DataFrame de agentes en el estado de la sesión
-if "agents_df" not in st.session_state:
-    st.session_state.agents_df = utils.get_all_agents()
-
 # Inicializar estados para el modo de confirmación de eliminación
 if "confirm_delete_mode" not in st.session_state:
     st.session_state.confirm_delete_mode = False
@@ -30,31 +26,187 @@ if "agent_delete_info" not in st.session_state:
 # Page title
 st.title("👮‍♂️ Gestión de Agentes")
 
-# Create tabs
-tab1, tab2, tab3 = st.tabs(["Ver Agentes", "Añadir Agente", "Editar Agente"])
+# Recarga los datos de agentes tras un alta, edición o baja
+def refresh_agents():
+    # Publica una nueva versión del snapshot compartido para todas las sesiones
+    utils.invalidate_agent_caches()
 
 # Define una función para cambiar la pestaña activa
 def set_active_tab(tab_name):
-    st.session_state.active_tab = tab_name
+    utils.request_tab("agents_tab", tab_name)
     # Recargar el DataFrame de agentes para reflejar los cambios
-    st.session_state.agents_df = utils.get_all_agents()
+    refresh_agents()
+
+# Vista de agentes con filtrado, ordenación y paginación en el servidor
+def render_agents_server_side():
+    with st.expander("Filtros avanzados", expanded=False):
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            filtro_secciones = st.multiselect("Filtrar por sección", config.SECTIONS, key="filtro_secciones")
+
+        with col2:
+            filtro_grupos = st.multiselect("Filtrar por grupo", config.GROUPS, key="filtro_grupos")
+
+        with col3:
+            col3a, col3b = st.columns(2)
+            with col3a:
+                filtro_activo = st.checkbox("Solo activos", key="filtro_activo")
+            with col3b:
+                filtro_monitor = st.checkbox("Solo monitores", key="filtro_monitor")
+
+        search_query = st.text_input(
+            "Buscar agente por NIP, nombre, apellidos, email, teléfono...",
+            placeholder="El filtro se aplica mientras escribes...",
+            key="agent_search"
+        )
+
+    # Ordenación
+    sort_options = {
+        'nip': 'NIP',
+        'nombre': 'Nombre',
+        'apellido1': 'Primer Apellido',
+        'seccion': 'Sección',
+        'grupo': 'Grupo'
+    }
+    col_sort, col_dir = st.columns([3, 1])
+    with col_sort:
+        sort_by = st.selectbox("Ordenar por", list(sort_options.keys()),
+                               format_func=lambda x: sort_options[x], key="agent_sort_by")
+    with col_dir:
+        descending = st.checkbox("Descendente", key="agent_sort_desc")
+
+    # Volver a la primera página cuando cambian los filtros o la ordenación
+    filters_key = (tuple(filtro_secciones), tuple(filtro_grupos), filtro_activo, filtro_monitor,
+                   search_query, sort_by, descending)
+    if st.session_state.get("agent_filters_key") != filters_key:
+        st.session_state.agent_filters_key = filters_key
+        st.session_state.agent_page = 1
+
+    page = st.session_state.get("agent_page", 1)
+    page_df, total = utils.search_agents(
+        search_query=search_query.strip() or None,
+        secciones=filtro_secciones or None,
+        grupos=filtro_grupos or None,
+        active_only=filtro_activo,
+        monitors_only=filtro_monitor,
+        sort_by=sort_by,
+        descending=descending,
+        page=page
+    )
+
+    if total == 0:
+        st.warning("No hay agentes que coincidan con los filtros seleccionados.")
+        return
+
+    total_pages = max((total + config.AGENTS_PAGE_SIZE - 1) // config.AGENTS_PAGE_SIZE, 1)
 
-# Seleccionar la pestaña activa basada en el estado de la sesión
-if st.session_state.active_tab == "Ver Agentes":
-    tab1.active = True
-elif st.session_state.active_tab == "Añadir Agente":
-    tab2.active = True
-elif st.session_state.active_tab == "Editar Agente":
-    tab3.active = True
+    display_df = page_df.copy()
+    display_df['activo'] = display_df['activo'].apply(utils.format_bool)
+    display_df['monitor'] = display_df['monitor'].apply(utils.format_bool)
+
+    st.dataframe(
+        display_df[['nip', 'nombre_completo', 'seccion', 'grupo', 'email', 'telefono', 'activo', 'monitor']].rename(columns={
+            'nip': 'NIP',
+            'nombre_completo': 'Nombre Completo',
+            'seccion': 'Sección',
+            'grupo': 'Grupo',
+            'email': 'Email',
+            'telefono': 'Teléfono',
+            'activo': 'Activo',
+            'monitor': 'Monitor'
+        }),
+        use_container_width=True,
+        hide_index=True
+    )
+
+    # Controles de paginación
+    col_prev, col_info, col_next = st.columns([1, 3, 1])
+    with col_prev:
+        if st.button("◀ Anterior", disabled=page <= 1, key="agent_page_prev"):
+            st.session_state.agent_page = page - 1
+            st.rerun(scope="fragment")
+    with col_info:
+        st.caption(f"Página {page} de {total_pages} · {total} agentes encontrados")
+    with col_next:
+        if st.button("Siguiente ▶", disabled=page >= total_pages, key="agent_page_next"):
+            st.session_state.agent_page = page + 1
+            st.rerun(scope="fragment")
+
+# Edición de varios agentes a la vez con st.data_editor
+def render_agents_grid(agents_df):
+    if agents_df.empty:
+        st.warning("No hay agentes disponibles para editar.")
+        return
+    
+    grid_df = agents_df[['nip', 'nombre_completo'] + utils.AGENT_GRID_COLUMNS].sort_values('nip').reset_index(drop=True)
+    
+    edited_df = st.data_editor(
+        grid_df,
+        column_config={
+            'nip': st.column_config.TextColumn("NIP"),
+            'nombre_completo': st.column_config.TextColumn("Nombre Completo"),
+            'seccion': st.column_config.SelectboxColumn("Sección", options=config.SECTIONS),
+            'grupo': st.column_config.SelectboxColumn("Grupo", options=config.GROUPS),
+            'activo': st.column_config.CheckboxColumn("Activo"),
+            'monitor': st.column_config.CheckboxColumn("Monitor")
+        },
+        disabled=['nip', 'nombre_completo'],
+        num_rows="fixed",
+        hide_index=True,
+        use_container_width=True,
+        key="agents_grid"
+    )
+    
+    changes_df, changed_columns = utils.diff_agent_frames(grid_df, edited_df)
+    
+    if changes_df.empty:
+        st.caption("Edita las celdas de la tabla y pulsa «Guardar cambios».")
+        return
+    
+    st.info(f"{len(changes_df)} agentes con cambios pendientes")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        save_button = st.button("Guardar cambios", type="primary", key="agents_grid_save")
+    with col2:
+        discard_button = st.button("Descartar cambios", key="agents_grid_discard")
+    
+    if discard_button:
+        del st.session_state["agents_grid"]
+        st.rerun(scope="fragment")
+    
+    if save_button:
+        validation_errors = utils.validate_agent_changes(changes_df)
+        
+        if validation_errors:
+            for error in validation_errors:
+                st.error(error)
+        else:
+            with st.spinner("Guardando cambios..."):
+                saved, save_errors = utils.apply_agent_changes(agents_df, changes_df, changed_columns)
+            
+            for error in save_errors:
+                st.error(error)
+            
+            if saved and not save_errors:
+                st.success(f"{saved} agentes actualizados correctamente")
+                del st.session_state["agents_grid"]
+                refresh_agents()
+                st.rerun()
 
 # Tab 1: View Agents
-with tab1:
+@st.fragment
+@profiler.fragment
+def render_agents_list():
     st.subheader("Lista de Agentes")
     
-    # Usar el DataFrame almacenado en session_state
-    agents_df = st.session_state.agents_df
+    # Snapshot compartido entre sesiones (con la búsqueda en el servidor no se descarga la tabla completa)
+    agents_df = pd.DataFrame() if config.SERVER_SIDE_AGENT_SEARCH else utils.get_shared_frame("agents")
     
-    if not agents_df.empty:
+    if config.SERVER_SIDE_AGENT_SEARCH:
+        render_agents_server_side()
+    elif not agents_df.empty:
         # Extraer secciones y grupos únicos disponibles para filtrar
         secciones_disponibles = agents_df['seccion'].dropna().unique().tolist()
         secciones_disponibles.sort()
@@ -124,7 +276,7 @@ with tab1:
             )
         
         # Aplicar filtros y rastrear qué filtros están activos
-        filtered_df = agents_df.copy()
+        filtered_df = agents_df
         filtros_activos = []
         
         # Filtrar por secciones seleccionadas
@@ -169,16 +321,11 @@ with tab1:
             st.caption("**Filtros aplicados:** " + " | ".join(filtros_activos))
         
         # Format boolean columns
-        display_df = filtered_df.copy()
+        # Copia diferida: solo se copian las columnas que se modifican
+        display_df = filtered_df.copy(deep=False)
         display_df['activo'] = display_df['activo'].apply(utils.format_bool)
         display_df['monitor'] = display_df['monitor'].apply(utils.format_bool)
         
-        # Create a new column with full name
-        display_df['nombre_completo'] = display_df.apply(
-            lambda x: f"{x['nombre']} {x['apellido1']} {x['apellido2']}".strip(), 
-            axis=1
-        )
-        
         # Reorder columns for display
         columns_order = ['nip', 'nombre_completo', 'seccion', 'grupo', 'email', 
                          'telefono', 'activo', 'monitor']
@@ -214,7 +361,9 @@ with tab1:
         st.warning("No hay agentes disponibles en la base de datos.")
 
 # Tab 2: Add Agent
-with tab2:
+@st.fragment
+@profiler.fragment
+def render_add_agent():
     st.subheader("Añadir Nuevo Agente")
     
     # Create form
@@ -273,8 +422,7 @@ with tab2:
                         
                         if result.data:
                             st.success(f"Agente {nombre} {apellido1} añadido correctamente")
-                            # Actualizar el DataFrame en session_state y cambiar a la pestaña de visualización
-                            st.session_state.agents_df = utils.get_all_agents()
+                            # Actualizar los datos de agentes y cambiar a la pestaña de visualización
                             set_active_tab("Ver Agentes")
                             st.rerun()
                         else:
@@ -283,18 +431,33 @@ with tab2:
                     st.error(f"Error: {str(e)}")
 
 # Tab 3: Edit Agent
-with tab3:
+@st.fragment
+@profiler.fragment
+def render_edit_agent():
     st.subheader("Editar Agente Existente")
     
-    # Get all agents for selection from session state
-    agents_df = st.session_state.agents_df
+    edit_mode = st.radio(
+        "Modo de edición",
+        ["Formulario", "Tabla editable"],
+        horizontal=True,
+        key="agent_edit_mode",
+        help="La tabla editable permite cambiar sección, grupo, activo y monitor de muchos agentes a la vez"
+    )
+    
+    if config.SERVER_SIDE_AGENT_SEARCH:
+        # Buscar el agente en el servidor en lugar de listar toda la plantilla
+        edit_search = st.text_input("Buscar agente a editar (NIP, nombre, apellidos...)", key="edit_agent_search")
+        agents_df, _ = utils.search_agents(search_query=edit_search.strip() or None,
+                                           page_size=1000 if edit_mode == "Tabla editable" else 50)
+    else:
+        # Snapshot compartido de agentes
+        agents_df = utils.get_shared_frame("agents")
     
-    if not agents_df.empty:
+    if edit_mode == "Tabla editable":
+        render_agents_grid(agents_df)
+    elif not agents_df.empty:
         # Create a dropdown to select an agent by NIP
-        agents_list = []
-        for _, row in agents_df.iterrows():
-            agent_name = f"{row['nip']} - {row['nombre']} {row['apellido1']} {row['apellido2']}".strip()
-            agents_list.append((agent_name, row['nip']))
+        agents_list = list(zip(agents_df['nip'] + " - " + agents_df['nombre_completo'], agents_df['nip']))
         
         selected_agent = st.selectbox(
             "Seleccionar agente a editar",
@@ -330,9 +493,7 @@ with tab3:
                                 st.session_state.confirm_delete_mode = False
                                 st.session_state.agent_to_delete = None
                                 st.session_state.agent_delete_info = None
-                                # Recrear el DataFrame para reflejar los cambios
-                                st.session_state.agents_df = utils.get_all_agents()
-                                # Cambiar a la pestaña de visualización
+                                # Cambiar a la pestaña de visualización (recarga los agentes)
                                 set_active_tab("Ver Agentes")
                                 st.rerun()
                             else:
@@ -418,8 +579,8 @@ with tab3:
                                 
                                 if result.data:
                                     st.success("Agente actualizado correctamente")
-                                    # Actualizar el DataFrame en session_state para reflejar los cambios
-                                    st.session_state.agents_df = utils.get_all_agents()
+                                    # Actualizar los datos de agentes para reflejar los cambios
+                                    refresh_agents()
                                     st.rerun()
                                 else:
                                     st.error("Error al actualizar el agente")
@@ -435,3 +596,90 @@ with tab3:
                     st.rerun()
     else:
         st.warning("No hay agentes disponibles para editar.")
+
+# Tab 4: Bulk import
+@st.fragment
+@profiler.fragment
+def render_import_agents():
+    st.subheader("Importar Agentes desde Archivo")
+    
+    st.markdown(
+        "Sube un archivo CSV o XLSX con una fila por agente. Columnas: "
+        + ", ".join(f"`{col}`" for col in utils.AGENT_IMPORT_COLUMNS)
+        + ". Los campos `activo` y `monitor` admiten Sí/No. Al actualizar agentes existentes, "
+        "las columnas que no estén en el archivo y las celdas vacías conservan el valor actual."
+    )
+    
+    # Plantilla vacía para rellenar
+    st.download_button(
+        label="Descargar plantilla CSV",
+        data=",".join(utils.AGENT_IMPORT_COLUMNS) + "\n",
+        file_name="plantilla_agentes.csv",
+        mime="text/csv"
+    )
+    
+    uploaded_file = st.file_uploader("Archivo de agentes", type=["csv", "xlsx"], key="agents_import_file")
+    
+    if uploaded_file is not None:
+        try:
+            import_df = utils.read_agents_file(uploaded_file)
+        except Exception as e:
+            st.error(f"No se pudo leer el archivo: {str(e)}")
+            import_df = None
+        
+        if import_df is not None:
+            missing_columns = [col for col in ['nip', 'nombre', 'apellido1'] if col not in import_df.columns]
+            
+            if missing_columns:
+                st.error(f"Faltan columnas obligatorias: {', '.join(missing_columns)}")
+            else:
+                valid_df, errors_df = utils.validate_agents_frame(import_df)
+                
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Filas en el archivo", len(import_df))
+                with col2:
+                    st.metric("Filas válidas", len(valid_df))
+                with col3:
+                    st.metric("Filas con errores", len(import_df) - len(valid_df))
+                
+                if not errors_df.empty:
+                    st.warning("Las siguientes filas tienen errores y no se importarán:")
+                    st.dataframe(errors_df, use_container_width=True, hide_index=True)
+                
+                if not valid_df.empty:
+                    with st.expander(f"Vista previa de las {len(valid_df)} filas válidas", expanded=False):
+                        preview_df = valid_df.copy()
+                        for col in ('activo', 'monitor'):
+                            if col in preview_df.columns:
+                                preview_df[col] = preview_df[col].apply(utils.format_bool)
+                        st.dataframe(preview_df, use_container_width=True, hide_index=True)
+                    
+                    update_existing = st.checkbox(
+                        "Actualizar los agentes que ya existen (mismo NIP)",
+                        value=False,
+                        help="Si no se marca, los NIPs que ya están registrados se dejan sin cambios"
+                    )
+                    
+                    if st.button(f"Importar {len(valid_df)} agentes", type="primary"):
+                        with st.spinner("Importando agentes..."):
+                            saved, import_errors = utils.upsert_agents(valid_df, update_existing=update_existing)
+                        
+                        for error in import_errors:
+                            st.error(error)
+                        
+                        if saved:
+                            st.success(f"Se han procesado {saved} agentes correctamente")
+                            refresh_agents()
+
+# Solo se ejecuta la pestaña seleccionada. Cada pestaña es un fragmento: sus filtros y
+# formularios vuelven a ejecutar esa pestaña, no la página completa
+active_tab = utils.select_tab(["Ver Agentes", "Añadir Agente", "Editar Agente", "Importar Agentes"], key="agents_tab")
+if active_tab == "Ver Agentes":
+    render_agents_list()
+elif active_tab == "Añadir Agente":
+    render_add_agent()
+elif active_tab == "Editar Agente":
+    render_edit_agent()
+else:
+    render_import_agents()
@@ -0,0 +1,182 @@
+import os
+import streamlit as st
+import pandas as pd
+import config
+import utils
+import profiler
+import caching
+import cache_backend
+import resilience
+
+# Perfil de la ejecución, si está activado en la sesión (?perfil=1)
+profiler.start()
+
+# Check authentication
+utils.check_authentication()
+
+# Configura el sidebar y el botón de cerrar sesión
+utils.setup_sidebar()
+
+# Page title
+st.title("🖥️ Sistema")
+
+st.caption("Memoria de los datos compartidos y de las sesiones abiertas en este proceso, para dimensionar el servidor.")
+
+shared_df = utils.get_shared_frames_report()
+sessions_df = utils.get_all_sessions_memory_report()
+session_df = utils.get_session_memory_report()
+
+col1, col2, col3 = st.columns(3)
+with col1:
+    st.metric("Sesiones abiertas", len(sessions_df) if not sessions_df.empty else "-")
+with col2:
+    st.metric("Memoria compartida", utils.format_bytes(shared_df['bytes'].sum()))
+with col3:
+    total_sessions = sessions_df['bytes'].sum() if not sessions_df.empty else session_df['bytes'].sum()
+    st.metric("Memoria de las sesiones", utils.format_bytes(total_sessions))
+
+# Snapshots compartidos: una sola copia por proceso, independiente del número de sesiones
+st.subheader("Datos compartidos")
+st.dataframe(
+    shared_df.assign(bytes=shared_df['bytes'].apply(utils.format_bytes)).rename(columns={
+        'frame': 'Tabla',
+        'version': 'Versión',
+        'filas': 'Filas',
+        'bytes': 'Memoria'
+    }),
+    hide_index=True,
+    use_container_width=True
+)
+
+frames_df = utils.get_frame_memory_report()
+if not frames_df.empty:
+    st.caption("Memoria de los últimos DataFrames cargados, antes y después de aplicar los tipos")
+    st.dataframe(
+        pd.DataFrame({
+            'DataFrame': frames_df['frame'],
+            'Filas': frames_df['filas'],
+            'Sin tipos': frames_df['antes'].apply(utils.format_bytes),
+            'Con tipos': frames_df['despues'].apply(utils.format_bytes),
+            'Ahorro': frames_df['ahorro'].apply(utils.format_bytes)
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+
+# Cachés de lectura con refresco en segundo plano (caching.swr_cache)
+cache_df = caching.get_cache_report()
+if not cache_df.empty:
+    st.caption("Cachés con refresco en segundo plano: los valores caducados se sirven mientras se recargan")
+    st.dataframe(
+        pd.DataFrame({
+            'Función': cache_df['funcion'],
+            'Entradas': cache_df['entradas'],
+            'Antigüedad (s)': cache_df['antiguedad'].round(0),
+            'Aciertos': cache_df['aciertos'],
+            'Caducados servidos': cache_df['caducados_servidos'],
+            'Esperas': cache_df['esperas'],
+            'Refrescos': cache_df['refrescos'],
+            'Refrescos fallidos': cache_df['refrescos_fallidos'],
+            'De otra réplica': cache_df['compartidas'],
+            'Descartadas': cache_df['descartadas']
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+
+# Almacén compartido entre réplicas (cache_backend)
+shared_backend = cache_backend.get_backend()
+if shared_backend:
+    try:
+        backend_stats = shared_backend.stats()
+        st.caption(
+            f"Caché compartida ({backend_stats['backend']}): {backend_stats['entradas']} entradas, "
+            f"{backend_stats['bytes'] / 1024 ** 2:.1f} de {backend_stats['max_bytes'] / 1024 ** 2:.0f} MB"
+        )
+    except Exception as e:
+        st.warning(f"No se puede leer la caché compartida: {str(e)}")
+
+# Memoria por sesión
+st.subheader("Sesiones")
+if not sessions_df.empty:
+    st.dataframe(
+        sessions_df.sort_values('bytes', ascending=False).assign(
+            bytes=lambda df: df['bytes'].apply(utils.format_bytes)
+        ).rename(columns={
+            'sesion': 'Sesión',
+            'claves': 'Claves',
+            'bytes': 'Memoria'
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+else:
+    st.info("No se ha podido obtener la lista de sesiones del servidor")
+
+# Conexión con Supabase: reintentos, plazos y circuit breaker (resilience.py)
+st.subheader("Conexión con Supabase")
+resilience_metrics = resilience.get_metrics()
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    st.metric("Peticiones", resilience_metrics['peticiones'])
+with col2:
+    st.metric("Reintentos", resilience_metrics['reintentos'])
+with col3:
+    st.metric("Fallos", resilience_metrics['fallos'], help=f"Plazos agotados: {resilience_metrics['plazos_agotados']}")
+with col4:
+    st.metric("Servidas de caché", resilience_metrics['respuestas_en_cache'],
+              help=f"Rechazadas con el circuito abierto: {resilience_metrics['rechazadas_circuito']}")
+st.dataframe(
+    pd.DataFrame(resilience.get_circuit_states()).rename(columns={
+        'servicio': 'Servicio',
+        'estado': 'Circuito',
+        'fallos': 'Fallos seguidos',
+        'reintento_en': 'Reintento en (s)'
+    }),
+    hide_index=True,
+    use_container_width=True
+)
+st.caption(f"Aperturas del circuito desde el arranque: {resilience_metrics['aperturas_circuito']} · "
+           f"Respuestas guardadas para servir con el circuito abierto: {resilience_metrics['lecturas_guardadas']} "
+           f"({utils.format_bytes(resilience_metrics['bytes_guardados'])})")
+
+# Perfil de las ejecuciones de esta sesión (profiler.py)
+st.subheader("Perfil de ejecución")
+st.toggle(
+    "Perfilar las ejecuciones de esta sesión",
+    value=profiler.is_enabled(),
+    key="profiler_toggle",
+    on_change=lambda: profiler.set_enabled(st.session_state.profiler_toggle),
+    help=f"También con ?{config.PROFILER_QUERY_PARAM}=1 en la URL de cualquier página. Las ejecuciones de más de "
+         f"{config.PROFILER_SLOW_RERUN:g} s guardan un flamegraph (.folded, se abre en speedscope.app)."
+)
+profiled_runs = profiler.history()
+if profiled_runs:
+    st.dataframe(
+        pd.DataFrame([
+            {'Hora': run['hora'], 'Página': run['pagina'], 'Total (ms)': round(run['total_ms']),
+             **{phase.capitalize(): round(run['fases'][phase]) for phase in profiler.PHASES},
+             'Flamegraph': 'sí' if run['flamegraph'] else ''}
+            for run in reversed(profiled_runs)
+        ]),
+        hide_index=True,
+        use_container_width=True
+    )
+flamegraphs = profiler.saved_flamegraphs()
+if flamegraphs:
+    selected_flamegraph = st.selectbox("Flamegraphs de ejecuciones lentas (todas las sesiones)", flamegraphs,
+                                       format_func=os.path.basename)
+    with open(selected_flamegraph, encoding="utf-8") as flamegraph_file:
+        st.download_button("Descargar flamegraph", flamegraph_file.read(),
+                           file_name=os.path.basename(selected_flamegraph), mime="text/plain")
+
+with st.expander("Detalle de la sesión actual", expanded=False):
+    st.dataframe(
+        session_df.assign(bytes=session_df['bytes'].apply(utils.format_bytes)).rename(columns={
+            'clave': 'Clave',
+            'tipo': 'Tipo',
+            'bytes': 'Memoria'
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
@@ -1,11 +1,13 @@
 import os
 import io
 import base64
+import time
 from datetime import datetime
 from fpdf import FPDF
 import streamlit as st
 import pandas as pd
 import utils
+import metrics
 
 class ActivityReport(FPDF):
     """Clase para generar reportes PDF de actividades"""
@@ -77,20 +79,27 @@ def generate_activity_report(activity_id):
     Returns:
         bytes: PDF generado en memoria
     """
+    started = time.perf_counter()
+    pdf_bytes = _build_activity_report(activity_id)
+    # Tiempo de generación para /metrics (serve.py)
+    metrics.PDF_SECONDS.observe(time.perf_counter() - started, resultado="ok" if pdf_bytes else "error")
+    return pdf_bytes
+
+def _build_activity_report(activity_id):
     try:
-        # Obtener datos de la actividad de Supabase
-        activity_data = utils.get_activity_details(activity_id)
+        # Obtener la actividad con curso, monitor y participantes en una sola consulta
+        activity_data = utils.get_activity_enriched(activity_id)
         if not activity_data:
             return None
             
-        course_name = utils.get_course_name(activity_data.get('curso_id', '')) or "Sin curso asignado"
-        monitor_name = utils.get_agent_name(activity_data.get('monitor_nip', '')) or "Sin monitor asignado"
+        course_name = activity_data.get('curso_nombre') or "Sin curso asignado"
+        monitor_name = activity_data.get('monitor_nombre') or "Sin monitor asignado"
         fecha = utils.format_date(activity_data.get('fecha', ''))
         turno = activity_data.get('turno', '')
         comentarios = activity_data.get('comentarios', '') or "Sin comentarios"
         
-        # Obtener participantes
-        participants = utils.get_activity_participants(activity_id)
+        # Participantes (nip, nombre, seccion, grupo)
+        participants = activity_data.get('participants') or []
         
         # Crear PDF
         pdf = ActivityReport()
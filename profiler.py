@@ -0,0 +1,270 @@
+"""
+Perfil de cada ejecución (rerun) de las páginas, activable por sesión.
+
+Se activa con el parámetro `?perfil=1` en la URL (`?perfil=0` lo desactiva) o desde la
+página Sistema, y queda activo para esa sesión. Cada página llama a `start()` al
+principio y los fragmentos se decoran con `@profiler.fragment` para que también se
+midan sus ejecuciones parciales. Sin activar, `start()` solo consulta el estado de la
+sesión: no hay hilo de muestreo ni instrumentación, de modo que puede quedarse en
+producción y encenderse cuando alguien avisa de una página lenta.
+
+Con el perfil activo, un hilo toma muestras de la pila del hilo de la página cada
+PROFILER_SAMPLE_INTERVAL y reparte el tiempo de la ejecución en fases según dónde
+estaba la pila:
+- autenticación: dentro de utils.check_authentication o utils.setup_sidebar
+- datos: peticiones a Supabase, cachés de lecturas y snapshot analítico
+- transformaciones: pandas, numpy y pyarrow llamados desde el código de la página
+- gráficos: construcción de las figuras de plotly
+- widgets: elementos de Streamlit (tablas, gráficos, formularios...)
+- aplicación: el resto del código de la página
+
+La ejecución termina cuando el marco de la página sale de la pila, también si acaba
+con st.rerun, st.stop o una excepción. Si dura más de PROFILER_SLOW_RERUN se guarda un
+flamegraph en formato de pilas plegadas (`.folded`), que abren speedscope.app,
+flamegraph.pl o inferno.
+"""
+import collections
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+import config
+
+PHASES = ["autenticación", "datos", "transformaciones", "gráficos", "widgets", "aplicación"]
+
+# Funciones de comprobación de sesión: todo lo que ocurre dentro cuenta como autenticación
+AUTH_FUNCTIONS = {("utils", "check_authentication"), ("utils", "setup_sidebar")}
+
+# Paquete del primer módulo de librería al que llama la página -> fase
+PHASE_PACKAGES = {
+    "datos": {"httpx", "httpcore", "h2", "hpack", "ssl", "socket", "postgrest", "gotrue", "supabase",
+              "supabase_auth", "storage3", "supabase_pool", "resilience", "caching", "cache_backend",
+              "analytics_snapshot", "fake_supabase"},
+    "transformaciones": {"pandas", "numpy", "pyarrow"},
+    "gráficos": {"plotly", "_plotly_utils"},
+    "widgets": {"streamlit"}
+}
+_PACKAGE_PHASES = {package: phase for phase, packages in PHASE_PACKAGES.items() for package in packages}
+
+# Módulos de Streamlit que no cuentan como widgets: ejecutan el script, las cachés y los fragmentos
+TRANSPARENT_MODULES = ("streamlit.runtime",)
+
+SESSION_KEY = "profiler_enabled"
+_MAX_SESSIONS = 100  # sesiones cuyo historial se conserva
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_active = {}  # hilo de la página -> _Profile
+_history = collections.OrderedDict()  # id de sesión -> últimas ejecuciones perfiladas
+_sampler = None
+
+class _Profile:
+    """Muestras de una ejecución en curso"""
+
+    def __init__(self, session_id, label, frame):
+        self.session_id = session_id
+        self.label = label
+        self.frame = frame
+        self.started = time.perf_counter()
+        self.last_seen = self.started
+        self.stacks = collections.Counter()
+        self.phases = collections.Counter()
+
+    def sample(self, stack, now):
+        """Registra una muestra; stack va del marco de la página al más interno"""
+        labels = [self.label] + [_frame_label(frame) for frame in stack[1:]]
+        self.stacks[";".join(labels)] += 1
+        self.phases[_classify(stack)] += 1
+        self.last_seen = now
+
+def is_enabled():
+    """True si el perfil está activado en la sesión actual (aplica ?perfil=1 o ?perfil=0)"""
+    import streamlit as st
+    value = st.query_params.get(config.PROFILER_QUERY_PARAM)
+    if value is not None:
+        enabled = value.lower() not in ("", "0", "false", "no")
+        if st.session_state.get(SESSION_KEY, False) != enabled:
+            st.session_state[SESSION_KEY] = enabled
+    return st.session_state.get(SESSION_KEY, False)
+
+def set_enabled(enabled):
+    """Activa o desactiva el perfil en la sesión actual"""
+    import streamlit as st
+    st.session_state[SESSION_KEY] = bool(enabled)
+
+def start():
+    """Perfila la ejecución de la página que llama, si el perfil está activado en la sesión"""
+    if is_enabled():
+        frame = sys._getframe(1)
+        _begin(page_name(frame.f_code.co_filename), frame)
+
+def fragment(func):
+    """
+    Perfila las ejecuciones parciales de un fragmento. Va debajo de @st.fragment; dentro
+    de una ejecución completa de la página no hace nada, porque ya se está midiendo.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _active.get(threading.get_ident())
+        if (profile is None or not _on_stack(profile.frame)) and is_enabled():
+            _begin(f"{page_name(func.__code__.co_filename)} ({func.__name__})", sys._getframe())
+        return func(*args, **kwargs)
+    return wrapper
+
+def page_name(path):
+    """Nombre de la página a partir de su archivo: pages/1_Actividades.py -> Actividades"""
+    name = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r"^\d+_", "", name).replace("_", " ")
+
+def history(session_id=None):
+    """Últimas ejecuciones perfiladas de la sesión (por defecto la actual), de la más antigua a la más reciente"""
+    if session_id is None:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        if ctx is None:
+            return []
+        session_id = ctx.session_id
+    with _lock:
+        return list(_history.get(session_id, ()))
+
+def describe(run):
+    """Resumen de una ejecución en una línea: total y fases con más tiempo"""
+    phases = sorted(run["fases"].items(), key=lambda item: item[1], reverse=True)
+    detail = " · ".join(f"{phase} {ms / run['total_ms']:.0%}" for phase, ms in phases[:3] if ms > 0)
+    return f"{run['pagina']}: {run['total_ms']:.0f} ms" + (f" ({detail})" if detail else "")
+
+def saved_flamegraphs():
+    """Flamegraphs guardados, del más reciente al más antiguo"""
+    try:
+        names = [name for name in os.listdir(config.PROFILER_OUTPUT_DIR) if name.endswith(".folded")]
+    except FileNotFoundError:
+        return []
+    paths = [os.path.join(config.PROFILER_OUTPUT_DIR, name) for name in names]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+def _begin(label, frame):
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    thread_id = threading.get_ident()
+    with _lock:
+        previous = _active.pop(thread_id, None)
+        _active[thread_id] = _Profile(ctx.session_id, label, frame)
+    # Ejecución anterior del mismo hilo interrumpida (st.rerun) antes de que la viera el muestreo
+    if previous is not None:
+        _finish(previous)
+    _ensure_sampler()
+    _wake.set()
+
+def _on_stack(target):
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame is target:
+            return True
+        frame = frame.f_back
+    return False
+
+def _ensure_sampler():
+    global _sampler
+    with _lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="profiler-sampler", daemon=True)
+            _sampler.start()
+
+def _sample_loop():
+    while True:
+        _wake.wait()
+        time.sleep(config.PROFILER_SAMPLE_INTERVAL)
+        with _lock:
+            profiles = list(_active.items())
+            if not profiles:
+                _wake.clear()
+                continue
+        frames = sys._current_frames()
+        now = time.perf_counter()
+        for thread_id, profile in profiles:
+            stack = _page_stack(frames.get(thread_id), profile.frame)
+            if stack is not None:
+                profile.sample(stack, now)
+                continue
+            with _lock:
+                if _active.get(thread_id) is not profile:
+                    continue
+                del _active[thread_id]
+            _finish(profile)
+        del frames
+
+def _page_stack(frame, page_frame):
+    """Marcos desde el de la página hasta el más interno, o None si la página ya no se ejecuta"""
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        if frame is page_frame:
+            stack.reverse()
+            return stack
+        frame = frame.f_back
+    return None
+
+def _module(frame):
+    return frame.f_globals.get("__name__") or "?"
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{_module(frame)}.{getattr(code, 'co_qualname', code.co_name)}"
+
+def _classify(stack):
+    """Fase de una muestra: la primera función de autenticación o librería a la que llama la página"""
+    for frame in stack[1:]:
+        module = _module(frame)
+        if (module, frame.f_code.co_name) in AUTH_FUNCTIONS:
+            return "autenticación"
+        if module.startswith(TRANSPARENT_MODULES):
+            continue
+        phase = _PACKAGE_PHASES.get(module.split(".", 1)[0])
+        if phase is not None:
+            return phase
+    return "aplicación"
+
+def _finish(profile):
+    """Reparte el tiempo de la ejecución entre las fases y la guarda en el historial de la sesión"""
+    total = max(profile.last_seen - profile.started, 0.0)
+    samples = sum(profile.phases.values())
+    run = {
+        "pagina": profile.label,
+        "hora": datetime.now().strftime("%H:%M:%S"),
+        "total_ms": total * 1000,
+        "fases": {phase: (total * 1000 * profile.phases[phase] / samples if samples else 0.0) for phase in PHASES},
+        "muestras": samples,
+        "flamegraph": None
+    }
+    if total >= config.PROFILER_SLOW_RERUN and profile.stacks:
+        try:
+            run["flamegraph"] = _save_flamegraph(profile, run)
+        except OSError:
+            pass
+    with _lock:
+        runs = _history.pop(profile.session_id, None) or collections.deque(maxlen=config.PROFILER_HISTORY)
+        runs.append(run)
+        _history[profile.session_id] = runs
+        while len(_history) > _MAX_SESSIONS:
+            _history.popitem(last=False)
+
+def _save_flamegraph(profile, run):
+    """Escribe las pilas muestreadas en formato plegado y borra los archivos más antiguos"""
+    os.makedirs(config.PROFILER_OUTPUT_DIR, exist_ok=True)
+    slug = re.sub(r"[^\w]+", "_", profile.label).strip("_")
+    path = os.path.join(config.PROFILER_OUTPUT_DIR,
+                        f"{datetime.now():%Y%m%d-%H%M%S}_{slug}_{run['total_ms']:.0f}ms.folded")
+    with open(path, "w", encoding="utf-8") as file:
+        for stack, count in profile.stacks.most_common():
+            file.write(f"{stack} {count}\n")
+    for old in saved_flamegraphs()[config.PROFILER_MAX_FILES:]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return path
@@ -0,0 +1,167 @@
+"""
+Presupuesto de consultas a la base de datos por página.
+
+Cada escenario (una página y, si hace falta, las acciones del usuario) se ejecuta con
+AppTest sobre fake_supabase con datos sintéticos fijos, en un intérprete nuevo para
+que empiece con las cachés vacías. Se mide la primera ejecución (cachés frías) y una
+segunda ejecución de la misma sesión, y se cuentan las peticiones a Supabase (tablas,
+rpc y autenticación) y las filas recibidas. Las páginas siguientes de una lectura
+paginada (utils.iter_table_pages) no cuentan como consultas nuevas: crecen con las
+filas, que tienen su propio límite.
+
+Cada escenario se mide con un conjunto de datos pequeño y con otro varias veces
+mayor: el límite de consultas es el mismo para los dos, de modo que una consulta por
+actividad o por agente (N+1) lo supera en cuanto crecen los datos. El límite de filas
+se comprueba con el conjunto grande.
+
+    python query_budget.py            # tabla por escenario
+    python query_budget.py --check    # falla si algún escenario supera QUERY_BUDGETS
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Datos sintéticos (fake_supabase.generate_data) con los que se mide cada escenario
+DATASETS = {
+    "pequeño": {"agents": 100, "activities": 150},
+    "grande": {"agents": 800, "activities": 1500}
+}
+
+def _dynamic_report(at):
+    at.radio(key="stats_tab").set_value("Vista Dinámica").run()
+    next(button for button in at.button if button.label == "Generar Informe").click().run()
+
+def _edit_agent(at):
+    at.radio(key="agents_tab").set_value("Editar Agente").run()
+
+def _edit_activity(at):
+    at.radio(key="activities_tab").set_value("Editar Actividad").run()
+
+# Escenario -> (página, acciones tras la primera carga)
+SCENARIOS = {
+    "Actividades: listado": ("pages/1_Actividades.py", None),
+    "Actividades: editar": ("pages/1_Actividades.py", _edit_activity),
+    "Estadísticas: dashboard": ("pages/2_Estadisticas.py", None),
+    "Estadísticas: vista dinámica": ("pages/2_Estadisticas.py", _dynamic_report),
+    "Cursos: listado": ("pages/3_Cursos.py", None),
+    "Agentes: listado": ("pages/4_Agentes.py", None),
+    "Agentes: editar": ("pages/4_Agentes.py", _edit_agent)
+}
+
+# Límites por escenario:
+# - consultas: peticiones a Supabase para mostrar la página con las cachés vacías
+# - consultas_rerun: peticiones en una ejecución posterior de la misma sesión
+# - filas: filas recibidas con las cachés vacías (conjunto de datos grande)
+QUERY_BUDGETS = {
+    "Actividades: listado": {"consultas": 5, "consultas_rerun": 2, "filas": 2000},
+    "Actividades: editar": {"consultas": 10, "consultas_rerun": 2, "filas": 3000},
+    "Estadísticas: dashboard": {"consultas": 11, "consultas_rerun": 2, "filas": 6500},
+    "Estadísticas: vista dinámica": {"consultas": 16, "consultas_rerun": 2, "filas": 25000},
+    "Cursos: listado": {"consultas": 4, "consultas_rerun": 2, "filas": 50},
+    "Agentes: listado": {"consultas": 4, "consultas_rerun": 2, "filas": 1000},
+    "Agentes: editar": {"consultas": 5, "consultas_rerun": 2, "filas": 1000}
+}
+
+def measure(scenario, dataset):
+    """Mide un escenario en este proceso (llamar en un intérprete nuevo)"""
+    import fake_supabase
+    from streamlit.testing.v1 import AppTest
+
+    db = fake_supabase.FakeSupabase(fake_supabase.generate_data(**DATASETS[dataset]))
+    fake_supabase.install(db)
+    page, actions = SCENARIOS[scenario]
+
+    at = AppTest.from_file(page, default_timeout=120)
+    at.session_state["authenticated"] = True
+    at.session_state["user_nip"] = "10000"
+    at.session_state["supabase_session"] = {"access_token": f"token-{fake_supabase.MONITOR_EMAIL}",
+                                            "refresh_token": "prueba"}
+    at.run()
+    if actions:
+        actions(at)
+    first = db.stats()
+    errors = [exception.value for exception in at.exception]
+
+    db.reset_stats()
+    at.run()
+    rerun = db.stats()
+    errors += [exception.value for exception in at.exception]
+
+    return {
+        "escenario": scenario,
+        "datos": dataset,
+        "consultas": first["consultas"] - first["paginas_siguientes"],
+        "paginas": first["paginas_siguientes"],
+        "auth": sum(count for name, count in first["por_tabla"].items() if name.startswith("auth.")),
+        "filas": sum(first["filas"].values()),
+        "consultas_rerun": rerun["consultas"] - rerun["paginas_siguientes"],
+        "por_tabla": first["por_tabla"],
+        "por_tabla_rerun": rerun["por_tabla"],
+        "errores": errors
+    }
+
+def run_isolated(scenario, dataset):
+    """Mide un escenario en un intérprete nuevo, con la caché de disco en un directorio propio"""
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        env = {**os.environ, "ANALYTICS_SNAPSHOT_DIR": snapshot_dir, "CACHE_BACKEND": ""}
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--measure", scenario, dataset],
+            capture_output=True, text=True, cwd=ROOT, env=env
+        )
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(f"No se pudo medir {scenario} ({dataset}):\n{result.stderr[-2000:]}")
+
+def check(results):
+    """Lista de incumplimientos de QUERY_BUDGETS"""
+    problems = []
+    for result in results:
+        budget = QUERY_BUDGETS.get(result["escenario"])
+        label = f"{result['escenario']} ({result['datos']})"
+        if result["errores"]:
+            problems.append(f"{label}: la página falla: {result['errores'][0]}")
+        if budget is None:
+            problems.append(f"{label}: sin presupuesto en QUERY_BUDGETS")
+            continue
+        for metric, tables in (("consultas", "por_tabla"), ("consultas_rerun", "por_tabla_rerun")):
+            if result[metric] > budget[metric]:
+                problems.append(f"{label}: {result[metric]} {metric} (máximo {budget[metric]}); "
+                                f"por tabla: {result[tables]}")
+        if result["datos"] == "grande" and result["filas"] > budget["filas"]:
+            problems.append(f"{label}: {result['filas']} filas (máximo {budget['filas']})")
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consultas a la base de datos por página sobre fake_supabase")
+    parser.add_argument("--check", action="store_true", help="Fallar si algún escenario supera QUERY_BUDGETS")
+    parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS), help="Medir solo estos escenarios")
+    parser.add_argument("--measure", nargs=2, metavar=("ESCENARIO", "DATOS"), help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.measure:
+        print(json.dumps(measure(*options.measure), default=str))
+        sys.exit(0)
+
+    jobs = [(scenario, dataset) for scenario in options.scenario or SCENARIOS for dataset in DATASETS]
+    with ThreadPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 2)) as pool:
+        results = list(pool.map(lambda job: run_isolated(*job), jobs))
+
+    print(f"{'Escenario':<30} {'Datos':<8} {'Consultas':>9} {'(auth)':>7} {'Páginas':>8} {'Rerun':>6} {'Filas':>8}")
+    for result in results:
+        print(f"{result['escenario']:<30} {result['datos']:<8} {result['consultas']:>9} {result['auth']:>7} "
+              f"{result['paginas']:>8} {result['consultas_rerun']:>6} {result['filas']:>8}")
+
+    if options.check:
+        problems = check(results)
+        for problem in problems:
+            print(problem)
+        if problems:
+            sys.exit(1)
+        print("Todas las páginas están dentro de su presupuesto de consultas.")
@@ -0,0 +1,269 @@
+"""
+Capa de resiliencia de las llamadas a Supabase.
+
+Envuelve el transporte HTTP compartido (supabase_pool), así que se aplica a todos
+los `.execute()` de utils y de las páginas sin cambiar cada llamada:
+
+- Plazo máximo por operación (lectura, escritura o autenticación), repartido entre
+  los reintentos.
+- Reintentos con espera exponencial y jitter solo en operaciones idempotentes
+  (GET y las funciones de consulta de config.IDEMPOTENT_RPCS). Las escrituras solo
+  se reintentan si la conexión falló antes de enviar la petición.
+- Un circuit breaker por servicio (REST y autenticación): tras varios fallos
+  seguidos deja de llamar al servidor durante un tiempo y falla al instante; las
+  lecturas se sirven con la última respuesta correcta mientras tanto.
+"""
+import random
+import threading
+import time
+from collections import OrderedDict
+import httpx
+import config
+import metrics
+
+# Estados del circuit breaker
+CLOSED = "cerrado"
+OPEN = "abierto"
+HALF_OPEN = "semiabierto"
+
+# Cabecera que marca las respuestas servidas desde la última copia correcta
+STALE_HEADER = "x-resilience-stale"
+
+class CircuitOpenError(httpx.TransportError):
+    """El servicio está marcado como no disponible y no hay copia de la respuesta"""
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """Se ha agotado el plazo de la operación entre intentos"""
+
+_lock = threading.Lock()
+_metrics = {
+    "peticiones": 0,
+    "reintentos": 0,
+    "fallos": 0,
+    "plazos_agotados": 0,
+    "rechazadas_circuito": 0,
+    "respuestas_en_cache": 0,
+    "aperturas_circuito": 0
+}
+
+def _count(name, amount=1):
+    with _lock:
+        _metrics[name] += amount
+
+class CircuitBreaker:
+    """Circuit breaker de un servicio: cerrado -> abierto tras N fallos -> semiabierto tras la espera"""
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or config.CIRCUIT_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or config.CIRCUIT_RESET_TIMEOUT
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Indica si se puede llamar al servicio; en semiabierto deja pasar una sola prueba"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    _count("aperturas_circuito")
+                    print(f"Circuito de Supabase '{self.name}' abierto tras {self.failures} fallos seguidos")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            return {"servicio": self.name, "estado": self.state, "fallos": self.failures, "reintento_en": retry_in}
+
+_breakers = {"rest": CircuitBreaker("rest"), "auth": CircuitBreaker("auth")}
+
+# Última respuesta correcta de cada lectura, para servirla con el circuito abierto. Se
+# limita por número de entradas y por bytes: las de referencia son pequeñas, y las
+# respuestas grandes de exportaciones o tablas completas no se guardan
+_last_good = OrderedDict()
+_last_good_bytes = 0
+
+def _remember(key, response, content):
+    global _last_good_bytes
+    with _lock:
+        previous = _last_good.pop(key, None)
+        if previous is not None:
+            _last_good_bytes -= len(previous[2])
+        if len(content) > config.RESILIENCE_STALE_MAX_ENTRY_BYTES:
+            return
+        _last_good[key] = (response.status_code, response.headers.raw, content)
+        _last_good_bytes += len(content)
+        while _last_good and (len(_last_good) > config.RESILIENCE_STALE_MAX_ENTRIES
+                              or _last_good_bytes > config.RESILIENCE_STALE_MAX_BYTES):
+            _, (_, _, evicted) = _last_good.popitem(last=False)
+            _last_good_bytes -= len(evicted)
+
+def _recall(key):
+    with _lock:
+        entry = _last_good.get(key)
+    if entry is None:
+        return None
+    status_code, headers, content = entry
+    response = httpx.Response(status_code, headers=headers, stream=httpx.ByteStream(content))
+    response.headers[STALE_HEADER] = "1"
+    return response
+
+def classify(request):
+    """
+    Tipo de operación de una petición
+
+    Returns:
+        tuple: (servicio, operación, idempotente) con operación 'read', 'write' o 'auth'
+    """
+    path = request.url.path
+    if "/auth/v1" in path:
+        return "auth", "auth", False
+    if request.method in ("GET", "HEAD"):
+        return "rest", "read", True
+    if "/rpc/" in path:
+        idempotent = path.rsplit("/", 1)[-1] in config.IDEMPOTENT_RPCS
+        return "rest", "read" if idempotent else "write", idempotent
+    return "rest", "write", False
+
+def _backoff(attempt):
+    # Espera exponencial con jitter completo: evita que todas las sesiones reintenten a la vez
+    cap = min(config.RESILIENCE_BACKOFF_MAX, config.RESILIENCE_BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, cap)
+
+def _with_deadline(request, deadline):
+    remaining = max(0.001, deadline - time.monotonic())
+    timeout = dict(request.extensions.get("timeout") or {})
+    for name in ("connect", "read", "write", "pool"):
+        current = timeout.get(name)
+        timeout[name] = remaining if current is None else min(current, remaining)
+    request.extensions["timeout"] = timeout
+
+class ResilientTransport(httpx.BaseTransport):
+    """Transporte que añade plazos, reintentos y circuit breaker a otro transporte"""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        result = "error"
+        try:
+            response = self._handle_request(request)
+            result = "cache" if STALE_HEADER in response.headers else f"{response.status_code // 100}xx"
+            return response
+        finally:
+            metrics.observe_supabase_request(request, result, time.perf_counter() - started)
+
+    def _handle_request(self, request):
+        service, operation, idempotent = classify(request)
+        breaker = _breakers[service]
+        cache_key = None
+        if service == "rest" and request.method == "GET":
+            cache_key = (str(request.url), request.headers.get("authorization"))
+        _count("peticiones")
+
+        if not breaker.allow():
+            stale = _recall(cache_key) if cache_key else None
+            if stale is not None:
+                _count("respuestas_en_cache")
+                return stale
+            _count("rechazadas_circuito")
+            raise CircuitOpenError(f"Supabase ({service}) no está disponible; se reintentará en unos segundos", request=request)
+
+        deadline = time.monotonic() + config.RESILIENCE_DEADLINES[operation]
+        max_retries = config.RESILIENCE_MAX_RETRIES
+        attempt = 0
+        while True:
+            _with_deadline(request, deadline)
+            retryable = idempotent
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.ConnectError as e:
+                # La petición no llegó a enviarse: se puede reintentar aunque sea una escritura
+                error, retryable = e, True
+            except (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError) as e:
+                error = e
+            else:
+                if response.status_code < 500 and response.status_code != 429:
+                    breaker.record_success()
+                    if cache_key and response.status_code == 200:
+                        content = b"".join(response.stream)
+                        response.stream.close()
+                        _remember(cache_key, response, content)
+                        response = httpx.Response(
+                            response.status_code, headers=response.headers.raw,
+                            stream=httpx.ByteStream(content), extensions=response.extensions
+                        )
+                    return response
+                error = None
+                if not retryable or attempt >= max_retries:
+                    # Error del servidor sin más intentos: se devuelve para que el cliente lo informe
+                    if response.status_code >= 500:
+                        breaker.record_failure()
+                        _count("fallos")
+                    return response
+                response.close()
+
+            wait = _backoff(attempt)
+            if error is not None and (not retryable or attempt >= max_retries):
+                breaker.record_failure()
+                _count("fallos")
+                if isinstance(error, httpx.TimeoutException):
+                    _count("plazos_agotados")
+                raise error
+            if time.monotonic() + wait >= deadline:
+                breaker.record_failure()
+                _count("fallos")
+                _count("plazos_agotados")
+                raise DeadlineExceeded(
+                    f"Supabase no respondió en {config.RESILIENCE_DEADLINES[operation]} s ({operation})",
+                    request=request
+                )
+            attempt += 1
+            _count("reintentos")
+            time.sleep(wait)
+
+    def close(self):
+        self.transport.close()
+
+def get_metrics():
+    """Contadores de la capa de resiliencia desde que arrancó el proceso"""
+    with _lock:
+        metrics = dict(_metrics)
+        metrics["lecturas_guardadas"] = len(_last_good)
+        metrics["bytes_guardados"] = _last_good_bytes
+    return metrics
+
+def get_circuit_states():
+    """Estado de cada circuit breaker (lista de dicts)"""
+    return [breaker.snapshot() for breaker in _breakers.values()]
+
+def is_degraded():
+    """True si algún servicio de Supabase tiene el circuito abierto"""
+    return any(breaker.state != CLOSED for breaker in _breakers.values())
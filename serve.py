@@ -0,0 +1,75 @@
+"""
+Arranque de la aplicación en producción.
+
+Hace lo mismo que `streamlit run app.py`, pero en el mismo proceso:
+- lanza la precarga de cachés (warmup.py) en cuanto arranca el servidor, sin
+  esperar al primer usuario;
+- añade al servidor de Streamlit el endpoint /readyz, que responde 200 con el
+  informe de disponibilidad cuando la precarga ha terminado y 503 mientras no
+  (el estado de Supabase y de los circuitos va en el informe, sin afectar al código);
+- publica las métricas de la aplicación en /metrics, en formato de Prometheus
+  (metrics.py).
+
+    python serve.py --server.port $PORT --server.address 0.0.0.0
+"""
+import json
+import sys
+import tornado.ioloop
+import tornado.web
+from streamlit import config as streamlit_config
+from streamlit.web import cli
+from streamlit.web.server import server as streamlit_server
+from streamlit.web.server.server_util import make_url_path_regex
+import metrics
+import warmup
+
+READY_ENDPOINT = "readyz"
+METRICS_ENDPOINT = "metrics"
+
+def _json_default(value):
+    # Números de numpy y fechas del informe
+    return value.item() if hasattr(value, "item") else str(value)
+
+class ReadinessHandler(tornado.web.RequestHandler):
+    async def get(self):
+        # La comprobación de Supabase bloquea: se hace fuera del bucle de eventos del servidor
+        ready, report = await tornado.ioloop.IOLoop.current().run_in_executor(None, warmup.readiness)
+        self.set_status(200 if ready else 503)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.set_header("Cache-Control", "no-cache")
+        self.finish(json.dumps(report, default=_json_default, ensure_ascii=False))
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header("Content-Type", metrics.CONTENT_TYPE)
+        self.set_header("Cache-Control", "no-cache")
+        self.finish(metrics.render())
+
+def add_endpoint(name, handler):
+    """
+    Añade una ruta propia (p. ej. "readyz") al servidor de Streamlit que se cree después
+
+    Se sirve bajo server.baseUrlPath, igual que las rutas de Streamlit.
+    """
+    create_app = streamlit_server.Server._create_app
+
+    def _create_app(self):
+        app = create_app(self)
+        base = streamlit_config.get_option("server.baseUrlPath")
+        # add_handlers las coloca antes de las rutas de Streamlit (que acaban en un comodín)
+        app.add_handlers(r".*", [(make_url_path_regex(base, name), handler)])
+        return app
+
+    streamlit_server.Server._create_app = _create_app
+
+def main(args):
+    """Arranca `streamlit run app.py` con la precarga, /readyz y /metrics; `args` son las opciones de streamlit"""
+    add_endpoint(READY_ENDPOINT, ReadinessHandler)
+    add_endpoint(METRICS_ENDPOINT, MetricsHandler)
+    metrics.install()
+    warmup.start()
+    sys.argv = ["streamlit", "run", "app.py", *args]
+    return cli.main()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
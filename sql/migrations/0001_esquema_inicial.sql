@@ -0,0 +1,158 @@
+-- Tabla de agentes
+CREATE TABLE IF NOT EXISTS agents (
+    nip VARCHAR(50) PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    apellido1 VARCHAR(100) NOT NULL,
+    apellido2 VARCHAR(100),
+    seccion VARCHAR(100),
+    grupo VARCHAR(20),
+    email VARCHAR(255),
+    telefono VARCHAR(20),
+    activo BOOLEAN DEFAULT TRUE,
+    monitor BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tabla de usuarios para autenticación
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(255) NOT NULL UNIQUE,
+    name VARCHAR(255) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    agent_nip VARCHAR(50) REFERENCES agents(nip) ON DELETE SET NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tabla de cursos
+CREATE TABLE IF NOT EXISTS courses (
+    id SERIAL PRIMARY KEY,
+    nombre VARCHAR(255) NOT NULL UNIQUE,
+    descripcion TEXT NOT NULL,
+    ocultar BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Tabla de actividades
+CREATE TABLE IF NOT EXISTS activities (
+    id SERIAL PRIMARY KEY,
+    fecha DATE NOT NULL,
+    turno VARCHAR(50) NOT NULL,
+    curso_id INTEGER REFERENCES courses(id) ON DELETE SET NULL,
+    monitor_nip VARCHAR(50) REFERENCES agents(nip) ON DELETE SET NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(fecha, turno)
+);
+
+-- Tabla de participantes en actividades
+CREATE TABLE IF NOT EXISTS activity_participants (
+    id SERIAL PRIMARY KEY,
+    activity_id INTEGER REFERENCES activities(id) ON DELETE CASCADE,
+    agent_nip VARCHAR(50) REFERENCES agents(nip) ON DELETE CASCADE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(activity_id, agent_nip)
+);
+
+
+-- FUNCIÓN SQL PARA VERIFICAR SI UN USUARIO AUTENTICADO ES MONITOR
+CREATE OR REPLACE FUNCTION is_authenticated_user_monitor(authenticated_user_email VARCHAR)
+RETURNS BOOLEAN AS $$
+DECLARE
+    is_monitor BOOLEAN;
+BEGIN
+    SELECT monitor INTO is_monitor
+    FROM agents
+    WHERE email = authenticated_user_email;
+
+    RETURN is_monitor;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER;
+
+-- Ejemplo de uso:
+-- SELECT is_authenticated_user_monitor('email_del_usuario_autenticado@ejemplo.com');
+
+-- BÚSQUEDA PAGINADA DE AGENTES EN EL SERVIDOR
+-- Requiere la extensión pg_trgm para que las búsquedas con LIKE '%texto%' usen índice
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Texto normalizado sobre el que se busca (debe ser IMMUTABLE para poder indexarlo)
+CREATE OR REPLACE FUNCTION agent_search_text(
+    p_nip VARCHAR,
+    p_nombre VARCHAR,
+    p_apellido1 VARCHAR,
+    p_apellido2 VARCHAR,
+    p_email VARCHAR,
+    p_telefono VARCHAR,
+    p_seccion VARCHAR,
+    p_grupo VARCHAR
+)
+RETURNS TEXT AS $$
+    SELECT lower(
+        coalesce(p_nip, '') || ' ' || coalesce(p_nombre, '') || ' ' ||
+        coalesce(p_apellido1, '') || ' ' || coalesce(p_apellido2, '') || ' ' ||
+        coalesce(p_email, '') || ' ' || coalesce(p_telefono, '') || ' ' ||
+        coalesce(p_seccion, '') || ' ' || coalesce(p_grupo, '')
+    );
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE INDEX IF NOT EXISTS agents_search_trgm_idx ON agents USING gin (
+    agent_search_text(nip, nombre, apellido1, apellido2, email, telefono, seccion, grupo) gin_trgm_ops
+);
+
+CREATE INDEX IF NOT EXISTS agents_seccion_grupo_idx ON agents (seccion, grupo);
+
+-- Devuelve una página de agentes filtrada y ordenada, junto con el total de coincidencias
+CREATE OR REPLACE FUNCTION search_agents(
+    p_query TEXT DEFAULT NULL,
+    p_sections TEXT[] DEFAULT NULL,
+    p_groups TEXT[] DEFAULT NULL,
+    p_active_only BOOLEAN DEFAULT FALSE,
+    p_monitors_only BOOLEAN DEFAULT FALSE,
+    p_sort TEXT DEFAULT 'nip',
+    p_desc BOOLEAN DEFAULT FALSE,
+    p_limit INTEGER DEFAULT 25,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    nip VARCHAR,
+    nombre VARCHAR,
+    apellido1 VARCHAR,
+    apellido2 VARCHAR,
+    seccion VARCHAR,
+    grupo VARCHAR,
+    email VARCHAR,
+    telefono VARCHAR,
+    activo BOOLEAN,
+    monitor BOOLEAN,
+    total_count BIGINT
+) AS $$
+    SELECT a.nip, a.nombre, a.apellido1, a.apellido2, a.seccion, a.grupo,
+           a.email, a.telefono, a.activo, a.monitor,
+           count(*) OVER () AS total_count
+    FROM agents a
+    WHERE (p_query IS NULL OR p_query = ''
+           OR agent_search_text(a.nip, a.nombre, a.apellido1, a.apellido2,
+                                a.email, a.telefono, a.seccion, a.grupo)
+              LIKE '%' || lower(p_query) || '%')
+      AND (p_sections IS NULL OR cardinality(p_sections) = 0 OR a.seccion = ANY(p_sections))
+      AND (p_groups IS NULL OR cardinality(p_groups) = 0 OR a.grupo = ANY(p_groups))
+      AND (NOT p_active_only OR a.activo)
+      AND (NOT p_monitors_only OR a.monitor)
+    -- Solo se permite ordenar por columnas conocidas; el NIP desempata para que la paginación sea estable
+    ORDER BY
+        CASE WHEN NOT p_desc AND p_sort = 'nombre' THEN a.nombre END ASC,
+        CASE WHEN NOT p_desc AND p_sort = 'apellido1' THEN a.apellido1 END ASC,
+        CASE WHEN NOT p_desc AND p_sort = 'seccion' THEN a.seccion END ASC,
+        CASE WHEN NOT p_desc AND p_sort = 'grupo' THEN a.grupo END ASC,
+        CASE WHEN p_desc AND p_sort = 'nombre' THEN a.nombre END DESC,
+        CASE WHEN p_desc AND p_sort = 'apellido1' THEN a.apellido1 END DESC,
+        CASE WHEN p_desc AND p_sort = 'seccion' THEN a.seccion END DESC,
+        CASE WHEN p_desc AND p_sort = 'grupo' THEN a.grupo END DESC,
+        CASE WHEN p_desc THEN a.nip END DESC,
+        a.nip ASC
+    LIMIT greatest(p_limit, 1)
+    OFFSET greatest(p_offset, 0);
+$$ LANGUAGE sql STABLE;
+
+-- Ejemplo de uso:
+-- SELECT * FROM search_agents('garcia', ARRAY['Patrullas'], NULL, TRUE, FALSE, 'apellido1', FALSE, 25, 0);
@@ -0,0 +1,21 @@
+-- Índices secundarios sobre las columnas por las que más filtra la aplicación
+
+-- Participaciones de un agente (estadísticas, borrado en cascada de agentes)
+CREATE INDEX IF NOT EXISTS activity_participants_agent_nip_idx ON activity_participants (agent_nip);
+
+-- Participantes de una actividad. La restricción UNIQUE(activity_id, agent_nip) ya sirve
+-- para estas búsquedas, pero un índice de una sola columna es más pequeño y se mantiene
+-- aunque la restricción cambie
+CREATE INDEX IF NOT EXISTS activity_participants_activity_id_idx ON activity_participants (activity_id);
+
+-- Actividades por rango de fechas (listado, dashboard y estadísticas)
+CREATE INDEX IF NOT EXISTS activities_fecha_idx ON activities (fecha);
+
+-- Actividades por curso (filtro de curso y comprobación antes de borrar un curso)
+CREATE INDEX IF NOT EXISTS activities_curso_id_idx ON activities (curso_id);
+
+-- Actividades por monitor (borrado de agentes con ON DELETE SET NULL)
+CREATE INDEX IF NOT EXISTS activities_monitor_nip_idx ON activities (monitor_nip);
+
+-- Búsqueda del agente asociado al usuario autenticado
+CREATE INDEX IF NOT EXISTS agents_email_idx ON agents (email);
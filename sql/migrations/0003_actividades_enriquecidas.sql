@@ -0,0 +1,33 @@
+-- Actividades con los datos que necesitan el listado, el selector de edición y el informe PDF:
+-- nombre del curso, nombre del monitor y participantes agregados. Se consulta desde PostgREST
+-- como una tabla más (activities_enriched?fecha=gte.2025-01-01&fecha=lte.2025-12-31) y el
+-- filtro por fecha usa activities_fecha_idx.
+CREATE OR REPLACE VIEW activities_enriched
+WITH (security_invoker = true) AS
+SELECT
+    a.*,
+    c.nombre AS curso_nombre,
+    NULLIF(concat_ws(' ', m.nombre, m.apellido1, m.apellido2), '') AS monitor_nombre,
+    COALESCE(p.participant_count, 0) AS participant_count,
+    COALESCE(p.participant_nips, ARRAY[]::VARCHAR[]) AS participant_nips,
+    COALESCE(p.participant_names, ARRAY[]::TEXT[]) AS participant_names,
+    COALESCE(p.participants, '[]'::JSONB) AS participants
+FROM activities a
+LEFT JOIN courses c ON c.id = a.curso_id
+LEFT JOIN agents m ON m.nip = a.monitor_nip
+LEFT JOIN LATERAL (
+    SELECT
+        count(*)::INTEGER AS participant_count,
+        array_agg(ag.nip ORDER BY ag.apellido1, ag.apellido2, ag.nombre) AS participant_nips,
+        array_agg(concat_ws(' ', ag.nombre, ag.apellido1, ag.apellido2)
+                  ORDER BY ag.apellido1, ag.apellido2, ag.nombre) AS participant_names,
+        jsonb_agg(jsonb_build_object(
+            'nip', ag.nip,
+            'nombre', concat_ws(' ', ag.nombre, ag.apellido1, ag.apellido2),
+            'seccion', ag.seccion,
+            'grupo', ag.grupo
+        ) ORDER BY ag.apellido1, ag.apellido2, ag.nombre) AS participants
+    FROM activity_participants ap
+    JOIN agents ag ON ag.nip = ap.agent_nip
+    WHERE ap.activity_id = a.id
+) p ON TRUE;
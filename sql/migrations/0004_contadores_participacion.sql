@@ -0,0 +1,169 @@
+-- Contadores de participación desnormalizados, mantenidos por triggers sobre activity_participants.
+-- Permiten leer el número de participantes de una actividad y el total de participaciones y la
+-- fecha de la última actividad de un agente sin volver a contar activity_participants.
+ALTER TABLE activities ADD COLUMN IF NOT EXISTS participant_count INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS total_participations INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE agents ADD COLUMN IF NOT EXISTS last_activity_date DATE;
+
+-- Los triggers son de sentencia y usan tablas de transición, de modo que al guardar una
+-- actividad con muchos participantes se actualiza cada contador una sola vez.
+CREATE OR REPLACE FUNCTION update_participation_counters()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE activities a
+        SET participant_count = GREATEST(a.participant_count - o.cnt, 0)
+        FROM (SELECT activity_id, count(*)::INTEGER AS cnt FROM old_rows GROUP BY activity_id) o
+        WHERE a.id = o.activity_id;
+
+        -- La última fecha no se puede descontar: se recalcula para los agentes afectados
+        UPDATE agents ag
+        SET total_participations = GREATEST(ag.total_participations - o.cnt, 0),
+            last_activity_date = (
+                SELECT max(act.fecha)
+                FROM activity_participants ap
+                JOIN activities act ON act.id = ap.activity_id
+                WHERE ap.agent_nip = ag.nip
+            )
+        FROM (SELECT agent_nip, count(*)::INTEGER AS cnt FROM old_rows GROUP BY agent_nip) o
+        WHERE ag.nip = o.agent_nip;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE activities a
+        SET participant_count = a.participant_count + n.cnt
+        FROM (SELECT activity_id, count(*)::INTEGER AS cnt FROM new_rows GROUP BY activity_id) n
+        WHERE a.id = n.activity_id;
+
+        UPDATE agents ag
+        SET total_participations = ag.total_participations + n.cnt,
+            last_activity_date = GREATEST(ag.last_activity_date, n.max_fecha)
+        FROM (
+            SELECT nr.agent_nip, count(*)::INTEGER AS cnt, max(act.fecha) AS max_fecha
+            FROM new_rows nr
+            LEFT JOIN activities act ON act.id = nr.activity_id
+            GROUP BY nr.agent_nip
+        ) n
+        WHERE ag.nip = n.agent_nip;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public;
+
+DROP TRIGGER IF EXISTS activity_participants_counters_insert ON activity_participants;
+CREATE TRIGGER activity_participants_counters_insert
+AFTER INSERT ON activity_participants
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION update_participation_counters();
+
+DROP TRIGGER IF EXISTS activity_participants_counters_update ON activity_participants;
+CREATE TRIGGER activity_participants_counters_update
+AFTER UPDATE ON activity_participants
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION update_participation_counters();
+
+DROP TRIGGER IF EXISTS activity_participants_counters_delete ON activity_participants;
+CREATE TRIGGER activity_participants_counters_delete
+AFTER DELETE ON activity_participants
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION update_participation_counters();
+
+-- Si cambia la fecha de una actividad, la última fecha de sus participantes puede cambiar
+CREATE OR REPLACE FUNCTION update_last_activity_date_on_fecha_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE agents ag
+    SET last_activity_date = (
+        SELECT max(act.fecha)
+        FROM activity_participants ap
+        JOIN activities act ON act.id = ap.activity_id
+        WHERE ap.agent_nip = ag.nip
+    )
+    WHERE ag.nip IN (SELECT agent_nip FROM activity_participants WHERE activity_id = NEW.id);
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public;
+
+DROP TRIGGER IF EXISTS activities_fecha_last_activity_date ON activities;
+CREATE TRIGGER activities_fecha_last_activity_date
+AFTER UPDATE OF fecha ON activities
+FOR EACH ROW
+WHEN (OLD.fecha IS DISTINCT FROM NEW.fecha)
+EXECUTE FUNCTION update_last_activity_date_on_fecha_change();
+
+-- Recalcula todos los contadores desde activity_participants y devuelve las diferencias
+-- encontradas. Con p_fix = FALSE solo informa, sin corregir.
+CREATE OR REPLACE FUNCTION reconcile_participation_counters(p_fix BOOLEAN DEFAULT TRUE)
+RETURNS TABLE (
+    entity TEXT,
+    entity_key TEXT,
+    counter TEXT,
+    stored_value TEXT,
+    actual_value TEXT
+) AS $$
+#variable_conflict use_column
+BEGIN
+    CREATE TEMP TABLE actual_activity_counts ON COMMIT DROP AS
+    SELECT a.id, count(ap.id)::INTEGER AS cnt
+    FROM activities a
+    LEFT JOIN activity_participants ap ON ap.activity_id = a.id
+    GROUP BY a.id;
+
+    CREATE TEMP TABLE actual_agent_counts ON COMMIT DROP AS
+    SELECT ag.nip, count(ap.id)::INTEGER AS cnt, max(act.fecha) AS last_fecha
+    FROM agents ag
+    LEFT JOIN activity_participants ap ON ap.agent_nip = ag.nip
+    LEFT JOIN activities act ON act.id = ap.activity_id
+    GROUP BY ag.nip;
+
+    RETURN QUERY
+    SELECT 'activities'::TEXT, a.id::TEXT, 'participant_count'::TEXT,
+           a.participant_count::TEXT, c.cnt::TEXT
+    FROM activities a
+    JOIN actual_activity_counts c ON c.id = a.id
+    WHERE a.participant_count <> c.cnt;
+
+    RETURN QUERY
+    SELECT 'agents'::TEXT, ag.nip::TEXT, 'total_participations'::TEXT,
+           ag.total_participations::TEXT, c.cnt::TEXT
+    FROM agents ag
+    JOIN actual_agent_counts c ON c.nip = ag.nip
+    WHERE ag.total_participations <> c.cnt;
+
+    RETURN QUERY
+    SELECT 'agents'::TEXT, ag.nip::TEXT, 'last_activity_date'::TEXT,
+           ag.last_activity_date::TEXT, c.last_fecha::TEXT
+    FROM agents ag
+    JOIN actual_agent_counts c ON c.nip = ag.nip
+    WHERE ag.last_activity_date IS DISTINCT FROM c.last_fecha;
+
+    IF p_fix THEN
+        UPDATE activities a
+        SET participant_count = c.cnt
+        FROM actual_activity_counts c
+        WHERE c.id = a.id AND a.participant_count <> c.cnt;
+
+        UPDATE agents ag
+        SET total_participations = c.cnt,
+            last_activity_date = c.last_fecha
+        FROM actual_agent_counts c
+        WHERE c.nip = ag.nip
+          AND (ag.total_participations <> c.cnt OR ag.last_activity_date IS DISTINCT FROM c.last_fecha);
+    END IF;
+
+    DROP TABLE actual_activity_counts;
+    DROP TABLE actual_agent_counts;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public;
+
+-- Carga inicial de los contadores con los datos existentes
+SELECT count(*) FROM reconcile_participation_counters();
@@ -0,0 +1,186 @@
+-- Resúmenes diarios para el Dashboard General de Estadísticas. En lugar de recorrer todas las
+-- participaciones del rango, el dashboard lee unos cientos de filas agregadas por día.
+
+-- Actividades por día x curso x turno
+CREATE TABLE IF NOT EXISTS activity_daily_rollup (
+    id BIGSERIAL PRIMARY KEY,
+    fecha DATE NOT NULL,
+    curso_id INTEGER,
+    turno VARCHAR(50),
+    activities INTEGER NOT NULL,
+    participations INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS activity_daily_rollup_fecha_idx ON activity_daily_rollup (fecha);
+
+-- Participaciones por día x curso x sección x grupo x turno. "activities" es el número de
+-- actividades distintas con algún participante del grupo
+CREATE TABLE IF NOT EXISTS participation_daily_rollup (
+    id BIGSERIAL PRIMARY KEY,
+    fecha DATE NOT NULL,
+    curso_id INTEGER,
+    seccion VARCHAR(100),
+    grupo VARCHAR(20),
+    turno VARCHAR(50),
+    participations INTEGER NOT NULL,
+    activities INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS participation_daily_rollup_fecha_idx ON participation_daily_rollup (fecha);
+
+-- Días cuyos resúmenes hay que recalcular. Los triggers solo apuntan el día; el recálculo
+-- se hace después con refresh_daily_rollups(), una vez por día aunque haya habido muchas escrituras
+CREATE TABLE IF NOT EXISTS rollup_dirty_days (
+    fecha DATE PRIMARY KEY
+);
+
+CREATE OR REPLACE FUNCTION mark_rollup_days_from_activities()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO rollup_dirty_days (fecha) VALUES (OLD.fecha) ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO rollup_dirty_days (fecha) VALUES (NEW.fecha) ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public;
+
+DROP TRIGGER IF EXISTS activities_rollup_dirty_days ON activities;
+CREATE TRIGGER activities_rollup_dirty_days
+AFTER INSERT OR UPDATE OF fecha, curso_id, turno OR DELETE ON activities
+FOR EACH ROW EXECUTE FUNCTION mark_rollup_days_from_activities();
+
+-- Al borrar una actividad, sus participantes se borran en cascada cuando la actividad ya no
+-- existe; ese día lo marca el trigger de activities
+CREATE OR REPLACE FUNCTION mark_rollup_days_from_participants()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        INSERT INTO rollup_dirty_days (fecha)
+        SELECT DISTINCT a.fecha FROM old_rows o JOIN activities a ON a.id = o.activity_id
+        ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO rollup_dirty_days (fecha)
+        SELECT DISTINCT a.fecha FROM new_rows n JOIN activities a ON a.id = n.activity_id
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public;
+
+DROP TRIGGER IF EXISTS activity_participants_rollup_insert ON activity_participants;
+CREATE TRIGGER activity_participants_rollup_insert
+AFTER INSERT ON activity_participants
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION mark_rollup_days_from_participants();
+
+DROP TRIGGER IF EXISTS activity_participants_rollup_update ON activity_participants;
+CREATE TRIGGER activity_participants_rollup_update
+AFTER UPDATE ON activity_participants
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION mark_rollup_days_from_participants();
+
+DROP TRIGGER IF EXISTS activity_participants_rollup_delete ON activity_participants;
+CREATE TRIGGER activity_participants_rollup_delete
+AFTER DELETE ON activity_participants
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION mark_rollup_days_from_participants();
+
+-- Cambiar la sección o el grupo de un agente mueve sus participaciones de grupo en todos sus días
+CREATE OR REPLACE FUNCTION mark_rollup_days_from_agent()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO rollup_dirty_days (fecha)
+    SELECT DISTINCT a.fecha
+    FROM activity_participants ap
+    JOIN activities a ON a.id = ap.activity_id
+    WHERE ap.agent_nip = NEW.nip
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public;
+
+DROP TRIGGER IF EXISTS agents_rollup_dirty_days ON agents;
+CREATE TRIGGER agents_rollup_dirty_days
+AFTER UPDATE OF seccion, grupo ON agents
+FOR EACH ROW
+WHEN (OLD.seccion IS DISTINCT FROM NEW.seccion OR OLD.grupo IS DISTINCT FROM NEW.grupo)
+EXECUTE FUNCTION mark_rollup_days_from_agent();
+
+-- Recalcula los resúmenes de los días pendientes y devuelve cuántos días ha recalculado.
+-- Si no hay días pendientes no hace nada, por lo que se puede llamar antes de cada lectura.
+CREATE OR REPLACE FUNCTION refresh_daily_rollups()
+RETURNS INTEGER AS $$
+DECLARE
+    v_days DATE[];
+BEGIN
+    WITH taken AS (
+        DELETE FROM rollup_dirty_days
+        WHERE fecha IN (SELECT fecha FROM rollup_dirty_days FOR UPDATE SKIP LOCKED)
+        RETURNING fecha
+    )
+    SELECT array_agg(fecha) INTO v_days FROM taken;
+
+    IF v_days IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    DELETE FROM activity_daily_rollup WHERE fecha = ANY(v_days);
+    DELETE FROM participation_daily_rollup WHERE fecha = ANY(v_days);
+
+    INSERT INTO activity_daily_rollup (fecha, curso_id, turno, activities, participations)
+    SELECT a.fecha, a.curso_id, a.turno, count(DISTINCT a.id)::INTEGER, count(ap.id)::INTEGER
+    FROM activities a
+    LEFT JOIN activity_participants ap ON ap.activity_id = a.id
+    WHERE a.fecha = ANY(v_days)
+    GROUP BY a.fecha, a.curso_id, a.turno;
+
+    INSERT INTO participation_daily_rollup (fecha, curso_id, seccion, grupo, turno, participations, activities)
+    SELECT a.fecha, a.curso_id, ag.seccion, ag.grupo, a.turno, count(*)::INTEGER, count(DISTINCT a.id)::INTEGER
+    FROM activities a
+    JOIN activity_participants ap ON ap.activity_id = a.id
+    JOIN agents ag ON ag.nip = ap.agent_nip
+    WHERE a.fecha = ANY(v_days)
+    GROUP BY a.fecha, a.curso_id, ag.seccion, ag.grupo, a.turno;
+
+    RETURN array_length(v_days, 1);
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public;
+
+-- Participaciones por agente en un rango. No se puede sacar de los resúmenes (no tienen la
+-- dimensión agente) pero devuelve una fila por agente en lugar de una por participación
+CREATE OR REPLACE FUNCTION participation_by_agent(
+    p_start DATE,
+    p_end DATE,
+    p_curso_id INTEGER DEFAULT NULL,
+    p_sections TEXT[] DEFAULT NULL
+)
+RETURNS TABLE (agent_nip VARCHAR, participations INTEGER) AS $$
+    SELECT ap.agent_nip, count(*)::INTEGER
+    FROM activities a
+    JOIN activity_participants ap ON ap.activity_id = a.id
+    JOIN agents ag ON ag.nip = ap.agent_nip
+    WHERE a.fecha BETWEEN p_start AND p_end
+      AND (p_curso_id IS NULL OR a.curso_id = p_curso_id)
+      AND (p_sections IS NULL OR ag.seccion = ANY(p_sections))
+    GROUP BY ap.agent_nip
+    ORDER BY 2 DESC, 1
+$$ LANGUAGE sql STABLE;
+
+-- Carga inicial con todos los días que tienen actividades
+INSERT INTO rollup_dirty_days (fecha)
+SELECT DISTINCT fecha FROM activities
+ON CONFLICT DO NOTHING;
+
+SELECT refresh_daily_rollups();
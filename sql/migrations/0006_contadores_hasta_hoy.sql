@@ -0,0 +1,179 @@
+-- Los contadores de agente de 0004 (total_participations y last_activity_date) contaban
+-- también las actividades programadas para días futuros: quien ya estaba apuntado a un
+-- curso próximo aparecía con 0 días desde su última actividad y el histórico incluía
+-- actividades que aún no se habían hecho. A partir de aquí solo cuentan las actividades
+-- con fecha <= CURRENT_DATE. participant_count (inscritos en cada actividad) no cambia.
+--
+-- Como el paso de los días no dispara ningún trigger, una tarea diaria
+-- (reconcile_participation_counters) suma las actividades que pasan a ser de hoy; con
+-- pg_cron se programa aquí mismo y, si no, con `python migrate.py --reconcile corregir`.
+
+-- Recalcula los contadores de los agentes indicados a partir de sus actividades ya realizadas
+CREATE OR REPLACE FUNCTION recount_agent_participations(p_nips VARCHAR[])
+RETURNS VOID AS $$
+    UPDATE agents ag
+    SET total_participations = c.cnt,
+        last_activity_date = c.last_fecha
+    FROM (
+        SELECT ag2.nip, count(act.id)::INTEGER AS cnt, max(act.fecha) AS last_fecha
+        FROM agents ag2
+        LEFT JOIN activity_participants ap ON ap.agent_nip = ag2.nip
+        LEFT JOIN activities act ON act.id = ap.activity_id AND act.fecha <= CURRENT_DATE
+        WHERE ag2.nip = ANY(p_nips)
+        GROUP BY ag2.nip
+    ) c
+    WHERE ag.nip = c.nip
+      AND (ag.total_participations <> c.cnt OR ag.last_activity_date IS DISTINCT FROM c.last_fecha);
+$$ LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public;
+
+-- Los triggers siguen siendo de sentencia: el contador de la actividad se ajusta con la
+-- diferencia y los de los agentes afectados se recalculan, una vez por agente, con el
+-- índice de activity_participants por agent_nip
+CREATE OR REPLACE FUNCTION update_participation_counters()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_nips VARCHAR[] := ARRAY[]::VARCHAR[];
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE activities a
+        SET participant_count = GREATEST(a.participant_count - o.cnt, 0)
+        FROM (SELECT activity_id, count(*)::INTEGER AS cnt FROM old_rows GROUP BY activity_id) o
+        WHERE a.id = o.activity_id;
+
+        v_nips := v_nips || ARRAY(SELECT DISTINCT agent_nip FROM old_rows);
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE activities a
+        SET participant_count = a.participant_count + n.cnt
+        FROM (SELECT activity_id, count(*)::INTEGER AS cnt FROM new_rows GROUP BY activity_id) n
+        WHERE a.id = n.activity_id;
+
+        v_nips := v_nips || ARRAY(SELECT DISTINCT agent_nip FROM new_rows);
+    END IF;
+
+    PERFORM recount_agent_participations(v_nips);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public;
+
+-- Si cambia la fecha de una actividad, puede pasar de futura a realizada o al revés
+CREATE OR REPLACE FUNCTION update_last_activity_date_on_fecha_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM recount_agent_participations(
+        ARRAY(SELECT agent_nip FROM activity_participants WHERE activity_id = NEW.id)
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public;
+
+CREATE OR REPLACE FUNCTION reconcile_participation_counters(p_fix BOOLEAN DEFAULT TRUE)
+RETURNS TABLE (
+    entity TEXT,
+    entity_key TEXT,
+    counter TEXT,
+    stored_value TEXT,
+    actual_value TEXT
+) AS $$
+#variable_conflict use_column
+BEGIN
+    CREATE TEMP TABLE actual_activity_counts ON COMMIT DROP AS
+    SELECT a.id, count(ap.id)::INTEGER AS cnt
+    FROM activities a
+    LEFT JOIN activity_participants ap ON ap.activity_id = a.id
+    GROUP BY a.id;
+
+    CREATE TEMP TABLE actual_agent_counts ON COMMIT DROP AS
+    SELECT ag.nip, count(act.id)::INTEGER AS cnt, max(act.fecha) AS last_fecha
+    FROM agents ag
+    LEFT JOIN activity_participants ap ON ap.agent_nip = ag.nip
+    LEFT JOIN activities act ON act.id = ap.activity_id AND act.fecha <= CURRENT_DATE
+    GROUP BY ag.nip;
+
+    RETURN QUERY
+    SELECT 'activities'::TEXT, a.id::TEXT, 'participant_count'::TEXT,
+           a.participant_count::TEXT, c.cnt::TEXT
+    FROM activities a
+    JOIN actual_activity_counts c ON c.id = a.id
+    WHERE a.participant_count <> c.cnt;
+
+    RETURN QUERY
+    SELECT 'agents'::TEXT, ag.nip::TEXT, 'total_participations'::TEXT,
+           ag.total_participations::TEXT, c.cnt::TEXT
+    FROM agents ag
+    JOIN actual_agent_counts c ON c.nip = ag.nip
+    WHERE ag.total_participations <> c.cnt;
+
+    RETURN QUERY
+    SELECT 'agents'::TEXT, ag.nip::TEXT, 'last_activity_date'::TEXT,
+           ag.last_activity_date::TEXT, c.last_fecha::TEXT
+    FROM agents ag
+    JOIN actual_agent_counts c ON c.nip = ag.nip
+    WHERE ag.last_activity_date IS DISTINCT FROM c.last_fecha;
+
+    IF p_fix THEN
+        UPDATE activities a
+        SET participant_count = c.cnt
+        FROM actual_activity_counts c
+        WHERE c.id = a.id AND a.participant_count <> c.cnt;
+
+        UPDATE agents ag
+        SET total_participations = c.cnt,
+            last_activity_date = c.last_fecha
+        FROM actual_agent_counts c
+        WHERE c.nip = ag.nip
+          AND (ag.total_participations <> c.cnt OR ag.last_activity_date IS DISTINCT FROM c.last_fecha);
+    END IF;
+
+    DROP TABLE actual_activity_counts;
+    DROP TABLE actual_agent_counts;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public;
+
+-- Las funciones que reescriben agents no se pueden llamar desde la API (/rpc) con la
+-- clave anónima ni con la de un usuario: solo el propietario (migrate.py, pg_cron) y
+-- service_role. En Supabase los roles anon y authenticated reciben EXECUTE de cada
+-- función nueva además de PUBLIC, por eso se revocan uno a uno si existen.
+REVOKE EXECUTE ON FUNCTION reconcile_participation_counters(BOOLEAN) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION recount_agent_participations(VARCHAR[]) FROM PUBLIC;
+
+DO $$
+DECLARE
+    v_role TEXT;
+BEGIN
+    FOREACH v_role IN ARRAY ARRAY['anon', 'authenticated'] LOOP
+        IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = v_role) THEN
+            EXECUTE format('REVOKE EXECUTE ON FUNCTION reconcile_participation_counters(BOOLEAN) FROM %I', v_role);
+            EXECUTE format('REVOKE EXECUTE ON FUNCTION recount_agent_participations(VARCHAR[]) FROM %I', v_role);
+        END IF;
+    END LOOP;
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'service_role') THEN
+        GRANT EXECUTE ON FUNCTION reconcile_participation_counters(BOOLEAN) TO service_role;
+    END IF;
+END;
+$$;
+
+-- Tarea diaria, justo después de medianoche, si la base de datos tiene pg_cron
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule(
+            'reconcile_participation_counters',
+            '5 0 * * *',
+            'SELECT count(*) FROM reconcile_participation_counters()'
+        );
+    END IF;
+END;
+$$;
+
+-- Contadores recalculados con el nuevo criterio
+SELECT count(*) FROM reconcile_participation_counters();
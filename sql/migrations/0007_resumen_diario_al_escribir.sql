@@ -0,0 +1,49 @@
+-- refresh_daily_rollups() de 0005 es SECURITY DEFINER y la aplicación la llamaba por /rpc
+-- antes de cada lectura del dashboard, así que cualquier cliente con la clave anónima
+-- podía lanzar recálculos de los resúmenes cuando quisiera. Ahora el recálculo lo hace la
+-- propia escritura, al confirmar la transacción que ha apuntado días pendientes, y la
+-- función deja de poder llamarse desde la API.
+
+-- Trigger diferido: se ejecuta al confirmar, una vez por día apuntado. La primera
+-- ejecución recalcula todos los días pendientes de la transacción y las demás encuentran
+-- rollup_dirty_days vacía y no hacen nada.
+CREATE OR REPLACE FUNCTION refresh_daily_rollups_on_commit()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_daily_rollups();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public;
+
+DROP TRIGGER IF EXISTS rollup_dirty_days_refresh ON rollup_dirty_days;
+CREATE CONSTRAINT TRIGGER rollup_dirty_days_refresh
+AFTER INSERT ON rollup_dirty_days
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION refresh_daily_rollups_on_commit();
+
+-- Solo el propietario (migrate.py, pg_cron) y service_role pueden llamarla directamente.
+-- En Supabase los roles anon y authenticated reciben EXECUTE de cada función nueva
+-- además de PUBLIC, por eso se revocan uno a uno si existen.
+REVOKE EXECUTE ON FUNCTION refresh_daily_rollups() FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION refresh_daily_rollups_on_commit() FROM PUBLIC;
+
+DO $$
+DECLARE
+    v_role TEXT;
+BEGIN
+    FOREACH v_role IN ARRAY ARRAY['anon', 'authenticated'] LOOP
+        IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = v_role) THEN
+            EXECUTE format('REVOKE EXECUTE ON FUNCTION refresh_daily_rollups() FROM %I', v_role);
+            EXECUTE format('REVOKE EXECUTE ON FUNCTION refresh_daily_rollups_on_commit() FROM %I', v_role);
+        END IF;
+    END LOOP;
+    IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'service_role') THEN
+        GRANT EXECUTE ON FUNCTION refresh_daily_rollups() TO service_role;
+    END IF;
+END;
+$$;
+
+-- Días que hubieran quedado pendientes antes de esta migración
+SELECT refresh_daily_rollups();
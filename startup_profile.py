@@ -0,0 +1,165 @@
+"""
+Perfil de arranque en frío de los puntos de entrada de la aplicación.
+
+Cada punto de entrada (app.py y las páginas de pages/) se analiza por separado: se
+leen sus importaciones de nivel superior y se importan en un intérprete nuevo con
+`python -X importtime`, de modo que se mide lo que paga una sesión al cargar la
+página por primera vez en un proceso recién arrancado.
+
+    python startup_profile.py            # tabla por punto de entrada
+    python startup_profile.py --top 10   # y los módulos más lentos de cada uno
+    python startup_profile.py --check    # falla si se supera config.STARTUP_IMPORT_BUDGET
+                                         # o si se carga un módulo pesado al arrancar
+"""
+import argparse
+import ast
+import glob
+import os
+import subprocess
+import sys
+import config
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos que solo deben cargarse en el primer uso (gráficos, PDF, cliente de la base de datos...)
+HEAVY_MODULES = ["plotly", "fpdf", "supabase", "pyarrow", "openpyxl", "xlsxwriter", "psycopg"]
+
+# Streamlit se carga siempre y no depende de la aplicación: se descuenta del presupuesto
+BASELINE_MODULE = "streamlit"
+
+# Dependencias inevitables de cualquier página; lo que ellas ya cargan (p. ej. Streamlit
+# importa plotly y pandas importa pyarrow) no cuenta como módulo pesado de la aplicación
+BASELINE_IMPORTS = ["streamlit", "pandas"]
+
+def entry_points():
+    """Rutas relativas de app.py y de las páginas, en el orden en que aparecen en el menú"""
+    pages = sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+    return ["app.py"] + [os.path.relpath(page, ROOT) for page in pages]
+
+def top_level_imports(path):
+    """Módulos importados en el nivel superior del script (no dentro de funciones)"""
+    with open(os.path.join(ROOT, path), "r", encoding="utf-8") as file:
+        tree = ast.parse(file.read(), filename=path)
+
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+def _run_importtime(modules):
+    """Importa los módulos en un intérprete nuevo y devuelve las líneas de -X importtime"""
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else code)
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_part, cumulative_part, name = line.split("|", 2)
+        try:
+            self_us = int(self_part.split(":", 1)[1])
+            cumulative_us = int(cumulative_part)
+        except ValueError:
+            continue  # cabecera
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append({"module": name.strip(), "self": self_us, "cumulative": cumulative_us, "depth": depth})
+    return rows
+
+def _loaded_modules(rows):
+    return {row["module"] for row in rows}
+
+def _heavy_modules(loaded):
+    return {
+        module for module in HEAVY_MODULES
+        if any(name == module or name.startswith(module + ".") for name in loaded)
+    }
+
+def baseline_heavy_modules():
+    """Módulos pesados que ya cargan las dependencias inevitables por sí solas"""
+    return _heavy_modules(_loaded_modules(_run_importtime(BASELINE_IMPORTS)))
+
+def profile_entry_point(path, runs=3, ignore_heavy=()):
+    """
+    Mide el arranque en frío de un punto de entrada
+
+    Se toma la mejor de varias ejecuciones para reducir el ruido de la máquina.
+
+    Returns:
+        dict: total y tiempo propio de la aplicación (sin Streamlit) en segundos,
+              módulos pesados cargados (salvo ignore_heavy) y los módulos ordenados
+              por tiempo propio
+    """
+    modules = top_level_imports(path)
+    best = None
+    for _ in range(runs):
+        rows = _run_importtime(modules)
+        total = sum(row["cumulative"] for row in rows if row["depth"] == 0)
+        if best is None or total < best[0]:
+            best = (total, rows)
+
+    total, rows = best
+    baseline = sum(row["cumulative"] for row in rows if row["depth"] == 0 and row["module"] == BASELINE_MODULE)
+    heavy = sorted(_heavy_modules(_loaded_modules(rows)) - set(ignore_heavy))
+    return {
+        "entry_point": path,
+        "imports": modules,
+        "total": total / 1e6,
+        "app": (total - baseline) / 1e6,
+        "heavy": heavy,
+        "slowest": sorted(rows, key=lambda row: row["self"], reverse=True)
+    }
+
+def check(profiles, budget):
+    """Devuelve los problemas encontrados (lista vacía si todo está dentro del presupuesto)"""
+    problems = []
+    for profile in profiles:
+        if profile["app"] > budget:
+            problems.append(
+                f"{profile['entry_point']}: {profile['app']:.2f} s de importación supera el presupuesto de {budget:.2f} s"
+            )
+        if profile["heavy"]:
+            problems.append(
+                f"{profile['entry_point']}: carga al arrancar módulos que deberían importarse en el primer uso: "
+                + ", ".join(profile["heavy"])
+            )
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perfil de arranque en frío de los puntos de entrada")
+    parser.add_argument("--check", action="store_true",
+                        help="Salir con error si se supera el presupuesto o se cargan módulos pesados")
+    parser.add_argument("--top", type=int, default=0, help="Mostrar los N módulos más lentos de cada punto de entrada")
+    parser.add_argument("--runs", type=int, default=3, help="Ejecuciones por punto de entrada (se toma la mejor)")
+    args = parser.parse_args()
+
+    profiles = []
+    ignore_heavy = baseline_heavy_modules()
+    for path in entry_points():
+        try:
+            profiles.append(profile_entry_point(path, runs=args.runs, ignore_heavy=ignore_heavy))
+        except RuntimeError as e:
+            print(f"{path}: no se pudo importar ({str(e)})")
+            sys.exit(1)
+
+    print(f"{'Punto de entrada':<32} {'Total':>8} {'Aplicación':>11}  Módulos pesados")
+    for profile in profiles:
+        heavy = ", ".join(profile["heavy"]) or "-"
+        print(f"{profile['entry_point']:<32} {profile['total']:>7.2f}s {profile['app']:>10.2f}s  {heavy}")
+        for row in profile["slowest"][:args.top]:
+            print(f"    {row['self'] / 1000:>8.1f} ms  {row['module']}")
+
+    if args.check:
+        problems = check(profiles, config.STARTUP_IMPORT_BUDGET)
+        for problem in problems:
+            print(problem)
+        if problems:
+            sys.exit(1)
+        print(f"Todos los puntos de entrada están dentro del presupuesto ({config.STARTUP_IMPORT_BUDGET:.2f} s).")
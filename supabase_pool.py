@@ -0,0 +1,118 @@
+"""
+Clientes de Supabase sobre un único pool de conexiones HTTP compartido por el proceso.
+
+Cada sesión de Streamlit tiene su propio cliente (utils.get_auth_client) para que
+sign_in_with_password, set_session o sign_out no modifiquen el estado de
+autenticación de otros usuarios. Todos esos clientes, y el cliente de datos
+config.supabase, envían sus peticiones por el mismo transporte httpx: conexiones
+keep-alive con HTTP/2, tamaño acotado y timeouts, sin un handshake TLS nuevo por
+cliente ni por petición. Sobre ese transporte van los plazos, reintentos y el
+circuit breaker de resilience.py.
+"""
+import threading
+import httpx
+from gotrue import SyncMemoryStorage
+from gotrue.http_clients import SyncClient as AuthHttpClient
+from postgrest import SyncPostgrestClient
+from supabase import Client
+from supabase.lib.client_options import SyncClientOptions
+from supabase._sync.auth_client import SyncSupabaseAuthClient
+import config
+import resilience
+
+class SharedTransport(httpx.HTTPTransport):
+    """
+    Transporte que no se cierra al cerrar un cliente.
+
+    httpx cierra el transporte al cerrar (o salir del with de) cada Client; aquí eso
+    cerraría las conexiones de todas las sesiones, así que solo shutdown() lo cierra.
+    """
+
+    def close(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+    def shutdown(self):
+        super().close()
+
+_transport = None
+_transport_lock = threading.Lock()
+
+def get_shared_transport():
+    """Transporte HTTP del proceso (con la capa de resiliencia), creado en el primer uso"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = resilience.ResilientTransport(SharedTransport(
+                    http2=True,
+                    limits=httpx.Limits(
+                        max_connections=config.HTTP_POOL_MAX_CONNECTIONS,
+                        max_keepalive_connections=config.HTTP_POOL_MAX_KEEPALIVE,
+                        keepalive_expiry=config.HTTP_POOL_KEEPALIVE_EXPIRY
+                    )
+                ))
+    return _transport
+
+def get_timeout():
+    return httpx.Timeout(config.HTTP_TIMEOUT, connect=config.HTTP_CONNECT_TIMEOUT)
+
+def shutdown():
+    """Cierra las conexiones del pool (al parar el proceso); el siguiente uso abre otro"""
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.transport.shutdown()
+            _transport = None
+
+class PooledPostgrestClient(SyncPostgrestClient):
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        return httpx.Client(
+            base_url=base_url,
+            headers=headers,
+            timeout=get_timeout(),
+            follow_redirects=True,
+            transport=get_shared_transport()
+        )
+
+class PooledClient(Client):
+    """Cliente de Supabase cuyas peticiones REST y de autenticación usan el pool compartido"""
+
+    def _init_postgrest_client(self, rest_url, headers, schema, timeout=None, verify=True, proxy=None):
+        return PooledPostgrestClient(rest_url, headers=headers, schema=schema)
+
+    def _init_supabase_auth_client(self, auth_url, client_options, verify=True, proxy=None):
+        return SyncSupabaseAuthClient(
+            url=auth_url,
+            auto_refresh_token=client_options.auto_refresh_token,
+            persist_session=client_options.persist_session,
+            storage=client_options.storage,
+            headers=client_options.headers,
+            flow_type=client_options.flow_type,
+            http_client=AuthHttpClient(
+                timeout=get_timeout(),
+                follow_redirects=True,
+                transport=get_shared_transport()
+            )
+        )
+
+def create_shared_client():
+    """Cliente de datos del proceso (config.supabase), compartido por las cachés entre sesiones"""
+    return PooledClient.create(
+        config.SUPABASE_URL, config.SUPABASE_KEY,
+        options=SyncClientOptions(storage=SyncMemoryStorage())
+    )
+
+def create_session_client():
+    """
+    Cliente ligero para una sola sesión: solo guarda su estado de autenticación
+
+    No arranca el temporizador de renovación de tokens (quedaría vivo al cerrar la
+    pestaña); get_user y get_session renuevan el token caducado al usarlo.
+    """
+    return PooledClient.create(
+        config.SUPABASE_URL, config.SUPABASE_KEY,
+        options=SyncClientOptions(storage=SyncMemoryStorage(), auto_refresh_token=False)
+    )
@@ -0,0 +1,30 @@
+"""
+Presupuesto de consultas de cada página sobre fake_supabase (query_budget.py).
+
+Cada escenario se mide en un intérprete nuevo, como `python query_budget.py --check`.
+"""
+import pytest
+import fake_supabase
+import query_budget
+import utils
+
+@pytest.mark.parametrize("dataset", list(query_budget.DATASETS))
+@pytest.mark.parametrize("scenario", list(query_budget.SCENARIOS))
+def test_query_budget(scenario, dataset):
+    assert query_budget.check([query_budget.run_isolated(scenario, dataset)]) == []
+
+def test_continuation_pages(monkeypatch):
+    # Solo las páginas siguientes de iter_table_pages cuentan como paginas_siguientes
+    db = fake_supabase.FakeSupabase(fake_supabase.generate_data(agents=50, courses=5, activities=120))
+    monkeypatch.setitem(vars(utils.config), "supabase", db)
+
+    pages = list(utils.iter_table_pages("activities", page_size=50))
+    stats = db.stats()
+    assert [len(page) for page in pages] == [50, 50, 20]
+    assert stats["consultas"] == 3
+    assert stats["paginas_siguientes"] == 2
+
+    db.reset_stats()
+    db.table("activities").select("id").gt("id", 10).execute()
+    db.table("activities").select("id").gt("id", 10).order("fecha").limit(50).execute()
+    assert db.stats()["paginas_siguientes"] == 0
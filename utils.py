@@ -2,16 +2,42 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import config
+import caching
+import profiler
 import random
 import string
 import os
 import json
 import base64
+import sys
+import unicodedata
+
+# Copy-on-write: los DataFrames derivados (filtros, selecciones de columnas) no copian
+# los datos hasta que se modifican, y modificarlos nunca altera el DataFrame original.
+# Es lo que permite compartir los snapshots de get_shared_frame entre sesiones
+pd.set_option("mode.copy_on_write", True)
 
 # Constantes para la gestión de sesión Supabase
 SESSION_FILE = '.streamlit/saved_session.json'
 
 # --- Funciones para manejo de sesión con Supabase ---
+def get_auth_client():
+    """
+    Cliente de Supabase de la sesión actual para iniciar, recuperar o cerrar sesión
+
+    config.supabase lo comparten todas las sesiones; si sus métodos auth.* guardaran
+    el usuario ahí, un inicio de sesión pisaría el de los demás. Cada sesión tiene
+    su propio cliente, que usa el mismo pool de conexiones HTTP.
+    """
+    client = st.session_state.get('_supabase_auth_client')
+    if client is None:
+        import supabase_pool
+        client = supabase_pool.create_session_client()
+        st.session_state['_supabase_auth_client'] = client
+        # Si la sesión ya había iniciado sesión (tokens en session_state), se restaura
+        set_supabase_session_from_state()
+    return client
+
 def init_session_state_supabase():
     """
     Inicializa las variables de estado de sesión para Supabase
@@ -39,7 +65,7 @@ def init_session_state_supabase():
     if not st.session_state['authenticated']:
         try:
             # Intentar recuperar la sesión actual
-            user = config.supabase.auth.get_user()
+            user = get_auth_client().auth.get_user()
             if user:
                 st.session_state['authenticated'] = True
                 st.session_state['user_data'] = user.user
@@ -97,7 +123,7 @@ def set_supabase_session_from_state():
             
             if access_token and refresh_token:
                 # Intentar restablecer la sesión en el cliente de Supabase
-                config.supabase.auth.set_session(access_token, refresh_token)
+                get_auth_client().auth.set_session(access_token, refresh_token)
                 return True
             else:
                 st.warning("Tokens de sesión no encontrados o inválidos")
@@ -147,7 +173,7 @@ def sign_in_with_nip(nip, password):
         
         # 2. Usar la autenticación nativa de Supabase con email/password
         try:
-            response = config.supabase.auth.sign_in_with_password({
+            response = get_auth_client().auth.sign_in_with_password({
                 "email": email,
                 "password": password
             })
@@ -201,7 +227,7 @@ def clear_supabase_session():
     """
     # Limpiar cliente de Supabase
     try:
-        config.supabase.auth.sign_out()
+        get_auth_client().auth.sign_out()
     except:
         pass
     
@@ -241,7 +267,7 @@ def check_supabase_auth():
     if st.session_state.get('authenticated'):
         try:
             # Usar la API nativa de Supabase para verificar si sigue autenticado
-            user = config.supabase.auth.get_user()
+            user = get_auth_client().auth.get_user()
             if user:
                 # La sesión sigue siendo válida
                 # Verificar que tengamos el NIP
@@ -270,7 +296,7 @@ def check_supabase_auth():
     # Si no hay sesión en session_state, Supabase intentará automáticamente 
     # restaurar desde localStorage. Probemos directamente:
     try:
-        user = config.supabase.auth.get_user()
+        user = get_auth_client().auth.get_user()
         if user:
             # Hay una sesión activa que se restauró automáticamente
             st.session_state['authenticated'] = True
@@ -677,7 +703,7 @@ def check_authentication():
     if not st.session_state.get("authenticated") or not st.session_state.get("user_nip"):
         try:
             # Utilizar la API nativa de Supabase para verificar la autenticación
-            user = config.supabase.auth.get_user()
+            user = get_auth_client().auth.get_user()
             if user:
                 # Sesión válida encontrada, actualizar session_state
                 st.session_state["authenticated"] = True
@@ -732,6 +758,9 @@ def format_date(date_str):
             return date_obj.strftime("%d/%m/%Y")
         except ValueError:
             return date_str
+    # Fechas ya tipadas (date, datetime o Timestamp de los DataFrames de referencia)
+    if hasattr(date_str, "strftime") and pd.notna(date_str):
+        return date_str.strftime("%d/%m/%Y")
     return date_str
 
 def format_bool(value):
@@ -742,6 +771,31 @@ def format_bool(value):
         return "No"
     return value
 
+def select_tab(labels, key):
+    """
+    Selector de pestañas que solo ejecuta la pestaña activa
+
+    st.tabs ejecuta el contenido de todas las pestañas en cada ejecución; este selector
+    devuelve la etiqueta elegida para que la página renderice únicamente esa pestaña.
+    """
+    pending = st.session_state.pop(f"{key}_pending", None)
+    if pending in labels:
+        st.session_state[key] = pending
+    return st.radio("Sección", labels, key=key, horizontal=True, label_visibility="collapsed")
+
+def request_tab(key, label):
+    """Cambia la pestaña activa de select_tab en la próxima ejecución"""
+    st.session_state[f"{key}_pending"] = label
+
+def format_bytes(num_bytes):
+    """Format a size in bytes as KB/MB/GB"""
+    size = float(num_bytes or 0)
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
 def setup_sidebar():
     """
     Configura la barra lateral para todas las páginas.
@@ -789,12 +843,117 @@ def setup_sidebar():
         if st.button("Cerrar Sesión", key="logout_sidebar_btn", on_click=logout, use_container_width=True):
             pass
 
-@st.cache_data(ttl=300)  # Cache de 5 minutos (300 segundos)
+        # Aviso único mientras Supabase no responde, en lugar de un error por consulta
+        # (resilience solo está cargado si ya se ha hecho alguna llamada)
+        resilience = sys.modules.get("resilience")
+        if resilience is not None and resilience.is_degraded():
+            st.warning("Sin conexión estable con la base de datos: se muestran los últimos datos disponibles.")
+
+        # Tiempo de la ejecución anterior con el perfil activado (profiler.py); el detalle está en Sistema
+        if profiler.is_enabled():
+            profiled_runs = profiler.history()
+            if profiled_runs:
+                st.caption(f"⏱️ {profiler.describe(profiled_runs[-1])}")
+
+# Tipos de las columnas de los DataFrames de referencia. Las columnas con pocos valores
+# distintos se guardan como categorías sembradas con los valores de config, de modo que
+# cada texto se guarda una sola vez en lugar de una vez por fila
+FRAME_SCHEMAS = {
+    "agents": {
+        "categories": {"seccion": config.SECTIONS, "grupo": config.GROUPS},
+        "booleans": {"activo": True, "monitor": False},
+        "dates": ["last_activity_date"]
+    },
+    "activities": {
+        "categories": {"turno": config.SHIFTS, "curso_nombre": [], "monitor_nombre": []},
+        "booleans": {},
+        "dates": ["fecha"]
+    }
+}
+
+# Memoria de cada DataFrame antes y después de aplicar los tipos (último cargado por nombre)
+_frame_memory = {}
+
+def build_typed_frame(rows, frame_name, label=None):
+    """
+    Construye un DataFrame a partir de las filas devueltas por Supabase aplicando los tipos
+    de FRAME_SCHEMAS: categorías, booleanos sin nulos y fechas reales
+
+    En los DataFrames de agentes añade además la columna 'nombre_completo'.
+
+    Args:
+        rows: lista de diccionarios (response.data)
+        frame_name: clave de FRAME_SCHEMAS
+        label: nombre con el que aparece en el informe de memoria (por defecto frame_name)
+
+    Returns:
+        DataFrame: vacío si no hay filas
+    """
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+
+    schema = FRAME_SCHEMAS[frame_name]
+    memory_before = int(df.memory_usage(deep=True).sum())
+
+    for col, known_values in schema["categories"].items():
+        if col in df.columns:
+            # Los valores que no están en config se añaden como categorías para no perderlos
+            extra_values = sorted(set(df[col].dropna()) - set(known_values))
+            df[col] = pd.Categorical(df[col], categories=list(known_values) + extra_values)
+
+    for col, default in schema["booleans"].items():
+        if col in df.columns:
+            df[col] = df[col].fillna(default).astype(bool)
+
+    for col in schema["dates"]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+
+    if frame_name == "agents" and "nombre" in df.columns:
+        df["nombre_completo"] = (
+            df["nombre"].fillna("") + " " +
+            df["apellido1"].fillna("") + " " +
+            df["apellido2"].fillna("")
+        ).str.replace(r"\s+", " ", regex=True).str.strip()
+
+    _frame_memory[label or frame_name] = {
+        "filas": len(df),
+        "antes": memory_before,
+        "despues": int(df.memory_usage(deep=True).sum())
+    }
+    return df
+
+def get_frame_memory_report():
+    """
+    Memoria de los últimos DataFrames tipados de cada clase
+
+    Returns:
+        DataFrame: columnas frame, filas, antes, despues y ahorro (bytes)
+    """
+    report = pd.DataFrame(
+        [{"frame": name, **values} for name, values in _frame_memory.items()],
+        columns=["frame", "filas", "antes", "despues"]
+    )
+    report["ahorro"] = report["antes"] - report["despues"]
+    return report
+
+def _report_load_error(message):
+    """
+    Muestra el error de una carga cacheada; dentro de un refresco en segundo plano lo
+    lanza para que la caché siga sirviendo el valor anterior en lugar de uno vacío
+    """
+    if caching.in_background_refresh():
+        raise caching.RefreshFailed(message)
+    st.error(message)
+
+@caching.swr_cache(ttl=300, on_refresh=lambda: _bump_shared_frame("agents"))
 def get_all_agents(active_only=False):
     """
     Get all agents from database
     
-    Esta función está cacheada durante 5 minutos para reducir consultas a la base de datos
+    Esta función está cacheada durante 5 minutos para reducir consultas a la base de datos.
+    Pasado ese tiempo se sirve el valor anterior mientras se refresca en segundo plano.
     """
     try:
         query = config.supabase.table(config.AGENTS_TABLE).select("*")
@@ -803,14 +962,49 @@ def get_all_agents(active_only=False):
         
         response = query.execute()
         
-        if response.data:
-            return pd.DataFrame(response.data)
-        return pd.DataFrame()
+        return build_typed_frame(response.data, "agents")
     except Exception as e:
-        st.error(f"Error al obtener los agentes: {str(e)}")
+        _report_load_error(f"Error al obtener los agentes: {str(e)}")
         return pd.DataFrame()
 
-@st.cache_data(ttl=300)  # Cache de 5 minutos
+@caching.counted(st.cache_data, ttl=60)  # Cache de 1 minuto
+def search_agents(search_query=None, secciones=None, grupos=None, active_only=False,
+                  monitors_only=False, sort_by="nip", descending=False, page=1,
+                  page_size=config.AGENTS_PAGE_SIZE):
+    """
+    Busca agentes en el servidor mediante la función RPC search_agents
+
+    El filtrado, la ordenación y la paginación se hacen en Postgres, de modo que
+    solo se descarga la página solicitada.
+
+    Retorna:
+    - Tupla (DataFrame con la página de agentes, número total de coincidencias)
+    """
+    params = {
+        "p_query": search_query or None,
+        "p_sections": secciones or None,
+        "p_groups": grupos or None,
+        "p_active_only": active_only,
+        "p_monitors_only": monitors_only,
+        "p_sort": sort_by,
+        "p_desc": descending,
+        "p_limit": page_size,
+        "p_offset": max(page - 1, 0) * page_size
+    }
+
+    try:
+        response = config.supabase.rpc("search_agents", params).execute()
+
+        if response.data:
+            page_df = build_typed_frame(response.data, "agents", label="agents_page")
+            total = int(page_df['total_count'].iloc[0])
+            return page_df.drop(columns=['total_count']), total
+        return pd.DataFrame(), 0
+    except Exception as e:
+        st.error(f"Error al buscar agentes: {str(e)}")
+        return pd.DataFrame(), 0
+
+@caching.swr_cache(ttl=300)  # Cache de 5 minutos, refrescada en segundo plano
 def get_all_monitors():
     """
     Get all agents that can be assigned as monitors for activities
@@ -824,16 +1018,15 @@ def get_all_monitors():
         
         if response.data:
             # Devolvemos solo monitores activos
-            agents_df = pd.DataFrame(response.data)
-            for i, agent in agents_df.iterrows():
-                agents_df.at[i, 'nombre'] = f"{agent['nombre']} (Monitor)"
-            return agents_df
+            for agent in response.data:
+                agent['nombre'] = f"{agent['nombre']} (Monitor)"
+            return build_typed_frame(response.data, "agents", label="monitors")
         return pd.DataFrame()
     except Exception as e:
-        st.error(f"Error al obtener los monitores: {str(e)}")
+        _report_load_error(f"Error al obtener los monitores: {str(e)}")
         return pd.DataFrame()
 
-@st.cache_data(ttl=300)  # Cache de 5 minutos
+@caching.swr_cache(ttl=300)  # Cache de 5 minutos, refrescada en segundo plano
 def get_all_courses(include_hidden=False):
     """
     Get all courses from database
@@ -851,10 +1044,10 @@ def get_all_courses(include_hidden=False):
             return pd.DataFrame(response.data)
         return pd.DataFrame()
     except Exception as e:
-        st.error(f"Error al obtener los cursos: {str(e)}")
+        _report_load_error(f"Error al obtener los cursos: {str(e)}")
         return pd.DataFrame()
 
-@st.cache_data(ttl=300)  # Cache de 5 minutos
+@caching.swr_cache(ttl=300)  # Cache de 5 minutos, refrescada en segundo plano
 def get_all_activities():
     """
     Get all activities from database
@@ -864,14 +1057,47 @@ def get_all_activities():
     try:
         response = config.supabase.table(config.ACTIVITIES_TABLE).select("*").execute()
         
-        if response.data:
-            return pd.DataFrame(response.data)
-        return pd.DataFrame()
+        return build_typed_frame(response.data, "activities")
     except Exception as e:
-        st.error(f"Error al obtener las actividades: {str(e)}")
+        _report_load_error(f"Error al obtener las actividades: {str(e)}")
         return pd.DataFrame()
 
-@st.cache_data(ttl=300)  # Cache de 5 minutos
+def iter_table_pages(table, columns="*", key="id", page_size=1000, filters=None):
+    """
+    Recorre una tabla completa por páginas usando paginación por clave (keyset)
+
+    Cada página se pide con "key > último valor leído" ordenado por la clave, de modo
+    que el coste por página es constante aunque la tabla sea muy grande.
+
+    Args:
+        table: nombre de la tabla
+        columns: columnas a seleccionar (deben incluir la clave)
+        key: columna única y ordenable por la que se pagina
+        page_size: filas por petición
+        filters: lista de tuplas (operador, columna, valor), p. ej. [("gte", "fecha", "2025-01-01")]
+
+    Yields:
+        list: filas (diccionarios) de cada página
+    """
+    last_key = None
+    while True:
+        query = config.supabase.table(table).select(columns)
+        for operator, column, value in filters or []:
+            query = getattr(query, operator)(column, value)
+        if last_key is not None:
+            query = query.gt(key, last_key)
+
+        rows = query.order(key).limit(page_size).execute().data or []
+        if not rows:
+            return
+
+        yield rows
+
+        if len(rows) < page_size:
+            return
+        last_key = rows[-1][key]
+
+@caching.counted(st.cache_data, ttl=300)  # Cache de 5 minutos
 def get_activity_participants(activity_id):
     """
     Get participants for a specific activity
@@ -906,7 +1132,7 @@ def get_activity_participants(activity_id):
         st.error(f"Error al obtener los participantes: {str(e)}")
         return []
 
-@st.cache_data(ttl=300)  # Cache de 5 minutos
+@caching.counted(st.cache_data, ttl=300)  # Cache de 5 minutos
 def get_activity_details(activity_id):
     """
     Obtiene los detalles completos de una actividad específica
@@ -927,7 +1153,200 @@ def get_activity_details(activity_id):
         st.error(f"Error al obtener los detalles de la actividad: {str(e)}")
         return None
 
-@st.cache_data(ttl=600)  # Cache de 10 minutos
+@caching.swr_cache(ttl=300, on_refresh=lambda: _bump_shared_frame("activities"))
+def get_activities_enriched(start_date=None, end_date=None):
+    """
+    Obtiene las actividades con el nombre del curso, el nombre del monitor y los
+    participantes ya resueltos (vista activities_enriched), en una sola consulta
+
+    Args:
+        start_date: fecha mínima (inclusive), opcional
+        end_date: fecha máxima (inclusive), opcional
+
+    Returns:
+        DataFrame: una fila por actividad, ordenadas por fecha
+    """
+    try:
+        query = config.supabase.table(config.ACTIVITIES_ENRICHED_VIEW).select("*")
+        if start_date:
+            query = query.gte("fecha", str(start_date))
+        if end_date:
+            query = query.lte("fecha", str(end_date))
+        response = query.order("fecha").execute()
+
+        return build_typed_frame(response.data, "activities", label="activities_enriched")
+    except Exception as e:
+        _report_load_error(f"Error al obtener las actividades: {str(e)}")
+        return pd.DataFrame()
+
+@caching.counted(st.cache_data, ttl=300)  # Cache de 5 minutos
+def get_activity_enriched(activity_id):
+    """
+    Obtiene una actividad de la vista activities_enriched
+
+    Args:
+        activity_id: ID de la actividad
+
+    Returns:
+        dict: Datos de la actividad con curso, monitor y participantes, o None si no existe
+    """
+    try:
+        response = config.supabase.table(config.ACTIVITIES_ENRICHED_VIEW).select("*").eq("id", activity_id).execute()
+
+        if response.data:
+            return response.data[0]
+        return None
+    except Exception as e:
+        st.error(f"Error al obtener los detalles de la actividad: {str(e)}")
+        return None
+
+# Versión vigente de cada snapshot compartido; invalidar sus cachés la incrementa
+_shared_frame_versions = {"agents": 0, "activities": 0}
+
+@caching.counted(st.cache_resource, ttl=300, max_entries=4, show_spinner=False)
+def _load_shared_frame(name, version):
+    loaders = {"agents": get_all_agents, "activities": get_activities_enriched}
+    return loaders[name]()
+
+def get_shared_frame(name):
+    """
+    Devuelve el snapshot compartido de una tabla de referencia ("agents" o "activities")
+
+    Todas las sesiones reciben el mismo objeto, por lo que la memoria no crece con el
+    número de pestañas abiertas. No se debe modificar: las páginas trabajan sobre
+    filtros o copias (con copy-on-write solo se copia lo que se modifica) y no lo
+    guardan en st.session_state, para no retener versiones antiguas.
+    """
+    return _load_shared_frame(name, _shared_frame_versions[name])
+
+def get_shared_frame_version(name):
+    """Versión vigente del snapshot compartido"""
+    return _shared_frame_versions[name]
+
+def normalize_search_text(text):
+    """Texto en minúsculas y sin tildes, para búsquedas que no distinguen acentos"""
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+@caching.counted(st.cache_resource, ttl=300, max_entries=2, show_spinner=False)
+def _load_agent_search_index(version):
+    agents_df = get_shared_frame("agents")
+    if agents_df.empty:
+        return pd.DataFrame(columns=["nip", "label", "seccion", "grupo", "activo", "search_text"]), {}
+    index = pd.DataFrame({
+        "nip": agents_df["nip"].astype(str),
+        "label": agents_df["nip"].astype(str) + " - " + agents_df["nombre_completo"],
+        "seccion": agents_df["seccion"],
+        "grupo": agents_df["grupo"],
+        "activo": agents_df["activo"]
+    }).sort_values("label").reset_index(drop=True)
+    index["search_text"] = index["label"].map(normalize_search_text)
+    return index, dict(zip(index["nip"], index["label"]))
+
+def get_agent_search_index():
+    """
+    Índice de búsqueda de agentes, compartido entre sesiones y reconstruido solo cuando
+    cambia la versión del snapshot de agentes
+
+    Returns:
+        tuple: (DataFrame con nip, label, seccion, grupo, activo y search_text normalizado,
+                dict nip -> etiqueta "NIP - Nombre completo")
+    """
+    return _load_agent_search_index(_shared_frame_versions["agents"])
+
+def _bump_shared_frame(name):
+    _shared_frame_versions[name] += 1
+
+def estimate_object_size(value):
+    """Tamaño aproximado en bytes de un valor guardado en la sesión"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        size = value.memory_usage(deep=True)
+        return int(size.sum()) if isinstance(value, pd.DataFrame) else int(size)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_object_size(k) + estimate_object_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_object_size(v) for v in value)
+    return sys.getsizeof(value)
+
+def get_session_memory_report(state=None):
+    """
+    Memoria ocupada por cada clave de st.session_state (por defecto, la sesión actual)
+
+    Returns:
+        DataFrame: columnas clave, tipo y bytes, ordenadas de mayor a menor
+    """
+    state = st.session_state if state is None else state
+    rows = []
+    for key in list(state.keys()):
+        try:
+            value = state[key]
+        except KeyError:
+            continue
+        rows.append({"clave": str(key), "tipo": type(value).__name__, "bytes": estimate_object_size(value)})
+    return pd.DataFrame(rows, columns=["clave", "tipo", "bytes"]).sort_values("bytes", ascending=False)
+
+def get_all_sessions_memory_report():
+    """
+    Memoria de session_state de todas las sesiones abiertas en este proceso
+
+    Usa la API interna del runtime de Streamlit; si no está disponible devuelve
+    un DataFrame vacío.
+
+    Returns:
+        DataFrame: columnas sesion, claves y bytes
+    """
+    rows = []
+    try:
+        from streamlit import runtime
+        for session_info in runtime.get_instance()._session_mgr.list_sessions():
+            session = session_info.session
+            # SessionState interno del runtime: filtered_state son las claves visibles en st.session_state
+            report = get_session_memory_report(session.session_state.filtered_state)
+            rows.append({"sesion": session.id[:8], "claves": len(report), "bytes": int(report["bytes"].sum())})
+    except Exception as e:
+        print(f"No se pudo obtener la memoria de las sesiones: {str(e)}")
+    return pd.DataFrame(rows, columns=["sesion", "claves", "bytes"])
+
+def get_shared_frames_report():
+    """
+    Versión, filas y memoria de los snapshots compartidos
+
+    Returns:
+        DataFrame: columnas frame, version, filas y bytes
+    """
+    rows = []
+    for name in _shared_frame_versions:
+        df = get_shared_frame(name)
+        rows.append({
+            "frame": name,
+            "version": get_shared_frame_version(name),
+            "filas": len(df),
+            "bytes": int(df.memory_usage(deep=True).sum()) if not df.empty else 0
+        })
+    return pd.DataFrame(rows, columns=["frame", "version", "filas", "bytes"])
+
+def _mark_analytics_snapshot_stale():
+    """Avisa a todos los procesos de que el snapshot analítico debe regenerarse"""
+    import analytics_snapshot
+    analytics_snapshot.mark_stale()
+
+def invalidate_activity_caches():
+    """Limpia las cachés de actividades tras crear, modificar o eliminar una actividad"""
+    # Los contadores de participación de los agentes cambian con los participantes
+    get_all_agents.clear()
+    get_all_activities.clear()
+    get_activities_enriched.clear()
+    get_activity_enriched.clear()
+    get_activity_details.clear()
+    get_activity_participants.clear()
+    get_daily_rollups.clear()
+    get_participation_by_agent.clear()
+    get_agents_activity_stats.clear()
+    _bump_shared_frame("agents")
+    _bump_shared_frame("activities")
+    _mark_analytics_snapshot_stale()
+
+@caching.counted(st.cache_data, ttl=600)  # Cache de 10 minutos
 def get_agent_name(nip):
     """
     Get agent's full name by NIP
@@ -949,7 +1368,7 @@ def get_agent_name(nip):
         st.error(f"Error al obtener el nombre del agente: {str(e)}")
         return "Error"
         
-@st.cache_data(ttl=600)  # Cache de 10 minutos
+@caching.counted(st.cache_data, ttl=600)  # Cache de 10 minutos
 def get_course_name(course_id):
     """
     Get course name by ID
@@ -997,6 +1416,225 @@ def validate_agent(nip, nombre, apellido1, email, telefono):
     
     return errors
 
+# --- Importación masiva de agentes ---
+AGENT_IMPORT_COLUMNS = ['nip', 'nombre', 'apellido1', 'apellido2', 'email', 'telefono',
+                        'seccion', 'grupo', 'activo', 'monitor']
+
+# Nombres de columna alternativos aceptados en los archivos de importación
+AGENT_IMPORT_ALIASES = {
+    'sección': 'seccion',
+    'teléfono': 'telefono',
+    'primer apellido': 'apellido1',
+    'segundo apellido': 'apellido2'
+}
+
+BOOL_VALUES = {
+    'sí': True, 'si': True, 'true': True, '1': True, 'x': True,
+    'no': False, 'false': False, '0': False
+}
+
+def read_agents_file(uploaded_file):
+    """
+    Lee un archivo CSV o XLSX con agentes y normaliza los nombres de columna
+
+    Todas las celdas se leen como texto para no perder ceros a la izquierda en NIPs y teléfonos.
+    """
+    if uploaded_file.name.lower().endswith('.xlsx'):
+        agents_df = pd.read_excel(uploaded_file, dtype=str)
+    else:
+        agents_df = pd.read_csv(uploaded_file, dtype=str, keep_default_na=False, sep=None, engine='python')
+
+    agents_df.columns = [AGENT_IMPORT_ALIASES.get(str(col).strip().lower(), str(col).strip().lower())
+                         for col in agents_df.columns]
+    return agents_df.reset_index(drop=True)
+
+def validate_agents_frame(agents_df):
+    """
+    Valida un DataFrame de agentes completo aplicando las reglas de validate_agent
+    de forma vectorizada, además de la pertenencia a config.SECTIONS y config.GROUPS
+
+    Retorna:
+    - Tupla (DataFrame con las filas válidas y normalizadas, solo con las columnas del archivo,
+             DataFrame de errores con columnas 'Fila', 'NIP' y 'Error')
+
+    El número de fila corresponde a la línea del archivo (la cabecera es la fila 1).
+    """
+    file_columns = [col for col in AGENT_IMPORT_COLUMNS if col in agents_df.columns]
+    df = agents_df.reindex(columns=AGENT_IMPORT_COLUMNS)
+
+    # Normalizar columnas de texto: espacios y celdas vacías a nulo
+    text_columns = [col for col in AGENT_IMPORT_COLUMNS if col not in ('activo', 'monitor')]
+    for col in text_columns:
+        df[col] = df[col].astype("string").str.strip().replace("", pd.NA)
+
+    checks = [
+        (df['nip'].isna(), "El NIP es obligatorio"),
+        (df['nip'].notna() & ~df['nip'].str.fullmatch(r"\d+").fillna(False), "El NIP debe ser un número"),
+        (df['nip'].notna() & df['nip'].duplicated(keep=False), "El NIP está repetido en el archivo"),
+        (df['nombre'].isna(), "El nombre es obligatorio"),
+        (df['apellido1'].isna(), "El primer apellido es obligatorio"),
+        (df['email'].notna() & ~df['email'].str.contains('@', regex=False).fillna(False), "El email no es válido"),
+        (df['telefono'].notna() & ~df['telefono'].str.fullmatch(r"\d+").fillna(False),
+         "El teléfono debe contener solo números"),
+        (df['seccion'].notna() & ~df['seccion'].isin(config.SECTIONS), "La sección no es válida"),
+        (df['grupo'].notna() & ~df['grupo'].isin(config.GROUPS), "El grupo no es válido")
+    ]
+
+    # Columnas booleanas: las vacías quedan a nulo y upsert_agents no las envía, así que
+    # un alta toma el valor por defecto de la tabla y una actualización conserva el actual
+    for col in ('activo', 'monitor'):
+        raw = df[col].astype("string").str.strip().str.lower().replace("", pd.NA)
+        parsed = raw.map(BOOL_VALUES, na_action='ignore')
+        checks.append((raw.notna() & parsed.isna(), f"El valor de '{col}' no es válido (usa Sí o No)"))
+        df[col] = parsed.astype("boolean")
+
+    errors_df = pd.concat(
+        [pd.DataFrame({'Fila': df.index[mask] + 2, 'NIP': df.loc[mask, 'nip'], 'Error': message})
+         for mask, message in checks if mask.any()] or [pd.DataFrame(columns=['Fila', 'NIP', 'Error'])],
+        ignore_index=True
+    ).sort_values('Fila', kind='stable')
+
+    invalid_rows = errors_df['Fila'].unique() - 2
+    valid_df = df.loc[~df.index.isin(invalid_rows), file_columns]
+    return valid_df, errors_df
+
+def invalidate_agent_caches(changed_columns=None):
+    """
+    Vacía las cachés que dependen de la tabla de agentes
+
+    Si se indican las columnas modificadas, solo se vacían las cachés cuyos
+    resultados dependen de ellas; sin columnas se vacían todas.
+    """
+    changed = set(changed_columns) if changed_columns is not None else set(AGENT_IMPORT_COLUMNS)
+    name_columns = {'nip', 'nombre', 'apellido1', 'apellido2'}
+
+    get_all_agents.clear()
+    search_agents.clear()
+    _bump_shared_frame("agents")
+    if changed & (name_columns | {'activo', 'monitor'}):
+        get_all_monitors.clear()
+    if changed & name_columns:
+        get_agent_name.clear()
+        # La vista de actividades incluye los nombres del monitor y de los participantes
+        get_activities_enriched.clear()
+        _bump_shared_frame("activities")
+    if changed & (name_columns | {'seccion'}):
+        get_agents_activity_stats.clear()
+        _mark_analytics_snapshot_stale()
+    if changed & {'seccion', 'grupo'}:
+        get_daily_rollups.clear()
+        get_participation_by_agent.clear()
+
+def upsert_agents(agents_df, update_existing=True, chunk_size=500, changed_columns=None, keep_nulls=False):
+    """
+    Inserta o actualiza agentes en lotes
+
+    Solo se envían las columnas de AGENT_IMPORT_COLUMNS presentes en agents_df y, salvo
+    con keep_nulls, se omiten las celdas nulas: al actualizar, una columna que no está en
+    el archivo o una celda vacía no borra el dato guardado, y al dar de alta la tabla
+    aplica sus valores por defecto.
+
+    Args:
+        agents_df: DataFrame con columnas de AGENT_IMPORT_COLUMNS ya validadas (al menos 'nip')
+        update_existing: si es False, los NIPs que ya existen se dejan sin cambios
+        chunk_size: número de filas por petición
+        changed_columns: columnas realmente modificadas, para invalidar solo las cachés afectadas
+        keep_nulls: enviar los nulos como null, para filas completas en las que el nulo es el valor real
+
+    Returns:
+        tuple: (número de filas enviadas correctamente, lista de mensajes de error por lote)
+    """
+    columns = [col for col in AGENT_IMPORT_COLUMNS if col in agents_df.columns]
+    frame = agents_df[columns]
+    # Convertir nulos de pandas a None para que se serialicen como null
+    records = frame.astype(object).where(frame.notna(), None).to_dict('records')
+    if not keep_nulls:
+        records = [{col: value for col, value in record.items() if value is not None} for record in records]
+
+    # Un upsert por lotes usa las mismas columnas para todas las filas (las que faltan se
+    # envían como null), así que las filas se agrupan por el conjunto de columnas con valor
+    batches = {}
+    for record in records:
+        batches.setdefault(tuple(record), []).append(record)
+
+    saved = 0
+    errors = []
+    for batch in batches.values():
+        for start in range(0, len(batch), chunk_size):
+            chunk = batch[start:start + chunk_size]
+            try:
+                config.supabase.table(config.AGENTS_TABLE).upsert(
+                    chunk,
+                    on_conflict="nip",
+                    ignore_duplicates=not update_existing
+                ).execute()
+                saved += len(chunk)
+            except Exception as e:
+                errors.append(f"Lote de {len(chunk)} agentes (NIP {chunk[0]['nip']} a {chunk[-1]['nip']}): {str(e)}")
+
+    # Una única invalidación de caché al terminar
+    if saved:
+        invalidate_agent_caches(changed_columns if changed_columns is not None else columns)
+
+    return saved, errors
+
+# --- Edición de agentes en tabla ---
+AGENT_GRID_COLUMNS = ['seccion', 'grupo', 'activo', 'monitor']
+
+def diff_agent_frames(original_df, edited_df, columns=AGENT_GRID_COLUMNS):
+    """
+    Compara la plantilla original con la editada en la tabla y devuelve los cambios
+
+    Ambos DataFrames deben tener la columna 'nip' y las columnas editables.
+
+    Retorna:
+    - Tupla (DataFrame con las filas modificadas: 'nip' y los valores nuevos de las columnas editables,
+             lista de columnas que tienen algún cambio)
+    """
+    original = original_df.set_index('nip')[columns]
+    edited = edited_df.set_index('nip')[columns].reindex(original.index)
+
+    # Dos nulos se consideran iguales
+    changed_cells = ~((original == edited) | (original.isna() & edited.isna()))
+    changed_rows = changed_cells.any(axis=1)
+
+    changes_df = edited[changed_rows].reset_index()
+    changed_columns = [col for col in columns if changed_cells[col].any()]
+    return changes_df, changed_columns
+
+def validate_agent_changes(changes_df):
+    """Valida los valores nuevos de las columnas editables en la tabla"""
+    errors = []
+
+    invalid_sections = changes_df['seccion'].notna() & ~changes_df['seccion'].isin(config.SECTIONS)
+    for nip in changes_df.loc[invalid_sections, 'nip']:
+        errors.append(f"La sección del agente {nip} no es válida")
+
+    invalid_groups = changes_df['grupo'].notna() & ~changes_df['grupo'].isin(config.GROUPS)
+    for nip in changes_df.loc[invalid_groups, 'nip']:
+        errors.append(f"El grupo del agente {nip} no es válido")
+
+    for col in ('activo', 'monitor'):
+        for nip in changes_df.loc[changes_df[col].isna(), 'nip']:
+            errors.append(f"El campo '{col}' del agente {nip} no puede quedar vacío")
+
+    return errors
+
+def apply_agent_changes(agents_df, changes_df, changed_columns):
+    """
+    Aplica los cambios de la tabla editable en un único upsert por lotes
+
+    Se envían las filas completas de los agentes modificados para que el upsert
+    no deje a nulo las columnas que no se han tocado.
+
+    Returns:
+        tuple: (número de agentes actualizados, lista de mensajes de error)
+    """
+    full_rows = agents_df.set_index('nip').loc[changes_df['nip']].reset_index()
+    full_rows = full_rows.reindex(columns=AGENT_IMPORT_COLUMNS)
+    full_rows[AGENT_GRID_COLUMNS] = changes_df[AGENT_GRID_COLUMNS].to_numpy()
+    return upsert_agents(full_rows, update_existing=True, changed_columns=changed_columns, keep_nulls=True)
+
 def validate_course(nombre, descripcion):
     """Validate course data"""
     errors = []
@@ -1094,7 +1732,7 @@ def reset_password(nip, email):
         # 3. Usar la API nativa de Supabase para recuperación de contraseña
         try:
             # Esta función enviará un correo con instrucciones para restablecer la contraseña
-            config.supabase.auth.reset_password_for_email(email)
+            get_auth_client().auth.reset_password_for_email(email)
             
             # En el entorno de desarrollo, es posible que no se envíe un correo real
             # Para fines de prueba, generamos una contraseña temporal como fallback
@@ -1135,7 +1773,7 @@ def reset_password(nip, email):
         return False, "Error en el proceso de recuperación de contraseña"
         
 # --- Función para obtener estadísticas dinámicas ---
-@st.cache_data(ttl=300)  # Cache de 5 minutos
+@caching.counted(st.cache_data, ttl=300)  # Cache de 5 minutos
 def get_agents_activity_stats(start_date=None, end_date=None, curso_id=None, secciones=None, agentes=None):
     """
     Obtiene estadísticas de actividad de agentes con filtros dinámicos
@@ -1153,12 +1791,16 @@ def get_agents_activity_stats(start_date=None, end_date=None, curso_id=None, sec
     Retorna:
     - DataFrame con las estadísticas
     """
+    import analytics_snapshot
+
+    empty_df = pd.DataFrame(columns=['nip', 'nombre', 'apellidos', 'seccion', 'total_actividades'])
     try:
-        # Para desarrollo, vamos a usar pandas para combinar los datos
-        # En producción, se recomendaría usar SQL directo para mejor rendimiento
-        
-        # Obtener todos los agentes
-        agents_df = get_all_agents()
+        # Los datos salen del snapshot analítico compartido (Arrow mapeado en memoria),
+        # sin volver a descargar las tablas en cada proceso
+        agents_df = analytics_snapshot.get_tables()["agents"].select(
+            ['nip', 'nombre', 'apellido1', 'apellido2', 'seccion']
+        ).to_pandas()
+        agents_df['seccion'] = agents_df['seccion'].astype(object)
         
         # Filtrar por sección si es necesario
         if secciones and len(secciones) > 0:
@@ -1170,82 +1812,17 @@ def get_agents_activity_stats(start_date=None, end_date=None, curso_id=None, sec
         
         # Si no hay agentes que cumplan los criterios, devolver DataFrame vacío
         if agents_df.empty:
-            return pd.DataFrame(columns=['nip', 'nombre', 'apellidos', 'seccion', 'total_actividades'])
-        
-        # Obtener todas las actividades en el rango de fechas
-        activities_query = config.supabase.table(config.ACTIVITIES_TABLE).select("id, fecha, curso_id")
-        
-        # Aplicar filtro de fechas
-        if start_date:
-            activities_query = activities_query.gte("fecha", start_date.strftime("%Y-%m-%d"))
-        
-        if end_date:
-            activities_query = activities_query.lte("fecha", end_date.strftime("%Y-%m-%d"))
+            return empty_df
         
-        # Aplicar filtro de curso
-        if curso_id:
-            activities_query = activities_query.eq("curso_id", curso_id)
+        # Contar actividades distintas por agente en el rango de fechas y curso
+        agent_activities = analytics_snapshot.activity_counts_by_agent(start_date, end_date, curso_id)
         
-        # Ejecutar la consulta
-        activities_response = activities_query.execute()
-        
-        # Si no hay actividades que cumplan los criterios, crear resultados con contador 0
-        if not activities_response.data:
-            result_df = agents_df.copy()
-            # Crear apellidos concatenados
-            result_df['apellidos'] = result_df.apply(
-                lambda row: f"{row['apellido1']} {row['apellido2'] if pd.notna(row['apellido2']) else ''}", 
-                axis=1
-            )
-            # Añadir contador de actividades en 0
-            result_df['total_actividades'] = 0
-            # Seleccionar y ordenar columnas
-            result_df = result_df[['nip', 'nombre', 'apellidos', 'seccion', 'total_actividades']]
-            return result_df.sort_values('total_actividades', ascending=False)
-        
-        # Convertir actividades a DataFrame
-        activities_df = pd.DataFrame(activities_response.data)
-        
-        # Obtener participantes
-        participants_response = config.supabase.table(config.PARTICIPANTS_TABLE).select("agent_nip, activity_id").execute()
-        
-        if not participants_response.data:
-            # No hay participaciones, devolver agentes con contador 0
-            result_df = agents_df.copy()
-            result_df['apellidos'] = result_df.apply(
-                lambda row: f"{row['apellido1']} {row['apellido2'] if pd.notna(row['apellido2']) else ''}", 
-                axis=1
-            )
-            result_df['total_actividades'] = 0
-            result_df = result_df[['nip', 'nombre', 'apellidos', 'seccion', 'total_actividades']]
-            return result_df.sort_values('total_actividades', ascending=False)
-        
-        # Convertir participantes a DataFrame
-        participants_df = pd.DataFrame(participants_response.data)
-        
-        # Filtrar participantes para actividades en nuestro conjunto de datos
-        participants_df = participants_df[participants_df['activity_id'].isin(activities_df['id'])]
-        
-        # Contar actividades por agente
-        if not participants_df.empty:
-            agent_activities = participants_df.groupby('agent_nip')['activity_id'].nunique().reset_index()
-            agent_activities.columns = ['nip', 'total_actividades']
-            
-            # Combinar con datos de agentes
-            result_df = pd.merge(agents_df, agent_activities, on='nip', how='left')
-            
-            # Rellenar NaN con 0 para agentes sin actividades
-            result_df['total_actividades'] = result_df['total_actividades'].fillna(0).astype(int)
-        else:
-            # No hay participaciones que cumplan los filtros
-            result_df = agents_df.copy()
-            result_df['total_actividades'] = 0
+        # Combinar con datos de agentes; los agentes sin actividades quedan con 0
+        result_df = pd.merge(agents_df, agent_activities, on='nip', how='left')
+        result_df['total_actividades'] = result_df['total_actividades'].fillna(0).astype(int)
         
         # Crear columna de apellidos concatenados
-        result_df['apellidos'] = result_df.apply(
-            lambda row: f"{row['apellido1']} {row['apellido2'] if pd.notna(row['apellido2']) else ''}", 
-            axis=1
-        )
+        result_df['apellidos'] = result_df['apellido1'].fillna('') + " " + result_df['apellido2'].fillna('')
         
         # Seleccionar y ordenar columnas
         result_df = result_df[['nip', 'nombre', 'apellidos', 'seccion', 'total_actividades']]
@@ -1255,4 +1832,117 @@ def get_agents_activity_stats(start_date=None, end_date=None, curso_id=None, sec
     
     except Exception as e:
         st.error(f"Error al obtener estadísticas: {str(e)}")
-        return pd.DataFrame(columns=['nip', 'nombre', 'apellidos', 'seccion', 'total_actividades'])
+        return empty_df
+
+# Columnas de los resúmenes diarios (migración 0005)
+ACTIVITY_ROLLUP_COLUMNS = ['fecha', 'curso_id', 'turno', 'activities', 'participations']
+PARTICIPATION_ROLLUP_COLUMNS = ['fecha', 'curso_id', 'seccion', 'grupo', 'turno', 'participations', 'activities']
+
+@caching.counted(st.cache_data, ttl=60)  # Cache de 1 minuto
+def get_daily_rollups(start_date, end_date):
+    """
+    Obtiene los resúmenes diarios de actividades y participaciones de un rango de fechas
+
+    Cada escritura recalcula los días que modifica al confirmarse (trigger de
+    0007_resumen_diario_al_escribir.sql), así que los resúmenes ya están al día al leerlos.
+
+    Returns:
+        tuple: (actividades por día/curso/turno, participaciones por día/curso/sección/grupo/turno)
+    """
+    try:
+        filters = [
+            ("gte", "fecha", start_date.strftime("%Y-%m-%d")),
+            ("lte", "fecha", end_date.strftime("%Y-%m-%d"))
+        ]
+        activity_rows = [
+            row for page in iter_table_pages(config.ACTIVITY_ROLLUP_TABLE, filters=filters) for row in page
+        ]
+        participation_rows = [
+            row for page in iter_table_pages(config.PARTICIPATION_ROLLUP_TABLE, filters=filters) for row in page
+        ]
+
+        return (
+            pd.DataFrame(activity_rows).reindex(columns=ACTIVITY_ROLLUP_COLUMNS),
+            pd.DataFrame(participation_rows).reindex(columns=PARTICIPATION_ROLLUP_COLUMNS)
+        )
+    except Exception as e:
+        st.error(f"Error al obtener los resúmenes diarios: {str(e)}")
+        return pd.DataFrame(columns=ACTIVITY_ROLLUP_COLUMNS), pd.DataFrame(columns=PARTICIPATION_ROLLUP_COLUMNS)
+
+@caching.counted(st.cache_data, ttl=60)  # Cache de 1 minuto
+def get_participation_by_agent(start_date, end_date, curso_id=None, secciones=None):
+    """
+    Obtiene el número de participaciones de cada agente en un rango de fechas, agregado
+    en la base de datos (función participation_by_agent)
+
+    Returns:
+        DataFrame: columnas agent_nip y participations, de mayor a menor
+    """
+    try:
+        response = config.supabase.rpc("participation_by_agent", {
+            "p_start": start_date.strftime("%Y-%m-%d"),
+            "p_end": end_date.strftime("%Y-%m-%d"),
+            "p_curso_id": int(curso_id) if curso_id else None,
+            "p_sections": list(secciones) if secciones else None
+        }).execute()
+        return pd.DataFrame(response.data or []).reindex(columns=['agent_nip', 'participations'])
+    except Exception as e:
+        st.error(f"Error al obtener las participaciones por agente: {str(e)}")
+        return pd.DataFrame(columns=['agent_nip', 'participations'])
+
+def _participations_for_agents(start_date, end_date, curso_id, secciones, agentes):
+    """
+    Construye el resumen de participaciones de unos agentes concretos
+
+    Los resúmenes diarios no tienen la dimensión agente, así que se parte del snapshot
+    analítico y se agrega igual que participation_daily_rollup.
+    """
+    import analytics_snapshot
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    rows = analytics_snapshot.participations(start_date, end_date, curso_id)
+    rows = rows.filter(pc.is_in(rows["agent_nip"], value_set=pa.array(list(agentes), pa.string())))
+    rows = rows.to_pandas()
+    for column in ['turno', 'seccion', 'grupo']:
+        rows[column] = rows[column].astype(object)
+    rows['fecha'] = rows['fecha'].astype(str)
+    if secciones:
+        rows = rows[rows['seccion'].isin(secciones)]
+
+    participations = rows.groupby(['fecha', 'curso_id', 'seccion', 'grupo', 'turno'], dropna=False).agg(
+        participations=('agent_nip', 'size'),
+        activities=('activity_id', 'nunique')
+    ).reset_index()
+    by_agent = rows.groupby('agent_nip').size().sort_values(ascending=False).reset_index()
+    by_agent.columns = ['agent_nip', 'participations']
+    return participations.reindex(columns=PARTICIPATION_ROLLUP_COLUMNS), by_agent
+
+def get_dashboard_data(start_date, end_date, curso_id=None, secciones=None, agentes=None):
+    """
+    Obtiene los datos agregados del Dashboard General
+
+    Sin filtro de agentes todo sale de los resúmenes diarios y de participation_by_agent;
+    con agentes concretos se agregan sus participaciones en el momento.
+
+    Returns:
+        tuple: (actividades por día/curso/turno,
+                participaciones por día/curso/sección/grupo/turno,
+                participaciones por agente)
+    """
+    activity_rollup, participation_rollup = get_daily_rollups(start_date, end_date)
+
+    if curso_id:
+        activity_rollup = activity_rollup[activity_rollup['curso_id'] == curso_id]
+
+    if agentes:
+        participations, by_agent = _participations_for_agents(start_date, end_date, curso_id, secciones, agentes)
+    else:
+        participations = participation_rollup
+        if curso_id:
+            participations = participations[participations['curso_id'] == curso_id]
+        if secciones:
+            participations = participations[participations['seccion'].isin(secciones)]
+        by_agent = get_participation_by_agent(start_date, end_date, curso_id, secciones)
+
+    return activity_rollup, participations, by_agent
@@ -0,0 +1,160 @@
+"""
+Precarga de cachés al arrancar el proceso y estado de disponibilidad (readiness).
+
+Tras un despliegue o reinicio, el primer usuario de cada página pagaba la carga de
+todas las cachés. start() las llena en segundo plano: datos de referencia (agentes,
+cursos, monitores, actividades, índice de búsqueda), el dashboard del año en curso
+y el snapshot analítico. readiness() resume el estado para el endpoint /readyz de
+serve.py: la instancia está lista cuando la precarga ha terminado, así Render no le
+envía tráfico mientras está fría.
+
+Que Supabase no responda o que un circuito esté abierto no quita la disponibilidad:
+es un fallo común a todas las réplicas, y con un 503 Render las sacaría todas del
+balanceo y las reiniciaría, perdiendo las cachés calientes con las que se sirve en
+modo degradado (resilience.py). Ese estado va en el informe solo como información.
+"""
+import threading
+import time
+from datetime import date, datetime
+import config
+import caching
+import utils
+
+PENDING = "pendiente"
+RUNNING = "calentando"
+DONE = "listo"
+
+_lock = threading.Lock()
+_status = {"estado": PENDING, "inicio": None, "fin": None, "pasos": {}}
+_backend = {"comprobado": 0.0, "resultado": None}
+
+def _warm_reference_data():
+    utils.get_shared_frame("agents")
+    utils.get_agent_search_index()
+    utils.get_all_courses()
+    utils.get_all_courses(include_hidden=True)
+    utils.get_all_monitors()
+    utils.get_shared_frame("activities")
+
+def _warm_dashboard():
+    # Mismo rango y argumentos que el Dashboard General por defecto (del 1 de enero a hoy)
+    today = date.today()
+    utils.get_dashboard_data(date(today.year, 1, 1), today, curso_id=None, secciones=None, agentes=None)
+
+def _warm_analytics_snapshot():
+    import analytics_snapshot
+    analytics_snapshot.get_tables()
+
+# Pasos de la precarga, en orden: nombre -> función
+WARMUP_STEPS = {
+    "datos de referencia": _warm_reference_data,
+    "dashboard del año": _warm_dashboard,
+    "snapshot analítico": _warm_analytics_snapshot
+}
+
+def _wait_for_runtime(timeout=60):
+    # Las cachés de st.cache_data son del runtime de Streamlit: si se llenan antes de que
+    # exista, se guardan en un almacén temporal que después no se usa
+    from streamlit.runtime import Runtime
+    deadline = time.monotonic() + timeout
+    while not Runtime.exists() and time.monotonic() < deadline:
+        time.sleep(0.2)
+
+def run_warmup():
+    """Ejecuta todos los pasos de la precarga; un paso que falla no detiene los demás"""
+    with _lock:
+        _status.update(estado=RUNNING, inicio=datetime.now(), fin=None, pasos={})
+
+    for name, step in WARMUP_STEPS.items():
+        started = time.monotonic()
+        error = None
+        try:
+            # Como un refresco en segundo plano: los errores se lanzan en lugar de st.error
+            with caching.background_refresh():
+                step()
+        except Exception as e:
+            error = str(e)
+            print(f"Error en la precarga ({name}): {error}")
+        with _lock:
+            _status["pasos"][name] = {"segundos": round(time.monotonic() - started, 2), "error": error}
+
+    with _lock:
+        _status.update(estado=DONE, fin=datetime.now())
+
+def start(wait_for_runtime=True):
+    """
+    Lanza la precarga en un hilo en segundo plano, una sola vez por proceso
+
+    Args:
+        wait_for_runtime: esperar a que arranque el servidor de Streamlit (desde serve.py)
+    """
+    with _lock:
+        if _status["estado"] != PENDING:
+            return
+        _status["estado"] = RUNNING
+
+    def target():
+        if wait_for_runtime:
+            _wait_for_runtime()
+        run_warmup()
+
+    threading.Thread(target=target, name="warmup", daemon=True).start()
+
+def get_status():
+    with _lock:
+        return {**_status, "pasos": dict(_status["pasos"])}
+
+def check_backend():
+    """
+    Comprueba que Supabase responde con una consulta mínima
+
+    El resultado se reutiliza durante config.HEALTH_BACKEND_CHECK_INTERVAL segundos para
+    que las comprobaciones frecuentes del balanceador no carguen la base de datos.
+    """
+    with _lock:
+        if _backend["resultado"] and time.monotonic() - _backend["comprobado"] < config.HEALTH_BACKEND_CHECK_INTERVAL:
+            return _backend["resultado"]
+
+    import resilience
+    started = time.monotonic()
+    try:
+        config.supabase.table(config.AGENTS_TABLE).select("nip").limit(1).execute()
+        result = {"accesible": True, "latencia_ms": round((time.monotonic() - started) * 1000), "error": None}
+    except Exception as e:
+        result = {"accesible": False, "latencia_ms": None, "error": str(e)}
+    # Con el circuito abierto la consulta puede haberse servido de la última respuesta guardada
+    if resilience.is_degraded():
+        result = {**result, "accesible": False, "error": result["error"] or "circuito abierto"}
+
+    with _lock:
+        _backend.update(comprobado=time.monotonic(), resultado=result)
+    return result
+
+def readiness():
+    """
+    Estado de disponibilidad de la instancia
+
+    Returns:
+        tuple: (lista, informe) con lista True si la precarga ha terminado; el informe
+               incluye el estado de la precarga, los tamaños de las cachés y, como
+               información, la comprobación de la base de datos y los circuitos
+    """
+    import resilience
+    status = get_status()
+    backend = check_backend()
+
+    shared = utils.get_shared_frames_report() if status["estado"] == DONE else None
+    report = {
+        "precarga": status,
+        "base_de_datos": backend,
+        "degradado": resilience.is_degraded(),
+        "circuitos": resilience.get_circuit_states(),
+        "caches": [
+            {"funcion": cache["funcion"], "entradas": cache["entradas"], "antiguedad": cache["antiguedad"]}
+            for cache in caching.get_cache_stats()
+        ],
+        "datos_compartidos": shared.to_dict("records") if shared is not None else []
+    }
+    ready = status["estado"] == DONE
+    report["lista"] = ready
+    return ready, report
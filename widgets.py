@@ -0,0 +1,289 @@
+import math
+import re
+import streamlit as st
+import pandas as pd
+import config
+import caching
+import utils
+
+# Tamaños de página que se ofrecen en las tablas paginadas
+GRID_PAGE_SIZES = [25, 50, 100, 200, 500]
+
+def paginated_grid(df, key, columns=None, formatters=None, column_config=None, sort_by=None,
+                   descending=False, na_position="last", search_columns=None,
+                   page_size=config.GRID_PAGE_SIZE):
+    """
+    Tabla paginada: la búsqueda, la ordenación y la paginación se hacen en el servidor
+    y al navegador solo se envía la página visible con las columnas indicadas
+
+    El número de filas por envío nunca supera config.GRID_MAX_ROWS.
+
+    Args:
+        df: DataFrame completo (no se modifica)
+        key: prefijo único para las claves de los widgets
+        columns: columnas a mostrar (por defecto, todas)
+        formatters: dict columna -> función aplicada solo a las filas de la página visible
+        column_config: column_config de st.dataframe
+        sort_by: columna de ordenación inicial
+        descending: orden descendente inicial
+        na_position: posición de los nulos al ordenar ("first" o "last")
+        search_columns: columnas en las que busca el cuadro de texto; sin ellas no se muestra
+        page_size: filas por página inicial
+
+    Returns:
+        DataFrame: filas de la página visible, con los formateadores aplicados
+    """
+    columns = list(columns or df.columns)
+    sizes = [size for size in GRID_PAGE_SIZES if size <= config.GRID_MAX_ROWS] or [config.GRID_MAX_ROWS]
+    if page_size not in sizes:
+        page_size = sizes[-1] if page_size > sizes[-1] else sizes[0]
+
+    ctrl_search, ctrl_sort, ctrl_order, ctrl_size = st.columns([3, 2, 1, 1])
+    with ctrl_search:
+        search = st.text_input("Buscar", key=f"{key}_search",
+                               placeholder="Buscar en la tabla...") if search_columns else ""
+    with ctrl_sort:
+        sort_column = st.selectbox("Ordenar por", columns,
+                                   index=columns.index(sort_by) if sort_by in columns else 0,
+                                   key=f"{key}_sort")
+    with ctrl_order:
+        descending = st.toggle("Descendente", value=descending, key=f"{key}_desc")
+    with ctrl_size:
+        page_size = st.selectbox("Filas", sizes, index=sizes.index(page_size), key=f"{key}_size")
+
+    view = df
+    if search:
+        mask = pd.Series(False, index=df.index)
+        for col in search_columns:
+            mask |= df[col].astype("string").str.contains(search, case=False, regex=False, na=False)
+        view = df[mask]
+
+    view = view.sort_values(sort_column, ascending=not descending, na_position=na_position, kind="stable")
+
+    total = len(view)
+    total_pages = max(math.ceil(total / page_size), 1)
+
+    # Si los filtros reducen el número de páginas, la página guardada puede quedar fuera de rango
+    page_key = f"{key}_page"
+    if st.session_state.setdefault(page_key, 1) > total_pages:
+        st.session_state[page_key] = total_pages
+
+    start = (st.session_state[page_key] - 1) * page_size
+    window = view.iloc[start:start + page_size][columns]
+    for col, formatter in (formatters or {}).items():
+        if col in window.columns:
+            window[col] = window[col].map(formatter)
+
+    st.dataframe(window, column_config=column_config, use_container_width=True, hide_index=True)
+
+    col_info, col_page = st.columns([4, 1])
+    with col_page:
+        st.number_input("Página", min_value=1, max_value=total_pages, step=1, key=page_key)
+    with col_info:
+        if total:
+            st.caption(f"Filas {start + 1}–{start + len(window)} de {total} · página "
+                       f"{st.session_state[page_key]} de {total_pages}")
+        else:
+            st.caption("No hay filas que coincidan con la búsqueda")
+
+    return window
+
+def _picker_add(key, nips):
+    selected = list(st.session_state.get(f"{key}_selected", []))
+    selected.extend(nip for nip in dict.fromkeys(nips) if nip not in selected)
+    st.session_state[f"{key}_selected"] = selected
+
+def _picker_sync(key):
+    # Quitar agentes de la lista: el multiselect es solo la vista de {key}_selected
+    st.session_state[f"{key}_selected"] = list(st.session_state[f"{key}_list"])
+
+def _picker_add_match(key):
+    nip = st.session_state.get(f"{key}_match")
+    if nip:
+        _picker_add(key, [nip])
+    st.session_state[f"{key}_match"] = None
+
+def _picker_add_bulk(key):
+    index, labels = utils.get_agent_search_index()
+    active = index[index["activo"]]
+    secciones = st.session_state.get(f"{key}_bulk_sections") or []
+    grupos = st.session_state.get(f"{key}_bulk_groups") or []
+
+    nips = []
+    if secciones or grupos:
+        mask = pd.Series(True, index=active.index)
+        if secciones:
+            mask &= active["seccion"].isin(secciones)
+        if grupos:
+            mask &= active["grupo"].isin(grupos)
+        nips.extend(active.loc[mask, "nip"])
+
+    pasted = re.split(r"[\s,;]+", st.session_state.get(f"{key}_bulk_nips", "").strip())
+    pasted = [nip for nip in pasted if nip]
+    nips.extend(nip for nip in pasted if nip in labels)
+
+    _picker_add(key, nips)
+    st.session_state[f"{key}_bulk_unknown"] = [nip for nip in pasted if nip not in labels]
+    st.session_state[f"{key}_bulk_sections"] = []
+    st.session_state[f"{key}_bulk_groups"] = []
+    st.session_state[f"{key}_bulk_nips"] = ""
+
+def agent_picker(key, label="Agentes participantes", default_nips=None, max_matches=config.PICKER_MAX_MATCHES):
+    """
+    Selector de agentes con búsqueda: filtra en el servidor un índice de NIP y nombre
+    mientras se escribe y solo envía al navegador las mejores coincidencias
+
+    La selección se guarda por NIP en st.session_state (`{key}_selected`, fuera de los
+    widgets), así que el selector debe ir fuera de st.form (dentro de un formulario los
+    widgets no se ejecutan al escribir).
+    También permite añadir en bloque por sección, grupo o una lista de NIPs pegada.
+
+    Args:
+        key: prefijo único para las claves de los widgets y de la selección
+        label: título de la lista de seleccionados
+        default_nips: selección inicial (solo se usa la primera vez)
+        max_matches: coincidencias que se muestran como máximo
+
+    Returns:
+        list: NIPs seleccionados
+    """
+    index, labels = utils.get_agent_search_index()
+    selected_key = f"{key}_selected"
+    if selected_key not in st.session_state:
+        st.session_state[selected_key] = [str(nip) for nip in (default_nips or [])]
+
+    col_query, col_match = st.columns(2)
+    with col_query:
+        query = st.text_input("Buscar agente", key=f"{key}_query",
+                              placeholder="NIP, nombre o apellidos")
+    with col_match:
+        matches = index.iloc[0:0]
+        if query.strip():
+            active = index[index["activo"] & ~index["nip"].isin(st.session_state[selected_key])]
+            matches = active[active["search_text"].str.contains(utils.normalize_search_text(query.strip()), regex=False)]
+            # Primero los agentes cuyo NIP empieza por el texto buscado
+            matches = matches.assign(_prefix=~matches["nip"].str.startswith(query.strip())).sort_values(
+                ["_prefix", "label"], kind="stable"
+            ).head(max_matches)
+        st.selectbox(
+            f"Coincidencias ({len(matches)})" if query.strip() else "Coincidencias",
+            [None] + matches["nip"].tolist(),
+            format_func=lambda nip: "Selecciona un agente para añadirlo" if nip is None else labels.get(nip, nip),
+            key=f"{key}_match",
+            on_change=_picker_add_match,
+            args=(key,)
+        )
+
+    with st.expander("Añadir en bloque", expanded=False):
+        col_sections, col_groups = st.columns(2)
+        with col_sections:
+            st.multiselect("Secciones", config.SECTIONS, key=f"{key}_bulk_sections")
+        with col_groups:
+            st.multiselect("Grupos", config.GROUPS, key=f"{key}_bulk_groups")
+        st.text_area("NIPs (separados por espacios, comas o saltos de línea)", key=f"{key}_bulk_nips")
+        st.button("Añadir agentes", key=f"{key}_bulk_add", on_click=_picker_add_bulk, args=(key,))
+        unknown = st.session_state.get(f"{key}_bulk_unknown")
+        if unknown:
+            st.warning(f"NIPs no encontrados: {', '.join(unknown)}")
+
+    # La lista de seleccionados es un multiselect con etiqueta fija y opciones que solo
+    # crecen (los agentes que han estado seleccionados alguna vez), para que quitar un
+    # agente no cambie el identificador del widget y no se pierda la selección. Solo
+    # cambia al añadir agentes; entonces se vuelve a cargar desde {key}_selected
+    selected = st.session_state[selected_key]
+    options_key, list_key = f"{key}_options", f"{key}_list"
+    options = st.session_state.setdefault(options_key, [])
+    options.extend(nip for nip in selected if nip not in options)
+    if st.session_state.get(list_key) != selected:
+        st.session_state[list_key] = list(selected)
+    st.multiselect(
+        label,
+        options,
+        format_func=lambda nip: labels.get(nip, nip),
+        key=list_key,
+        on_change=_picker_sync,
+        args=(key,)
+    )
+    st.caption(f"{len(selected)} agentes seleccionados")
+    return list(selected)
+
+def reset_agent_picker(key):
+    """Vacía la selección y la búsqueda de un agent_picker"""
+    for suffix in ("selected", "options", "list", "query", "match", "bulk_unknown"):
+        st.session_state.pop(f"{key}_{suffix}", None)
+
+# Agrupación de las series temporales según el rango: (días máximos, frecuencia de pandas, nombre)
+TIME_GRANULARITIES = [
+    (config.CHART_DAILY_MAX_DAYS, None, "día"),
+    (config.CHART_WEEKLY_MAX_DAYS, "W-MON", "semana"),
+    (None, "MS", "mes")
+]
+
+@caching.counted(st.cache_data, max_entries=config.CHART_CACHE_MAX_ENTRIES, show_spinner=False)
+def _build_figure(kind, data, params, layout):
+    """
+    Especificación (dict) de una figura de plotly express
+
+    La caché es del proceso y la clave incluye el contenido de `data`: con los mismos
+    filtros y los mismos datos la figura no se vuelve a construir, en ninguna sesión.
+    """
+    import plotly.express as px
+    fig = getattr(px, kind)(data, **params)
+    if layout:
+        fig.update_layout(**layout)
+    return fig.to_dict()
+
+def plotly_chart(kind, data, layout=None, **params):
+    """
+    Dibuja un gráfico de plotly express memorizado
+
+    Args:
+        kind: función de plotly.express ("bar", "line", "pie"...)
+        data: DataFrame ya agregado con los datos del gráfico
+        layout: argumentos de fig.update_layout
+        **params: argumentos de la función de plotly express
+    """
+    st.plotly_chart(_build_figure(kind, data, params, layout or {}), use_container_width=True)
+
+def resample_time_series(df, x, y, start_date, end_date):
+    """
+    Agrupa una serie diaria por días, semanas o meses según la longitud del rango
+
+    Args:
+        df: DataFrame con la fecha en `x` (datetime) y el valor en `y`
+        start_date, end_date: rango seleccionado en los filtros
+
+    Returns:
+        tuple: (DataFrame con x e y sumados por periodo, nombre del periodo)
+    """
+    days = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days + 1
+    for max_days, freq, name in TIME_GRANULARITIES:
+        if max_days is None or days <= max_days:
+            break
+    if freq is None:
+        return df[[x, y]], name
+    # Semanas de lunes a domingo y meses naturales, con la fecha de inicio del periodo
+    resampled = df.set_index(x)[y].resample(freq, label="left", closed="left").sum().reset_index()
+    return resampled, name
+
+def time_series_chart(df, x, y, start_date, end_date, title, yaxis_title):
+    """
+    Gráfico de líneas de una serie diaria, agrupada según el rango (resample_time_series)
+
+    Con más de config.CHART_WEBGL_THRESHOLD puntos se dibuja con WebGL y sin marcadores.
+
+    Args:
+        title: título del gráfico; se le añade el periodo de agrupación
+    """
+    data, period = resample_time_series(df, x, y, start_date, end_date)
+    webgl = len(data) > config.CHART_WEBGL_THRESHOLD
+    plotly_chart(
+        "line",
+        data,
+        x=x,
+        y=y,
+        markers=not webgl,
+        render_mode="webgl" if webgl else "auto",
+        title=f"{title} por {period}",
+        layout={"xaxis_title": x, "yaxis_title": yaxis_title}
+    )